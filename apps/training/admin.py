@@ -1,4 +1,5 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.utils.translation import gettext_lazy as _
 
 from utils.generals import get_model
 
@@ -16,10 +17,13 @@ Enroll = get_model('training', 'Enroll')
 Simulation = get_model('training', 'Simulation')
 SimulationChapter = get_model('training', 'SimulationChapter')
 SimulationQuiz = get_model('training', 'SimulationQuiz')
+SimulationQuestion = get_model('training', 'SimulationQuestion')
 Answer = get_model('training', 'Answer')
 Certificate = get_model('training', 'Certificate')
+CourseFacet = get_model('training', 'CourseFacet')
 
 from .forms import ChoiceInlineForm
+from .tasks import regrade_questions
 
 
 class ChoiceInline(admin.StackedInline):
@@ -32,6 +36,14 @@ class ChoiceInline(admin.StackedInline):
 class QuestionExtend(admin.ModelAdmin):
     model = Question
     inlines = [ChoiceInline,]
+    actions = ['regrade_answers',]
+
+    def regrade_answers(self, request, queryset):
+        question_ids = list(queryset.values_list('id', flat=True))
+        result = regrade_questions.delay(question_ids)
+        self.message_user(request, _("Regrade %s question queued, task %s") % (len(question_ids), result.id),
+                          messages.SUCCESS)
+    regrade_answers.short_description = _("Regrade answers with current true choice")
 
 
 class ChapterInline(admin.StackedInline):
@@ -50,6 +62,10 @@ class CourseExtend(admin.ModelAdmin):
 class MaterialInline(admin.StackedInline):
     model = Material
 
+    def get_queryset(self, request):
+        # Text shown in every inline form, load it with the rows
+        return super().get_queryset(request).with_text()
+
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         if db_field.name == 'course':
             parent_id = request.resolver_match.kwargs.get('object_id')
@@ -61,6 +77,12 @@ class MaterialInline(admin.StackedInline):
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
 
+class MaterialExtend(admin.ModelAdmin):
+    model = Material
+    list_display = ('__str__', 'type', 'course',)
+    list_select_related = ('chapter', 'course',)
+
+
 class ChapterExtend(admin.ModelAdmin):
     model = Chapter
     list_display = ('label', 'course',)
@@ -74,11 +96,13 @@ admin.site.register(QuizQuestion)
 admin.site.register(Category)
 admin.site.register(Course, CourseExtend)
 admin.site.register(Chapter, ChapterExtend)
-admin.site.register(Material)
+admin.site.register(Material, MaterialExtend)
 admin.site.register(CourseQuiz)
 admin.site.register(Enroll)
 admin.site.register(Simulation)
 admin.site.register(SimulationChapter)
 admin.site.register(SimulationQuiz)
+admin.site.register(SimulationQuestion)
 admin.site.register(Answer)
 admin.site.register(Certificate)
+admin.site.register(CourseFacet)
@@ -1,36 +1,48 @@
 from rest_framework import serializers
 
 from utils.generals import get_model
+from utils.mixin.api import DynamicFieldsModelSerializer
+from apps.training.utils.cover import cover_rendition_urls
+from apps.training.api.learner.material.v1.serializers import MaterialMediaField
 
 Course = get_model('training', 'Course')
 CourseQuiz = get_model('training', 'CourseQuiz')
 CourseDate = get_model('training', 'CourseDate')
+Chapter = get_model('training', 'Chapter')
+Material = get_model('training', 'Material')
 Quiz = get_model('training', 'Quiz')
 
 
-class CourseDateListSerializer(serializers.ListSerializer):
-    def to_representation(self, value):
-        value = value.all()[:1]
-        return super().to_representation(value)
-
-
 class CourseDateSerializer(serializers.ModelSerializer):
     class Meta:
         model = CourseDate
         fields = ['uuid', 'start_date', 'end_date',]
-        list_serializer_class = CourseDateListSerializer
 
 
 class CourseSerializer(serializers.ModelSerializer):
     url = serializers.HyperlinkedIdentityField(view_name='training_api:learner:course-detail',
                                                lookup_field='uuid', read_only=True)
 
-    course_date = CourseDateSerializer(read_only=True, many=True)
+    course_date = serializers.SerializerMethodField()
+    cover_renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = Course
         fields = '__all__'
 
+    def get_cover_renditions(self, instance):
+        # Smaller cover for list, keyed by width
+        return cover_rendition_urls(instance, request=self.context.get('request', None))
+
+    def get_course_date(self, instance):
+        # Session matched by `start_date` filter, otherwise next upcoming session
+        course_dates = getattr(instance, 'matched_course_date', None)
+        if course_dates is None:
+            course_dates = [instance.next_course_date] if instance.next_course_date_id else []
+
+        serializer = CourseDateSerializer(course_dates[:1], many=True, context=self.context)
+        return serializer.data
+
 
 class CourseQuizSerializer(serializers.ModelSerializer):
     url = serializers.HyperlinkedIdentityField(view_name='training_api:learner:coursequiz-detail',
@@ -42,3 +54,49 @@ class CourseQuizSerializer(serializers.ModelSerializer):
     class Meta:
         model = CourseQuiz
         fields = '__all__'
+
+
+class MaterialTreeSerializer(DynamicFieldsModelSerializer):
+    media = MaterialMediaField()
+
+    class Meta:
+        model = Material
+        fields = ['uuid', 'type', 'media', 'text', 'create_date', 'update_date',]
+
+
+class ChapterTreeSerializer(serializers.ModelSerializer):
+    material = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Chapter
+        fields = ['uuid', 'label', 'number', 'material', 'create_date', 'update_date',]
+
+    def get_material(self, instance):
+        # Material fetched once for all chapters with Prefetch
+        serializer = MaterialTreeSerializer(instance.tree_material, many=True, context=self.context,
+                                            fields_used=self.context.get('material_fields', '__all__'))
+        return serializer.data
+
+
+class CourseQuizTreeSerializer(serializers.ModelSerializer):
+    quiz = serializers.SlugRelatedField(slug_field='uuid', read_only=True)
+    quiz_label = serializers.CharField(read_only=True, source='quiz.label')
+
+    class Meta:
+        model = CourseQuiz
+        fields = ['uuid', 'quiz', 'quiz_label', 'position', 'duration',]
+
+
+class CourseTreeSerializer(serializers.ModelSerializer):
+    chapter = serializers.SerializerMethodField()
+    course_quiz = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Course
+        fields = ['uuid', 'label', 'description', 'cover', 'chapter', 'course_quiz',]
+
+    def get_chapter(self, instance):
+        return ChapterTreeSerializer(instance.tree_chapter, many=True, context=self.context).data
+
+    def get_course_quiz(self, instance):
+        return CourseQuizTreeSerializer(instance.tree_course_quiz, many=True, context=self.context).data
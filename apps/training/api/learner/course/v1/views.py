@@ -1,87 +1,162 @@
+import json
 import datetime
 from dateutil import parser
 
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
-from django.db.models import Prefetch, Count, Q
-from django.utils import timezone
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
 from django.utils.translation import gettext_lazy as _
 
 from rest_framework import viewsets, status as response_status
+from rest_framework.decorators import action
 from rest_framework.exceptions import NotAcceptable
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.pagination import LimitOffsetPagination
 
 from utils.generals import get_model
-from utils.pagination import build_result_pagination
-
-from .serializers import CourseSerializer, CourseQuizSerializer
+from utils.mixin.api import ConditionalGetMixin
+from utils.pagination import build_result_pagination, get_paginator
+from apps.training.utils.cache import get_course_detail, course_detail_stats
+from apps.training.utils.course import upcoming_threshold
+from apps.training.utils.facet import get_facets, get_facets_version
+from apps.training.utils.search import search_courses
+
+from .serializers import (
+    CourseSerializer,
+    CourseQuizSerializer,
+    CourseTreeSerializer,
+    MaterialTreeSerializer
+)
 
 Course = get_model('training', 'Course')
 CourseQuiz = get_model('training', 'CourseQuiz')
 CourseDate = get_model('training', 'CourseDate')
+Chapter = get_model('training', 'Chapter')
+Material = get_model('training', 'Material')
 Quiz = get_model('training', 'Quiz')
 
 # Define to avoid used ...().paginate__
 _PAGINATOR = LimitOffsetPagination()
 
 
-class CourseApiView(viewsets.ViewSet):
+class CourseApiView(ConditionalGetMixin, viewsets.ViewSet):
     lookup_field = 'uuid'
     permission_classes = (IsAuthenticated,)
 
     def queryset(self, start_date=None):
+        qs = Course.objects \
+            .prefetch_related('creator', 'category', 'next_course_date') \
+            .select_related('creator', 'category', 'next_course_date') \
+            .filter(is_active=True)
+
         if start_date:
             dt = parser.parse(start_date)
-            dt_format = dt.strftime('%Y-%m-%d')
+            day_start = datetime.datetime.combine(dt.date(), datetime.time.min)
+            day_end = day_start + datetime.timedelta(days=1)
 
-            q_start_date = Q(course_date__start_date__date=dt_format)
-            q_course_date = Q(start_date__date=dt_format)
-        else:
-            today = timezone.datetime.today().strftime('%Y-%m-%d')
-            q_start_date = Q(course_date__start_date__gte=today)
-            q_course_date = Q(start_date__gte=today)
-        
-        course_date_objs = CourseDate.objects.filter(q_course_date).order_by('start_date')
+            # Range on indexed start_date, course with any session that day
+            course_date_objs = CourseDate.objects \
+                .filter(start_date__gte=day_start, start_date__lt=day_end) \
+                .order_by('start_date')
 
-        qs = Course.objects \
-            .prefetch_related('creator', 'category', Prefetch('course_date', queryset=course_date_objs)) \
-            .select_related('creator', 'category') \
-            .annotate(
-                course_date_count=Count(
-                    'course_date', 
-                    filter=q_start_date,
-                    distinct=True
-                )
-            ) \
-            .filter(is_active=True, course_date_count__gt=0)
+            qs = qs.filter(id__in=course_date_objs.values('course_id')) \
+                .prefetch_related(Prefetch('course_date', queryset=course_date_objs,
+                                           to_attr='matched_course_date'))
+        else:
+            qs = qs.filter(next_start_date__gte=upcoming_threshold())
 
         return qs
 
     def list(self, request, format=None):
         context = {'request': request}
         start_date = request.query_params.get('start_date', None)
+        q = request.query_params.get('q', None)
 
         queryset = self.queryset(start_date=start_date)
-        queryset_paginator = _PAGINATOR.paginate_queryset(queryset, request)
+        if q:
+            queryset = search_courses(queryset, q)
+
+        etag, last_modified = self.get_validators(request, queryset,
+                                                  extra=get_facets_version())
+        not_modified = self.get_not_modified(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        paginator = get_paginator(request, _PAGINATOR, queryset)
+        queryset_paginator = paginator.paginate_queryset(queryset, request)
         serializer = CourseSerializer(queryset_paginator, many=True, context=context)
-        pagination_result = build_result_pagination(self, _PAGINATOR, serializer)
+        pagination_result = build_result_pagination(self, paginator, serializer)
+        pagination_result['facets'] = get_facets()
 
-        return Response(pagination_result, status=response_status.HTTP_200_OK)
+        response = Response(pagination_result, status=response_status.HTTP_200_OK)
+        return self.set_validators(response, etag, last_modified)
 
     def retrieve(self, request, uuid=None, format=None):
         context = {'request': request}
-    
+
+        def build():
+            try:
+                queryset = self.queryset().get(uuid=uuid)
+            except (ObjectDoesNotExist, ValidationError) as e:
+                raise NotAcceptable(detail=repr(e))
+
+            serializer = CourseSerializer(queryset, many=False, context=context)
+            return serializer.data
+
+        data = get_course_detail(uuid, request, build)
+
+        # Validator from cached payload, no database hit
+        etag = self.make_etag([json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)])
+        last_modified = parser.parse(data['update_date']) if data.get('update_date') else None
+        not_modified = self.get_not_modified(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        response = Response(data, status=response_status.HTTP_200_OK)
+        return self.set_validators(response, etag, last_modified)
+
+    @action(detail=True, methods=['get'], url_path='tree')
+    def tree(self, request, uuid=None, format=None):
+        """
+        Course, chapters, materials and quizzes in one response,
+        one query per level. Material text included with `?with_text=1`
+        """
+        with_text = request.query_params.get('with_text', None) in ('1', 'true')
+        material_fields = list(MaterialTreeSerializer.Meta.fields)
+        material_objs = Material.objects.order_by('create_date')
+
+        # Text deferred by default manager
+        if with_text:
+            material_objs = material_objs.with_text()
+        else:
+            material_fields.remove('text')
+
+        chapter_objs = Chapter.objects.order_by('create_date') \
+            .prefetch_related(Prefetch('material', queryset=material_objs, to_attr='tree_material'))
+        course_quiz_objs = CourseQuiz.objects.select_related('quiz').order_by('position')
+
         try:
-            queryset = self.queryset().get(uuid=uuid)
+            queryset = Course.objects \
+                .prefetch_related(
+                    Prefetch('chapter', queryset=chapter_objs, to_attr='tree_chapter'),
+                    Prefetch('course_quiz', queryset=course_quiz_objs, to_attr='tree_course_quiz')
+                ) \
+                .get(uuid=uuid, is_active=True)
         except (ObjectDoesNotExist, ValidationError) as e:
             raise NotAcceptable(detail=repr(e))
-    
-        serializer = CourseSerializer(queryset, many=False, context=context)
+
+        context = {'request': request, 'material_fields': material_fields}
+        serializer = CourseTreeSerializer(queryset, many=False, context=context)
         return Response(serializer.data, status=response_status.HTTP_200_OK)
 
+    @action(detail=False, methods=['get'], url_path='cache-stats',
+            permission_classes=(IsAdminUser,))
+    def cache_stats(self, request, format=None):
+        return Response(course_detail_stats(), status=response_status.HTTP_200_OK)
 
-class CourseQuizApiView(viewsets.ViewSet):
+
+class CourseQuizApiView(ConditionalGetMixin, viewsets.ViewSet):
     lookup_field = 'uuid'
     permission_classes = (IsAuthenticated,)
 
@@ -100,20 +175,42 @@ class CourseQuizApiView(viewsets.ViewSet):
         if not course_uuid or not position:
             raise NotAcceptable(detail=_("Param course_uuid and position required"))
 
-        queryset = self.queryset().filter(position=position, course__uuid=course_uuid)
-        queryset_paginator = _PAGINATOR.paginate_queryset(queryset, request)
+        try:
+            queryset = self.queryset().filter(position=position, course__uuid=course_uuid)
+            etag, last_modified = self.get_validators(request, queryset)
+        except ValidationError as e:
+            raise NotAcceptable(detail=repr(e))
+
+        not_modified = self.get_not_modified(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        paginator = get_paginator(request, _PAGINATOR, queryset)
+        queryset_paginator = paginator.paginate_queryset(queryset, request)
         serializer = CourseQuizSerializer(queryset_paginator, many=True, context=context)
-        pagination_result = build_result_pagination(self, _PAGINATOR, serializer)
+        pagination_result = build_result_pagination(self, paginator, serializer)
 
-        return Response(pagination_result, status=response_status.HTTP_200_OK)
+        response = Response(pagination_result, status=response_status.HTTP_200_OK)
+        return self.set_validators(response, etag, last_modified)
 
     def retrieve(self, request, uuid=None, format=None):
         context = {'request': request}
     
         try:
-            queryset = self.queryset().get(uuid=uuid)
-        except (ObjectDoesNotExist, ValidationError) as e:
+            queryset = self.queryset().filter(uuid=uuid)
+            etag, last_modified = self.get_validators(request, queryset)
+        except ValidationError as e:
+            raise NotAcceptable(detail=repr(e))
+
+        not_modified = self.get_not_modified(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        try:
+            queryset = queryset.get()
+        except ObjectDoesNotExist as e:
             raise NotAcceptable(detail=repr(e))
     
         serializer = CourseQuizSerializer(queryset, many=False, context=context)
-        return Response(serializer.data, status=response_status.HTTP_200_OK)
+        response = Response(serializer.data, status=response_status.HTTP_200_OK)
+        return self.set_validators(response, etag, last_modified)
@@ -1,9 +1,10 @@
 from django.db import transaction
-from django.core.exceptions import ObjectDoesNotExist
 
 from rest_framework import serializers
 
 from utils.generals import get_model
+from apps.training.utils.constants import AFTER, BEFORE
+from apps.training.utils.progress import progress_state
 
 Course = get_model('training', 'Course')
 CourseDate = get_model('training', 'CourseDate')
@@ -11,6 +12,9 @@ Enroll = get_model('training', 'Enroll')
 Simulation = get_model('training', 'Simulation')
 SimulationChapter = get_model('training', 'SimulationChapter')
 
+# Most learner enrolled in one request
+COHORT_MAX = 10000
+
 
 class EnrollSerializer(serializers.ModelSerializer):
     url = serializers.HyperlinkedIdentityField(view_name='training_api:learner:enroll-detail',
@@ -34,16 +38,26 @@ class EnrollSerializer(serializers.ModelSerializer):
         ret = super().to_representation(value)
         simulation_dict = None
 
-        try:
-            simulation = value.simulation.filter(is_done=False).get()
-            simulation_dict = {'uuid': simulation.uuid }
-        except ObjectDoesNotExist:
-            pass
-        
+        # Prefetched by view as `active_simulation`, query otherwise
+        if hasattr(value, 'active_simulation'):
+            simulation = value.active_simulation[0] if value.active_simulation else None
+        else:
+            simulation = value.simulation.filter(is_done=False).first()
+
+        if simulation is not None:
+            simulation_dict = {'uuid': simulation.uuid, 'progress': progress_state(simulation)}
+
         ret['simulation'] = simulation_dict
         return ret
 
 
+class EnrollCohortSerializer(serializers.Serializer):
+    course_date = serializers.SlugRelatedField(slug_field='uuid',
+                                               queryset=CourseDate.objects.select_related('course'))
+    learners = serializers.ListField(child=serializers.UUIDField(), allow_empty=False,
+                                     max_length=COHORT_MAX)
+
+
 class SimulationSerializer(serializers.ModelSerializer):
     url = serializers.HyperlinkedIdentityField(view_name='training_api:learner:simulation-detail',
                                                lookup_field='uuid', read_only=True)
@@ -57,40 +71,40 @@ class SimulationSerializer(serializers.ModelSerializer):
         model = Simulation
         fields = '__all__'
 
+    def quiz_state(self, simulation_quiz):
+        if simulation_quiz is None:
+            return None
+
+        return {
+            'simulation_quiz_uuid': simulation_quiz.uuid,
+            'course_quiz_uuid': simulation_quiz.course_quiz.uuid,
+            'quiz_uuid': simulation_quiz.quiz.uuid,
+            'label': simulation_quiz.quiz.label,
+            'is_done': simulation_quiz.is_done,
+            'start_date': simulation_quiz.start_date,
+            'deadline': simulation_quiz.deadline,
+            'score': {
+                'correct': simulation_quiz.score_correct,
+                'total': simulation_quiz.score_total,
+                'percentage': simulation_quiz.score_percentage,
+            },
+        }
+
     def to_representation(self, value):
         ret = super().to_representation(value)
-        quiz_before_dict = None
-        quiz_after_dict = None
-
-        # Get quiz before course
-        try:
-            quiz_before = value.simulation_quiz.get(course_quiz__position='before')
-            quiz_before_dict = {
-                'simulation_quiz_uuid': quiz_before.uuid,
-                'course_quiz_uuid': quiz_before.course_quiz.uuid,
-                'quiz_uuid': quiz_before.quiz.uuid,
-                'label': quiz_before.quiz.label,
-                'is_done': quiz_before.is_done,
-            }
-        except ObjectDoesNotExist:
-            pass
-        
-        # Get quiz after course
-        try:
-            quiz_after = value.simulation_quiz.get(course_quiz__position='after')
-            quiz_after_dict = {
-                'simulation_quiz_uuid': quiz_after.uuid,
-                'course_quiz_uuid': quiz_after.course_quiz.uuid,
-                'quiz_uuid': quiz_after.quiz.uuid,
-                'label': quiz_after.quiz.label,
-                'is_done': quiz_after.is_done,
-            }
-        except ObjectDoesNotExist:
-            pass
 
+        # Prefetched by view as `simulation_quiz_state`, query otherwise
+        if hasattr(value, 'simulation_quiz_state'):
+            simulation_quizzes = value.simulation_quiz_state
+        else:
+            simulation_quizzes = value.simulation_quiz.select_related('course_quiz', 'quiz')
+
+        # Quiz before and after course
+        quizzes = {obj.course_quiz.position: obj for obj in simulation_quizzes}
         ret['quiz'] = {
-            'before': quiz_before_dict,
-            'after': quiz_after_dict,
+            'before': self.quiz_state(quizzes.get(BEFORE, None)),
+            'after': self.quiz_state(quizzes.get(AFTER, None)),
         }
+        ret['progress'] = progress_state(value)
 
         return ret
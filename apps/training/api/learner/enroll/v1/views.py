@@ -1,39 +1,51 @@
 from django.db import transaction, IntegrityError
+from django.db.models import Prefetch
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from django.views.decorators.cache import never_cache
+from django.utils import timezone
 from django.utils.decorators import method_decorator
 from django.utils.translation import gettext_lazy as _
 
 from rest_framework import viewsets, status as response_status
+from rest_framework.decorators import action
 from rest_framework.exceptions import NotAcceptable
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.pagination import LimitOffsetPagination
 
 from utils.generals import get_model
-from utils.pagination import build_result_pagination
+from utils.mixin.api import ConditionalGetMixin
+from utils.pagination import build_result_pagination, get_paginator
+from apps.training.utils.enroll import enroll_cohort
+from apps.training.utils.progress import PROGRESS_FIELDS
+from apps.training.utils.timer import start_quiz
 
-from .serializers import EnrollSerializer, SimulationSerializer
+from .serializers import EnrollSerializer, EnrollCohortSerializer, SimulationSerializer
 
 Enroll = get_model('training', 'Enroll')
 Simulation = get_model('training', 'Simulation')
+SimulationQuiz = get_model('training', 'SimulationQuiz')
 
 # Define to avoid used ...().paginate__
 _PAGINATOR = LimitOffsetPagination()
 
 
-class EnrollApiView(viewsets.ViewSet):
+class EnrollApiView(ConditionalGetMixin, viewsets.ViewSet):
     lookup_field = 'uuid'
     permission_classes = (IsAuthenticated,)
+    validator_fields = ('update_date', 'simulation__update_date',)
 
     def initialize_request(self, request, *args, **kwargs):
         self.user = request.user
         return super().initialize_request(request, *args, **kwargs)
 
     def queryset(self):
+        active_simulation = Simulation.objects.filter(is_done=False) \
+            .only('id', 'uuid', 'enroll_id', *PROGRESS_FIELDS)
         qs = Enroll.objects \
-            .prefetch_related('learner', 'course') \
-            .select_related('learner', 'course') \
+            .prefetch_related('learner', 'course',
+                              Prefetch('simulation', queryset=active_simulation, to_attr='active_simulation')) \
+            .select_related('learner', 'course', 'course_date') \
             .filter(learner_id=self.user.id)
 
         return qs
@@ -49,19 +61,37 @@ class EnrollApiView(viewsets.ViewSet):
     def list(self, request, format=None):
         context = {'request': request}
         queryset = self.queryset()
-        queryset_paginator = _PAGINATOR.paginate_queryset(queryset, request)
+        etag, last_modified = self.get_validators(request, queryset, user=self.user)
+        not_modified = self.get_not_modified(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        paginator = get_paginator(request, _PAGINATOR, queryset)
+        queryset_paginator = paginator.paginate_queryset(queryset, request)
         serializer = EnrollSerializer(queryset_paginator, many=True, context=context)
-        pagination_result = build_result_pagination(self, _PAGINATOR, serializer)
+        pagination_result = build_result_pagination(self, paginator, serializer)
 
-        return Response(pagination_result, status=response_status.HTTP_200_OK)
+        response = Response(pagination_result, status=response_status.HTTP_200_OK)
+        return self.set_validators(response, etag, last_modified)
 
     def retrieve(self, request, uuid=None, format=None):
         context = {'request': request}
+
+        try:
+            etag, last_modified = self.get_validators(request, self.queryset().filter(uuid=uuid),
+                                                      user=self.user)
+        except ValidationError as e:
+            raise NotAcceptable(detail=repr(e))
+
+        not_modified = self.get_not_modified(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
     
         queryset = self.get_object(uuid=uuid)
     
         serializer = EnrollSerializer(queryset, many=False, context=context)
-        return Response(serializer.data, status=response_status.HTTP_200_OK)
+        response = Response(serializer.data, status=response_status.HTTP_200_OK)
+        return self.set_validators(response, etag, last_modified)
 
     @method_decorator(never_cache)
     @transaction.atomic
@@ -89,18 +119,41 @@ class EnrollApiView(viewsets.ViewSet):
         return Response({'detail': _("Delete success!")},
                         status=response_status.HTTP_204_NO_CONTENT)
 
+    @method_decorator(never_cache)
+    @action(detail=False, methods=['post'], url_path='cohort',
+            permission_classes=(IsAdminUser,))
+    def cohort(self, request, format=None):
+        """
+        {"course_date": "...", "learners": ["user uuid", ...]}
+        """
+        serializer = EnrollCohortSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
 
-class SimulationApiView(viewsets.ViewSet):
+        try:
+            created, skipped, missing = enroll_cohort(serializer.validated_data['course_date'],
+                                                      serializer.validated_data['learners'])
+        except (ObjectDoesNotExist, IntegrityError) as e:
+            raise NotAcceptable(detail=repr(e))
+
+        result = {'created': len(created), 'skipped': skipped, 'missing': missing}
+        return Response(result, status=response_status.HTTP_201_CREATED)
+
+
+class SimulationApiView(ConditionalGetMixin, viewsets.ViewSet):
     lookup_field = 'uuid'
     permission_classes = (IsAuthenticated,)
+    validator_fields = ('update_date', 'simulation_quiz__update_date',)
 
     def initialize_request(self, request, *args, **kwargs):
         self.user = request.user
         return super().initialize_request(request, *args, **kwargs)
 
     def queryset(self):
+        simulation_quiz = SimulationQuiz.objects.select_related('course_quiz', 'quiz')
         qs = Simulation.objects \
-            .prefetch_related('learner', 'enroll', 'course') \
+            .prefetch_related('learner', 'enroll', 'course',
+                              Prefetch('simulation_quiz', queryset=simulation_quiz,
+                                       to_attr='simulation_quiz_state')) \
             .select_related('learner', 'enroll', 'course') \
             .filter(learner_id=self.user.id)
 
@@ -122,22 +175,40 @@ class SimulationApiView(viewsets.ViewSet):
 
         try:
             queryset = self.queryset().filter(enroll__uuid=enroll_uuid)
+            etag, last_modified = self.get_validators(request, queryset, user=self.user)
         except ValidationError as e:
             raise NotAcceptable(detail=repr(e))
 
-        queryset_paginator = _PAGINATOR.paginate_queryset(queryset, request)
+        not_modified = self.get_not_modified(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        paginator = get_paginator(request, _PAGINATOR, queryset)
+        queryset_paginator = paginator.paginate_queryset(queryset, request)
         serializer = SimulationSerializer(queryset_paginator, many=True, context=context)
-        pagination_result = build_result_pagination(self, _PAGINATOR, serializer)
+        pagination_result = build_result_pagination(self, paginator, serializer)
 
-        return Response(pagination_result, status=response_status.HTTP_200_OK)
+        response = Response(pagination_result, status=response_status.HTTP_200_OK)
+        return self.set_validators(response, etag, last_modified)
 
     def retrieve(self, request, uuid=None, format=None):
         context = {'request': request}
+
+        try:
+            etag, last_modified = self.get_validators(request, self.queryset().filter(uuid=uuid),
+                                                      user=self.user)
+        except ValidationError as e:
+            raise NotAcceptable(detail=repr(e))
+
+        not_modified = self.get_not_modified(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
     
         queryset = self.get_object(uuid=uuid)
     
         serializer = SimulationSerializer(queryset, many=False, context=context)
-        return Response(serializer.data, status=response_status.HTTP_200_OK)
+        response = Response(serializer.data, status=response_status.HTTP_200_OK)
+        return self.set_validators(response, etag, last_modified)
 
     @method_decorator(never_cache)
     @transaction.atomic
@@ -164,3 +235,34 @@ class SimulationApiView(viewsets.ViewSet):
         queryset.delete()
         return Response({'detail': _("Delete success!")},
                         status=response_status.HTTP_204_NO_CONTENT)
+
+    @method_decorator(never_cache)
+    @action(detail=True, methods=['post'], url_path='quiz-start')
+    def quiz_start(self, request, uuid=None, format=None):
+        """
+        {"simulation_quiz_uuid": "..."}, deadline fixed by server on first start,
+        start again return the same deadline
+        """
+        simulation_quiz_uuid = request.data.get('simulation_quiz_uuid', None)
+        if not simulation_quiz_uuid:
+            raise NotAcceptable(detail=_("Param simulation_quiz_uuid required"))
+
+        try:
+            simulation_quiz = SimulationQuiz.objects \
+                .select_related('course_quiz') \
+                .get(uuid=simulation_quiz_uuid, simulation__uuid=uuid,
+                     simulation__learner_id=self.user.id)
+        except (ObjectDoesNotExist, ValidationError) as e:
+            raise NotAcceptable(detail=repr(e))
+
+        if simulation_quiz.is_done:
+            raise NotAcceptable(detail=_("Quiz already done"))
+
+        simulation_quiz = start_quiz(simulation_quiz)
+        result = {
+            'simulation_quiz_uuid': simulation_quiz.uuid,
+            'start_date': simulation_quiz.start_date,
+            'deadline': simulation_quiz.deadline,
+            'server_date': timezone.now(),
+        }
+        return Response(result, status=response_status.HTTP_200_OK)
@@ -0,0 +1,38 @@
+from rest_framework import serializers
+from rest_framework.reverse import reverse
+
+from utils.generals import get_model
+
+Material = get_model('training', 'Material')
+
+
+class MaterialMediaField(serializers.Field):
+    """
+    Protected media url, file delivered after enroll check
+    """
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        if not instance.media:
+            return None
+
+        return reverse('training_api:learner:material-media', kwargs={'uuid': instance.uuid},
+                       request=self.context.get('request', None))
+
+
+class MaterialSerializer(serializers.ModelSerializer):
+    url = serializers.HyperlinkedIdentityField(view_name='training_api:learner:material-detail',
+                                               lookup_field='uuid', read_only=True)
+    text_url = serializers.HyperlinkedIdentityField(view_name='training_api:learner:material-text',
+                                                    lookup_field='uuid', read_only=True)
+
+    course = serializers.SlugRelatedField(slug_field='uuid', read_only=True)
+    chapter = serializers.SlugRelatedField(slug_field='uuid', read_only=True)
+    media = MaterialMediaField()
+
+    class Meta:
+        model = Material
+        exclude = ['id', 'text',]
@@ -0,0 +1,78 @@
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.db.models import F, ExpressionWrapper, TextField
+from django.http import StreamingHttpResponse
+from django.utils.http import http_date
+
+from rest_framework import viewsets, status as response_status
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotAcceptable, NotFound
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+
+from utils.generals import get_model
+from utils.fields import iter_decompress_text
+from utils.files import serve_file
+
+from .serializers import MaterialSerializer
+
+Material = get_model('training', 'Material')
+
+
+class MaterialApiView(viewsets.ViewSet):
+    lookup_field = 'uuid'
+    permission_classes = (IsAuthenticated,)
+
+    def queryset(self):
+        # Only material of course enrolled by learner
+        qs = Material.objects \
+            .prefetch_related('course', 'chapter') \
+            .select_related('course', 'chapter') \
+            .filter(course__enroll__learner_id=self.request.user.id) \
+            .distinct()
+
+        return qs
+
+    def get_object(self, uuid=None):
+        try:
+            queryset = self.queryset().get(uuid=uuid)
+        except (ObjectDoesNotExist, ValidationError) as e:
+            raise NotAcceptable(detail=repr(e))
+
+        return queryset
+
+    def retrieve(self, request, uuid=None, format=None):
+        context = {'request': request}
+        queryset = self.get_object(uuid=uuid)
+        serializer = MaterialSerializer(queryset, many=False, context=context)
+        return Response(serializer.data, status=response_status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'], url_path='text')
+    def text(self, request, uuid=None, format=None):
+        """
+        Material text as plain text, decompressed while streamed
+        """
+        queryset = self.get_object(uuid=uuid)
+
+        # Stored value without field conversion, decompressed chunk by chunk
+        value = Material.objects.filter(id=queryset.id) \
+            .annotate(stored_text=ExpressionWrapper(F('text'), output_field=TextField())) \
+            .values_list('stored_text', flat=True) \
+            .get()
+
+        response = StreamingHttpResponse(iter_decompress_text(value),
+                                         content_type='text/plain; charset=utf-8')
+        if queryset.update_date:
+            response['Last-Modified'] = http_date(queryset.update_date.timestamp())
+        return response
+
+    @action(detail=True, methods=['get'], url_path='media')
+    def media(self, request, uuid=None, format=None):
+        """
+        Material file for enrolled learner, support Range request
+        and front server offload with MEDIA_ACCEL_REDIRECT
+        """
+        queryset = self.get_object(uuid=uuid)
+        if not queryset.media:
+            raise NotFound()
+
+        return serve_file(request, queryset.media)
@@ -1,6 +1,13 @@
+from django.db import models, transaction
+from django.utils.translation import gettext_lazy as _
+
 from rest_framework import serializers
 
 from utils.generals import get_model
+from apps.training.utils.draw import drawn_questions
+from apps.training.utils.quiz import get_answer_keys
+from apps.training.utils.score import refresh_scores_for_answers
+from apps.training.utils.timer import closed_sessions
 from utils.mixin.validators import CleanValidateMixin
 from utils.mixin.api import (
     DynamicFieldsModelSerializer, 
@@ -18,6 +25,59 @@ CourseQuiz = get_model('training', 'CourseQuiz')
 Quiz = get_model('training', 'Quiz')
 User = get_model('person', 'User')
 
+# Most answer accepted in one batch
+ANSWER_BATCH_MAX = 200
+
+
+def validate_sessions_open(keys):
+    # Given (simulation_id, course_quiz_id), checked from cache
+    if closed_sessions(keys):
+        raise serializers.ValidationError(_("Quiz time is over"))
+
+
+def validate_answer_match(learner, data):
+    """
+    One answer consistent with itself and owned by learner, `data` hold
+    simulation, course, course_quiz, quiz, question and choice object.
+    Shared by every answer write path.
+    """
+    simulation, course, course_quiz = data['simulation'], data['course'], data['course_quiz']
+
+    if simulation.learner_id != learner.id:
+        raise serializers.ValidationError(_("Simulation %s not yours") % simulation.uuid)
+    if simulation.course_id != course.id or course_quiz.course_id != course.id \
+            or course_quiz.quiz_id != data['quiz'].id:
+        raise serializers.ValidationError(_("Course quiz %s not match") % course_quiz.uuid)
+    if data['choice'].question_id != data['question'].id:
+        raise serializers.ValidationError(_("Choice %s not in question") % data['choice'].uuid)
+
+
+def validate_questions_drawn(items):
+    """
+    Given (simulation_id, course_quiz_id, quiz_id, question), question must be
+    drawn for the simulation quiz, or in quiz when no draw stored
+    """
+    drawn = drawn_questions((item[0], item[1]) for item in items)
+    undrawn = [item for item in items if (item[0], item[1]) not in drawn]
+
+    pool = set()
+    if undrawn:
+        pool = set(
+            QuizQuestion.objects.filter(quiz_id__in=set(item[2] for item in undrawn),
+                                        question_id__in=set(item[3].id for item in undrawn))
+            .values_list('quiz_id', 'question_id')
+        )
+
+    for simulation_id, course_quiz_id, quiz_id, question in items:
+        questions = drawn.get((simulation_id, course_quiz_id), None)
+        if questions is not None:
+            valid = question.id in questions
+        else:
+            valid = (quiz_id, question.id) in pool
+
+        if not valid:
+            raise serializers.ValidationError(_("Question %s not in quiz") % question.uuid)
+
 
 class ChoiceSerializer(serializers.ModelSerializer):
     class Meta:
@@ -44,16 +104,47 @@ class QuizQuestionSerializer(serializers.ModelSerializer):
 
     def to_representation(self, value):
         ret = super().to_representation(value)
+
+        # Served from simulation draw, see `SimulationQuestion`
+        if hasattr(value, 'draw_position'):
+            ret['position'] = value.draw_position
+
+        choice_order = getattr(value, 'choice_order', None)
+        if choice_order:
+            order = {choice_uuid: index for index, choice_uuid in enumerate(choice_order)}
+            ret['question']['choice'] = sorted(ret['question']['choice'],
+                                               key=lambda item: order.get(str(item['uuid']), len(order)))
         return ret
 
 
 class AnswerListSerializer(ListSerializerUpdateMappingField, serializers.ListSerializer):
-    pass
+    def validate(self, attrs):
+        keys = set((obj.simulation_id, obj.course_quiz_id) for obj in self.instance or [])
+        for item in attrs:
+            if item.get('simulation') and item.get('course_quiz'):
+                keys.add((item['simulation'].id, item['course_quiz'].id))
+
+        validate_sessions_open(keys)
+        return attrs
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        ret = super().update(instance, validated_data)
+        refresh_scores_for_answers(list(instance) + list(ret))
+        return ret
+
+    def prepare_update(self, obj, fields):
+        # Grade again in memory, `Answer.save()` not called by bulk update
+        if fields:
+            obj.grade()
+            fields = list(set(fields) | {'position', 'is_true'})
+        return fields
 
 
 class AnswerSerializer(DynamicFieldsModelSerializer, CleanValidateMixin,
                        WritetableFieldPutMethod, serializers.ModelSerializer):
-    learner = serializers.SlugRelatedField(slug_field='uuid', queryset=User.objects.all())
+    # Always request user, value sent ignored
+    learner = serializers.SlugRelatedField(slug_field='uuid', queryset=User.objects.all(), required=False)
     simulation = serializers.SlugRelatedField(slug_field='uuid', queryset=Simulation.objects.all())
     course = serializers.SlugRelatedField(slug_field='uuid', queryset=Course.objects.all())
     course_quiz = serializers.SlugRelatedField(slug_field='uuid', queryset=CourseQuiz.objects.all())
@@ -65,3 +156,127 @@ class AnswerSerializer(DynamicFieldsModelSerializer, CleanValidateMixin,
         model = Answer
         fields = '__all__'
         list_serializer_class = AnswerListSerializer
+
+    related_fields = ['simulation', 'course', 'course_quiz', 'quiz', 'question', 'choice']
+
+    def get_row(self, attrs):
+        # Child of list serializer hold the whole queryset, pick the row
+        instance = self.instance
+        if instance is not None and not isinstance(instance, models.Model):
+            instance = next((obj for obj in instance if obj.uuid == attrs.get('uuid')), None)
+        return instance
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        learner = self.context['request'].user
+        attrs['learner'] = learner
+
+        # Value sent merged over stored one, e.g PUT of choice only
+        instance = self.get_row(attrs)
+        data = {field: attrs.get(field, getattr(instance, field, None)) for field in self.related_fields}
+        if any(value is None for value in data.values()):
+            raise serializers.ValidationError(_("Answer incomplete"))
+
+        validate_answer_match(learner, data)
+        if instance is None or any(field in attrs for field in ['simulation', 'course_quiz', 'question']):
+            validate_questions_drawn([(data['simulation'].id, data['course_quiz'].id, data['quiz'].id,
+                                       data['question'])])
+
+        # Child of list serializer checked once by the parent
+        if self.parent is None:
+            validate_sessions_open([(data['simulation'].id, data['course_quiz'].id)])
+        return attrs
+
+    def create(self, validated_data):
+        # Choose again replace previous answer to the question
+        instance = Answer(**validated_data)
+        instance.grade()
+        Answer.objects.upsert([instance])
+        refresh_scores_for_answers([instance])
+
+        return Answer.objects \
+            .select_related('learner', 'simulation', 'course', 'course_quiz', 'quiz',
+                            'question', 'choice') \
+            .for_upserted([instance])[0]
+
+
+class AnswerBatchItemSerializer(serializers.Serializer):
+    simulation = serializers.UUIDField()
+    course = serializers.UUIDField()
+    course_quiz = serializers.UUIDField()
+    quiz = serializers.UUIDField()
+    question = serializers.UUIDField()
+    choice = serializers.UUIDField()
+
+
+class AnswerBatchSerializer(serializers.Serializer):
+    """
+    Whole quiz answers at once, learner is request user.
+    Each uuid resolved with one IN query per model, graded in memory
+    and upserted, question answered before get the new choice.
+    """
+    answers = AnswerBatchItemSerializer(many=True, allow_empty=False, max_length=ANSWER_BATCH_MAX)
+
+    related_models = {
+        'simulation': Simulation,
+        'course': Course,
+        'course_quiz': CourseQuiz,
+        'quiz': Quiz,
+        'question': Question,
+        'choice': Choice,
+    }
+
+    def resolve(self, items):
+        resolved = dict()
+        for field, model in self.related_models.items():
+            uuids = set(item[field] for item in items)
+            resolved[field] = model.objects.in_bulk(uuids, field_name='uuid')
+
+            missing = uuids - set(resolved[field].keys())
+            if missing:
+                raise serializers.ValidationError(
+                    {field: _("Not found: %s") % ', '.join(sorted(str(uuid) for uuid in missing))}
+                )
+        return resolved
+
+    def validate_answers(self, items):
+        learner = self.context['request'].user
+        resolved = self.resolve(items)
+
+        answers = list()
+        seen = set()
+        for item in items:
+            data = {field: resolved[field][item[field]] for field in self.related_models}
+            simulation, course_quiz = data['simulation'], data['course_quiz']
+            key = (simulation.id, data['question'].id, course_quiz.id)
+
+            validate_answer_match(learner, data)
+            if key in seen:
+                raise serializers.ValidationError(_("Question %s answered twice") % data['question'].uuid)
+
+            seen.add(key)
+            answers.append(data)
+
+        validate_questions_drawn([(data['simulation'].id, data['course_quiz'].id, data['quiz'].id,
+                                   data['question']) for data in answers])
+        validate_sessions_open((data['simulation'].id, data['course_quiz'].id) for data in answers)
+        return answers
+
+    @transaction.atomic
+    def create(self, validated_data):
+        learner = self.context['request'].user
+        answer_keys = get_answer_keys(set(data['quiz'].id for data in validated_data['answers']))
+
+        objs = list()
+        for data in validated_data['answers']:
+            obj = Answer(learner=learner, **data)
+            obj.grade(answer_key=answer_keys[obj.quiz_id])
+            objs.append(obj)
+
+        # Answered question replaced, submit again is harmless
+        Answer.objects.upsert(objs)
+        refresh_scores_for_answers(objs)
+        return Answer.objects \
+            .select_related('learner', 'simulation', 'course', 'course_quiz', 'quiz',
+                            'question', 'choice') \
+            .for_upserted(objs)
@@ -1,75 +1,254 @@
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from django.db import transaction, IntegrityError
-from django.db.models import OuterRef, Subquery
+from django.db.models import OuterRef, Subquery, Max, Count
 from django.views.decorators.cache import never_cache
 from django.utils.decorators import method_decorator
+from django.utils.translation import gettext_lazy as _
 
 from rest_framework import viewsets, status as response_status
+from rest_framework.decorators import action
 from rest_framework.exceptions import NotAcceptable, NotFound
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.pagination import LimitOffsetPagination
 
-from .serializers import AnswerSerializer, QuizQuestionSerializer
+from .serializers import AnswerSerializer, AnswerBatchSerializer, QuizQuestionSerializer
 
 from utils.generals import get_model
-from utils.pagination import build_result_pagination
+from utils.mixin.api import ConditionalGetMixin
+from utils.pagination import build_result_pagination, get_paginator
+from apps.training.utils.quiz import draw_quiz_bundle, get_quiz_bundle
 
+Quiz = get_model('training', 'Quiz')
 QuizQuestion = get_model('training', 'QuizQuestion')
 Answer = get_model('training', 'Answer')
+Simulation = get_model('training', 'Simulation')
+SimulationQuiz = get_model('training', 'SimulationQuiz')
+SimulationQuestion = get_model('training', 'SimulationQuestion')
 
 # Define to avoid used ...().paginate__
 _PAGINATOR = LimitOffsetPagination()
 
+# Quiz drawing question per simulation never serve the whole pool
+DRAW_REQUIRED = _("Quiz draw question per simulation, param simulation_uuid required")
 
-class QuizQuestionApiView(viewsets.ViewSet):
+
+class QuizQuestionApiView(ConditionalGetMixin, viewsets.ViewSet):
     lookup_field = 'uuid'
     permission_classes = (IsAuthenticated,)
+    validator_fields = ('update_date', 'question__update_date', 'question__choice__update_date',)
 
-    def queryset(self):
-        answer = Answer.objects.filter(question__uuid=OuterRef('question__uuid'),
-                                       quiz__uuid=OuterRef('quiz__uuid'))
-
+    def queryset(self, simulation=None):
         qs = QuizQuestion.objects.prefetch_related('question', 'quiz') \
-            .select_related('question', 'quiz') \
-            .annotate(
+            .select_related('question', 'quiz')
+
+        # With simulation answers merged after fetch, see `set_answers`
+        if simulation is None:
+            answer = Answer.objects.filter(learner_id=self.request.user.id,
+                                           question_id=OuterRef('question_id'),
+                                           quiz_id=OuterRef('quiz_id'))
+
+            qs = qs.annotate(
                 answer_uuid=Subquery(answer[:1].values('uuid')),
                 answer_choice_uuid=Subquery(answer[:1].values('choice__uuid'))
             )
 
         return qs
 
-    def get_object(self, uuid=None):
+    def get_simulation(self, request):
+        simulation_uuid = request.query_params.get('simulation_uuid', None)
+        if not simulation_uuid:
+            return None
+
         try:
-            queryset = self.queryset().get(uuid=uuid)
+            return Simulation.objects.only('id').get(uuid=simulation_uuid, learner_id=request.user.id)
+        except (ObjectDoesNotExist, ValidationError) as e:
+            raise NotAcceptable(detail=repr(e))
+
+    def get_simulation_quiz(self, simulation, quiz_uuid):
+        # Only simulation quiz with materialized draw served from it
+        return SimulationQuiz.objects.only('id', 'question_count') \
+            .filter(simulation_id=simulation.id, quiz__uuid=quiz_uuid, question_count__gt=0) \
+            .order_by('-create_date') \
+            .first()
+
+    def drawn_queryset(self, simulation_quiz):
+        return SimulationQuestion.objects \
+            .filter(simulation_quiz_id=simulation_quiz.id) \
+            .select_related('quiz_question__question', 'quiz_question__quiz') \
+            .prefetch_related('quiz_question__question__choice') \
+            .order_by('position')
+
+    def set_draw(self, simulation_questions):
+        # Drawn position and choice order carried by quiz question
+        quiz_questions = list()
+        for obj in simulation_questions:
+            item = obj.quiz_question
+            item.draw_position, item.choice_order = obj.position, obj.choice_order
+            quiz_questions.append(item)
+        return quiz_questions
+
+    def set_answers(self, quiz_questions, simulation):
+        """
+        Learner answer in simulation for given quiz questions,
+        one query on (simulation, question) index
+        """
+        quiz_questions = list(quiz_questions)
+        answers = dict()
+        answer_objs = Answer.objects \
+            .filter(simulation_id=simulation.id,
+                    question_id__in=[item.question_id for item in quiz_questions]) \
+            .order_by('create_date') \
+            .values_list('quiz_id', 'question_id', 'uuid', 'choice__uuid')
+
+        # Latest answer win, same as before
+        for quiz_id, question_id, answer_uuid, choice_uuid in answer_objs:
+            answers[(quiz_id, question_id)] = (answer_uuid, choice_uuid)
+
+        for item in quiz_questions:
+            item.answer_uuid, item.answer_choice_uuid = answers.get((item.quiz_id, item.question_id),
+                                                                    (None, None))
+        return quiz_questions
+
+    def get_object(self, uuid=None, simulation=None):
+        try:
+            queryset = self.queryset(simulation=simulation).get(uuid=uuid)
         except ObjectDoesNotExist:
             raise NotFound()
 
+        if simulation is None:
+            if queryset.quiz.draw_count:
+                raise NotAcceptable(detail=DRAW_REQUIRED)
+            return queryset
+
+        drawn = SimulationQuestion.objects \
+            .filter(simulation_quiz__simulation_id=simulation.id, quiz_question_id=queryset.id) \
+            .values_list('position', 'choice_order') \
+            .first()
+        if drawn is not None:
+            queryset.draw_position, queryset.choice_order = drawn
+        elif queryset.quiz.draw_count or SimulationQuestion.objects \
+                .filter(simulation_quiz__simulation_id=simulation.id, quiz_question__quiz_id=queryset.quiz_id) \
+                .exists():
+            # Not drawn for this simulation
+            raise NotFound()
+
+        self.set_answers([queryset], simulation)
         return queryset
 
+    def get_quiz_validators(self, request, queryset):
+        # Learner answers are part of representation
+        answer = Answer.objects \
+            .filter(learner_id=request.user.id, quiz_id__in=queryset.values('quiz_id')) \
+            .aggregate(last=Max('update_date'), total=Count('id'))
+
+        return self.get_validators(request, queryset, user=request.user,
+                                   extra=[answer['last'], answer['total']])
+
     def list(self, request, format=None):
         context = {'request': request}
         quiz_uuid = request.query_params.get('quiz_uuid', None)
+        position = request.query_params.get('position', None)
+        simulation = self.get_simulation(request)
 
         try:
-            queryset = self.queryset().filter(quiz__uuid=quiz_uuid)
-        except ValidationError as e:
+            etag, last_modified = self.get_quiz_validators(
+                request, QuizQuestion.objects.filter(quiz__uuid=quiz_uuid))
+
+            simulation_quiz = None
+            if simulation is not None:
+                simulation_quiz = self.get_simulation_quiz(simulation, quiz_uuid)
+
+            if simulation_quiz is None and Quiz.objects.filter(uuid=quiz_uuid, draw_count__gt=0).exists():
+                raise NotAcceptable(detail=DRAW_REQUIRED)
+
+            # Question drawn for simulation served by position
+            if simulation_quiz is not None:
+                queryset = self.drawn_queryset(simulation_quiz)
+                if position is not None:
+                    queryset = queryset.filter(position=int(position))
+            else:
+                queryset = self.queryset(simulation=simulation).filter(quiz__uuid=quiz_uuid)
+        except (ValidationError, ValueError) as e:
             raise NotAcceptable(detail=repr(e))
+
+        not_modified = self.get_not_modified(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
         
-        _PAGINATOR.default_limit = 1
+        paginator = get_paginator(request, _PAGINATOR, queryset)
+        paginator.default_limit = 1
+
+        queryset_paginator = paginator.paginate_queryset(queryset, request)
+        if simulation_quiz is not None:
+            queryset_paginator = self.set_draw(queryset_paginator)
+        if simulation is not None:
+            queryset_paginator = self.set_answers(queryset_paginator, simulation)
 
-        queryset_paginator = _PAGINATOR.paginate_queryset(queryset, request)
         serializer = QuizQuestionSerializer(queryset_paginator, many=True, context=context)
-        pagination_result = build_result_pagination(self, _PAGINATOR, serializer)
+        pagination_result = build_result_pagination(self, paginator, serializer)
 
-        return Response(pagination_result, status=response_status.HTTP_200_OK)
+        response = Response(pagination_result, status=response_status.HTTP_200_OK)
+        return self.set_validators(response, etag, last_modified)
 
     def retrieve(self, request, uuid=None, format=None):
         context = {'request': request}
-        queryset = self.get_object(uuid=uuid)
+        simulation = self.get_simulation(request)
+
+        try:
+            etag, last_modified = self.get_quiz_validators(
+                request, QuizQuestion.objects.filter(uuid=uuid))
+        except ValidationError:
+            raise NotFound()
+
+        not_modified = self.get_not_modified(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        queryset = self.get_object(uuid=uuid, simulation=simulation)
         serialzer = QuizQuestionSerializer(queryset, many=False, context=context)
         
-        return Response(serialzer.data, status=response_status.HTTP_200_OK)
+        response = Response(serialzer.data, status=response_status.HTTP_200_OK)
+        return self.set_validators(response, etag, last_modified)
+
+    @action(detail=False, methods=['get'], url_path='bundle')
+    def bundle(self, request, format=None):
+        """
+        Every question and choice of quiz in one response,
+        `version` change whenever quiz content change.
+        Quiz drawing question per simulation only served
+        with `simulation_uuid`, limited to the draw.
+        """
+        quiz_uuid = request.query_params.get('quiz_uuid', None)
+        if not quiz_uuid:
+            raise NotAcceptable(detail=_("Param quiz_uuid required"))
+
+        simulation = self.get_simulation(request)
+        try:
+            bundle = get_quiz_bundle(quiz_uuid)
+
+            simulation_quiz = None
+            if simulation is not None:
+                simulation_quiz = self.get_simulation_quiz(simulation, quiz_uuid)
+        except (ObjectDoesNotExist, ValidationError, ValueError) as e:
+            raise NotAcceptable(detail=repr(e))
+
+        if simulation_quiz is not None:
+            draw = SimulationQuestion.objects \
+                .filter(simulation_quiz_id=simulation_quiz.id) \
+                .order_by('position') \
+                .values_list('quiz_question__uuid', 'choice_order')
+            bundle = draw_quiz_bundle(bundle, list(draw))
+        elif bundle['draw_count']:
+            raise NotAcceptable(detail=DRAW_REQUIRED)
+
+        etag = '"%s"' % bundle['version']
+        not_modified = self.get_not_modified(request, etag)
+        if not_modified is not None:
+            return not_modified
+
+        response = Response(bundle, status=response_status.HTTP_200_OK)
+        return self.set_validators(response, etag)
 
 
 class AnswerApiView(viewsets.ViewSet):
@@ -129,7 +308,8 @@ class AnswerApiView(viewsets.ViewSet):
             update_fields.extend(list(item.keys()))
         update_fields = list(dict.fromkeys(update_fields))
     
-        queryset = self.queryset().filter(uuid__in=update_uuids).only(*update_fields)
+        queryset = self.queryset().filter(uuid__in=update_uuids, learner_id=request.user.id) \
+            .only(*update_fields)
         serializer = AnswerSerializer(queryset, data=request.data, many=True,
                                       context=context, fields_used=update_fields)
 
@@ -140,3 +320,22 @@ class AnswerApiView(viewsets.ViewSet):
                 raise NotAcceptable(detail=str(e))
             return Response(serializer.data, status=response_status.HTTP_200_OK)
         return Response(serializer.errors, status=response_status.HTTP_400_BAD_REQUEST)
+
+    @method_decorator(never_cache)
+    @action(detail=False, methods=['post'], url_path='batch')
+    def batch(self, request, format=None):
+        """
+        {"answers": [{simulation, course, course_quiz, quiz, question, choice}, ...]}
+        """
+        context = {'request': request}
+        serializer = AnswerBatchSerializer(data=request.data, context=context)
+
+        if serializer.is_valid(raise_exception=True):
+            try:
+                answers = serializer.save()
+            except (ValidationError, IntegrityError) as e:
+                raise NotAcceptable(detail=str(e))
+
+            result = AnswerSerializer(answers, many=True, context=context)
+            return Response(result.data, status=response_status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=response_status.HTTP_400_BAD_REQUEST)
@@ -5,6 +5,7 @@ from rest_framework.routers import DefaultRouter
 from .course.v1.views import CourseApiView, CourseQuizApiView
 from .enroll.v1.views import EnrollApiView, SimulationApiView
 from .quiz.v1.views import QuizQuestionApiView, AnswerApiView
+from .material.v1.views import MaterialApiView
 
 # Create a router and register our viewsets with it.
 router = DefaultRouter()
@@ -14,6 +15,7 @@ router.register('enrolls', EnrollApiView, basename='enroll')
 router.register('simulations', SimulationApiView, basename='simulation')
 router.register('quizquestions', QuizQuestionApiView, basename='quizquestion')
 router.register('answers', AnswerApiView, basename='answer')
+router.register('materials', MaterialApiView, basename='material')
 
 app_name = 'learner'
 
@@ -1,5 +1,5 @@
 from django.apps import AppConfig
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete, post_migrate
 
 
 class TrainingConfig(AppConfig):
@@ -8,9 +8,143 @@ class TrainingConfig(AppConfig):
     def ready(self):
         from utils.generals import get_model
 
-        from .singals import enroll_save_handler
+        from .singals import (
+            enroll_save_handler,
+            course_date_save_handler,
+            course_cache_invalidate_handler,
+            course_search_handler,
+            course_search_delete_handler,
+            course_search_setup_handler,
+            previous_pre_save_handler,
+            course_facet_handler,
+            course_date_facet_handler,
+            category_facet_handler,
+            category_facet_delete_handler,
+            cover_rendition_handler,
+            quiz_bundle_invalidate_handler,
+            answer_key_invalidate_handler,
+            simulation_quiz_score_handler,
+            answer_score_handler,
+            simulation_quiz_session_handler,
+            simulation_question_draw_handler,
+            simulation_progress_handler,
+            course_progress_total_handler
+        )
 
         Enroll = get_model('training', 'Enroll')
+        Category = get_model('training', 'Category')
+        Course = get_model('training', 'Course')
+        CourseDate = get_model('training', 'CourseDate')
+        Chapter = get_model('training', 'Chapter')
+        Material = get_model('training', 'Material')
+        CourseQuiz = get_model('training', 'CourseQuiz')
+        Quiz = get_model('training', 'Quiz')
+        QuizQuestion = get_model('training', 'QuizQuestion')
+        Question = get_model('training', 'Question')
+        Choice = get_model('training', 'Choice')
+        SimulationChapter = get_model('training', 'SimulationChapter')
+        SimulationQuiz = get_model('training', 'SimulationQuiz')
+        Answer = get_model('training', 'Answer')
 
         post_save.connect(enroll_save_handler, sender=Enroll,
                           dispatch_uid='enroll_save_signal')
+
+        post_save.connect(course_date_save_handler, sender=CourseDate,
+                          dispatch_uid='course_date_save_signal')
+        post_delete.connect(course_date_save_handler, sender=CourseDate,
+                            dispatch_uid='course_date_delete_signal')
+
+        # Cached course detail
+        for model in [Course, CourseDate, Chapter, Material, CourseQuiz]:
+            name = model._meta.model_name
+            post_save.connect(course_cache_invalidate_handler, sender=model,
+                              dispatch_uid='%s_save_course_cache_signal' % name)
+            post_delete.connect(course_cache_invalidate_handler, sender=model,
+                                dispatch_uid='%s_delete_course_cache_signal' % name)
+
+        # Course search index
+        post_migrate.connect(course_search_setup_handler, sender=self,
+                             dispatch_uid='course_search_setup_signal')
+
+        for model in [Course, Category, Chapter]:
+            name = model._meta.model_name
+            post_save.connect(course_search_handler, sender=model,
+                              dispatch_uid='%s_save_course_search_signal' % name)
+
+        post_delete.connect(course_search_handler, sender=Chapter,
+                            dispatch_uid='chapter_delete_course_search_signal')
+        post_delete.connect(course_search_delete_handler, sender=Course,
+                            dispatch_uid='course_delete_course_search_signal')
+
+        # Value before save, used by facet rollup, cover rendition and progress
+        for model in [Course, CourseDate, SimulationChapter, SimulationQuiz]:
+            name = model._meta.model_name
+            pre_save.connect(previous_pre_save_handler, sender=model,
+                             dispatch_uid='%s_pre_save_previous_signal' % name)
+
+        # Catalog facet rollup
+        post_save.connect(course_facet_handler, sender=Course,
+                          dispatch_uid='course_save_facet_signal')
+        post_delete.connect(course_facet_handler, sender=Course,
+                            dispatch_uid='course_delete_facet_signal')
+        post_save.connect(course_date_facet_handler, sender=CourseDate,
+                          dispatch_uid='course_date_save_facet_signal')
+        post_delete.connect(course_date_facet_handler, sender=CourseDate,
+                            dispatch_uid='course_date_delete_facet_signal')
+        post_save.connect(category_facet_handler, sender=Category,
+                          dispatch_uid='category_save_facet_signal')
+        post_delete.connect(category_facet_delete_handler, sender=Category,
+                            dispatch_uid='category_delete_facet_signal')
+
+        # Cover rendition
+        post_save.connect(cover_rendition_handler, sender=Course,
+                          dispatch_uid='course_save_cover_rendition_signal')
+
+        # Cached quiz bundle
+        for model in [Quiz, QuizQuestion, Question, Choice]:
+            name = model._meta.model_name
+            post_save.connect(quiz_bundle_invalidate_handler, sender=model,
+                              dispatch_uid='%s_save_quiz_bundle_signal' % name)
+            post_delete.connect(quiz_bundle_invalidate_handler, sender=model,
+                                dispatch_uid='%s_delete_quiz_bundle_signal' % name)
+
+        # Answer key for grading
+        for model in [QuizQuestion, Choice]:
+            name = model._meta.model_name
+            post_save.connect(answer_key_invalidate_handler, sender=model,
+                              dispatch_uid='%s_save_answer_key_signal' % name)
+            post_delete.connect(answer_key_invalidate_handler, sender=model,
+                                dispatch_uid='%s_delete_answer_key_signal' % name)
+
+        # Simulation quiz score
+        pre_save.connect(simulation_quiz_score_handler, sender=SimulationQuiz,
+                         dispatch_uid='simulation_quiz_pre_save_score_signal')
+        post_save.connect(answer_score_handler, sender=Answer,
+                          dispatch_uid='answer_save_score_signal')
+        post_delete.connect(answer_score_handler, sender=Answer,
+                            dispatch_uid='answer_delete_score_signal')
+
+        # Quiz session deadline
+        post_save.connect(simulation_quiz_session_handler, sender=SimulationQuiz,
+                          dispatch_uid='simulation_quiz_save_session_signal')
+        post_delete.connect(simulation_quiz_session_handler, sender=SimulationQuiz,
+                            dispatch_uid='simulation_quiz_delete_session_signal')
+
+        # Question draw per simulation
+        post_save.connect(simulation_question_draw_handler, sender=SimulationQuiz,
+                          dispatch_uid='simulation_quiz_save_draw_signal')
+
+        # Simulation progress counters
+        for model in [SimulationChapter, SimulationQuiz]:
+            name = model._meta.model_name
+            post_save.connect(simulation_progress_handler, sender=model,
+                              dispatch_uid='%s_save_progress_signal' % name)
+            post_delete.connect(simulation_progress_handler, sender=model,
+                                dispatch_uid='%s_delete_progress_signal' % name)
+
+        for model in [Chapter, CourseQuiz]:
+            name = model._meta.model_name
+            post_save.connect(course_progress_total_handler, sender=model,
+                              dispatch_uid='%s_save_progress_total_signal' % name)
+            post_delete.connect(course_progress_total_handler, sender=model,
+                                dispatch_uid='%s_delete_progress_total_signal' % name)
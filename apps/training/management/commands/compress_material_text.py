@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, ExpressionWrapper, TextField
+
+from utils.generals import get_model
+from utils.fields import COMPRESSED_PREFIX, compress_text
+
+Material = get_model('training', 'Material')
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = "Compress material text saved before compressed storage."
+
+    def handle(self, *args, **options):
+        queryset = Material.objects \
+            .annotate(stored_text=ExpressionWrapper(F('text'), output_field=TextField())) \
+            .exclude(stored_text__isnull=True) \
+            .exclude(stored_text__startswith=COMPRESSED_PREFIX) \
+            .order_by('id') \
+            .values_list('id', 'stored_text')
+
+        updated = 0
+        last_id = 0
+        while True:
+            rows = list(queryset.filter(id__gt=last_id)[:BATCH_SIZE])
+            if not rows:
+                break
+
+            for material_id, value in rows:
+                # Field compress on write, short text kept as is
+                if compress_text(value) != value:
+                    Material.objects.filter(id=material_id).update(text=value)
+                    updated += 1
+                last_id = material_id
+
+        self.stdout.write(self.style.SUCCESS("Compressed %s material" % updated))
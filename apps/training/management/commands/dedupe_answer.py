@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Max
+
+from utils.generals import get_model
+
+Answer = get_model('training', 'Answer')
+
+
+class Command(BaseCommand):
+    help = "Keep only latest answer per simulation, question and course quiz. " \
+           "Run before applying unique answer constraint."
+
+    def handle(self, *args, **options):
+        duplicates = Answer.objects \
+            .order_by() \
+            .values('simulation_id', 'question_id', 'course_quiz_id') \
+            .annotate(total=Count('id'), last_id=Max('id')) \
+            .filter(total__gt=1)
+
+        deleted = 0
+        for item in duplicates.iterator():
+            total, _rows = Answer.objects \
+                .filter(simulation_id=item['simulation_id'], question_id=item['question_id'],
+                        course_quiz_id=item['course_quiz_id']) \
+                .exclude(id=item['last_id']) \
+                .delete()
+            deleted += total
+
+        self.stdout.write(self.style.SUCCESS("Deleted %s answer" % deleted))
@@ -0,0 +1,41 @@
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from utils.generals import get_model
+from apps.training.utils.enroll import COHORT_BATCH_SIZE, enroll_cohort
+
+CourseDate = get_model('training', 'CourseDate')
+
+
+class Command(BaseCommand):
+    help = "Enroll many learners to a course date at once."
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_date', help="Course date uuid")
+        parser.add_argument('learners', nargs='*', help="Learner uuid")
+        parser.add_argument('--file', dest='file', help="File with one learner uuid per line")
+        parser.add_argument('--batch-size', type=int, default=COHORT_BATCH_SIZE, dest='batch_size')
+
+    def handle(self, *args, **options):
+        learners = list(options['learners'])
+        if options['file']:
+            with open(options['file']) as f:
+                learners.extend(line.strip() for line in f if line.strip())
+
+        if not learners:
+            raise CommandError("No learner given")
+
+        try:
+            course_date = CourseDate.objects.get(uuid=options['course_date'])
+            created, skipped, missing = enroll_cohort(course_date, learners,
+                                                      batch_size=options['batch_size'])
+        except (ObjectDoesNotExist, ValidationError) as e:
+            raise CommandError(repr(e))
+
+        for uuid in missing:
+            self.stderr.write("Learner not found: %s" % uuid)
+
+        self.stdout.write(self.style.SUCCESS(
+            "Enrolled %s learner, skipped %s already enrolled, %s not found"
+            % (len(created), len(skipped), len(missing))
+        ))
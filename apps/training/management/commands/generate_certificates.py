@@ -0,0 +1,37 @@
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from utils.generals import get_model
+from apps.training.tasks import generate_course_date_certificates
+from apps.training.utils.certificate import CERTIFICATE_BATCH_SIZE, generate_certificates
+
+CourseDate = get_model('training', 'CourseDate')
+
+
+class Command(BaseCommand):
+    help = "Make missing certificates of learners done with a course date."
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_date', help="Course date uuid")
+        parser.add_argument('--processes', type=int, default=None, dest='processes')
+        parser.add_argument('--batch-size', type=int, default=CERTIFICATE_BATCH_SIZE, dest='batch_size')
+        parser.add_argument('--async', action='store_true', dest='async',
+                            help="Queue on celery worker instead")
+
+    def handle(self, *args, **options):
+        try:
+            course_date = CourseDate.objects.only('id').get(uuid=options['course_date'])
+        except (ObjectDoesNotExist, ValidationError) as e:
+            raise CommandError(repr(e))
+
+        if options['async']:
+            result = generate_course_date_certificates.delay(course_date.id)
+            self.stdout.write(self.style.SUCCESS("Queued as task %s" % result.id))
+            return
+
+        def progress(done, total):
+            self.stdout.write("%s/%s" % (done, total))
+
+        created = generate_certificates(course_date.id, processes=options['processes'],
+                                        batch_size=options['batch_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS("Created %s certificate" % created))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from utils.generals import get_model
+from apps.training.tasks import generate_cover_renditions
+
+Course = get_model('training', 'Course')
+
+
+class Command(BaseCommand):
+    help = "Queue cover rendition for course without one. Use --all to render every cover again."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', dest='rebuild',
+                            help="Render every cover, not only missing one")
+
+    def handle(self, *args, **options):
+        queryset = Course.objects.exclude(cover__isnull=True).exclude(cover='')
+        if not options['rebuild']:
+            queryset = queryset.filter(cover_width__isnull=True)
+
+        course_ids = list(queryset.order_by('id').values_list('id', flat=True))
+        for course_id in course_ids:
+            generate_cover_renditions.delay(course_id)
+
+        self.stdout.write(self.style.SUCCESS("Queued %s course" % len(course_ids)))
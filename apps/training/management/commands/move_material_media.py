@@ -0,0 +1,32 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from utils.generals import get_model
+
+Material = get_model('training', 'Material')
+
+
+class Command(BaseCommand):
+    help = "Move material media saved under public MEDIA_ROOT to protected storage."
+
+    def handle(self, *args, **options):
+        storage = Material._meta.get_field('media').storage
+        names = Material.objects.exclude(media='').exclude(media__isnull=True) \
+            .values_list('media', flat=True)
+
+        moved = 0
+        for name in names.iterator():
+            if storage.exists(name) or not default_storage.exists(name):
+                continue
+
+            # Same name kept, row unchanged
+            with default_storage.open(name, 'rb') as f:
+                saved = storage._save(name, f)
+            if saved == name:
+                default_storage.delete(name)
+                moved += 1
+            else:
+                storage.delete(saved)
+                self.stderr.write("Could not keep name %s, left in place" % name)
+
+        self.stdout.write(self.style.SUCCESS("Moved %s material media" % moved))
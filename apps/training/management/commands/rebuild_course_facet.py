@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.training.utils.facet import rebuild_facets
+
+
+class Command(BaseCommand):
+    help = "Recompute catalog facet counts for every category and month."
+
+    def handle(self, *args, **options):
+        rebuild_facets()
+        self.stdout.write(self.style.SUCCESS("Course facet rebuilt"))
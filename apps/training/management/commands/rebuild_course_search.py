@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from apps.training.utils.search import get_backend, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Create course search index table when missing and reindex every course."
+
+    def handle(self, *args, **options):
+        get_backend().setup()
+        total = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS("Indexed %s course" % total))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from apps.training.utils.course import roll_forward_next_course_date
+
+
+class Command(BaseCommand):
+    help = "Refresh course next upcoming session. Use --all to backfill every course."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', dest='rebuild',
+                            help="Refresh every course, not only passed sessions")
+
+    def handle(self, *args, **options):
+        updated = roll_forward_next_course_date(rebuild=options['rebuild'])
+        self.stdout.write(self.style.SUCCESS("Updated %s course" % updated))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from utils.generals import get_model
+from apps.training.utils.progress import PROGRESS_BATCH_SIZE, refresh_progress
+
+Simulation = get_model('training', 'Simulation')
+
+
+class Command(BaseCommand):
+    help = "Recompute progress counters of simulations from chapters and quizzes done."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', dest='all',
+                            help="Include finished simulation")
+        parser.add_argument('--batch-size', type=int, default=PROGRESS_BATCH_SIZE, dest='batch_size')
+
+    def handle(self, *args, **options):
+        queryset = Simulation.objects.order_by('id')
+        if not options['all']:
+            queryset = queryset.filter(is_done=False)
+
+        done = 0
+        changed = 0
+        last_id = 0
+        while True:
+            batch = list(queryset.filter(id__gt=last_id).values_list('id', flat=True)[:options['batch_size']])
+            if not batch:
+                break
+
+            changed += refresh_progress(batch)
+            done += len(batch)
+            last_id = batch[-1]
+
+        self.stdout.write(self.style.SUCCESS("Checked %s simulation, repaired %s" % (done, changed)))
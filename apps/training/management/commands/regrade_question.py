@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from utils.generals import get_model
+from apps.training.utils.score import REGRADE_BATCH_SIZE, regrade_question
+
+Question = get_model('training', 'Question')
+
+
+class Command(BaseCommand):
+    help = "Grade stored answers of questions again after their true choice changed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('uuids', nargs='+', help="Question uuid")
+        parser.add_argument('--batch-size', type=int, default=REGRADE_BATCH_SIZE, dest='batch_size')
+
+    def handle(self, *args, **options):
+        questions = list(Question.objects.filter(uuid__in=options['uuids']).values_list('id', 'label'))
+        if len(questions) != len(set(options['uuids'])):
+            raise CommandError("Some question not found")
+
+        for question_id, label in questions:
+            def progress(done, total):
+                self.stdout.write("%s: %s/%s" % (label, done, total))
+
+            changed = regrade_question(question_id, batch_size=options['batch_size'], progress=progress)
+            self.stdout.write(self.style.SUCCESS("%s: changed %s answer" % (label, changed)))
@@ -4,6 +4,9 @@ from django.conf import settings
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
+from utils.fields import CompressedTextField
+from utils.files import ProtectedStorage
+
 from ..utils.constants import BEFORE, POSITION_CHOICES
 
 
@@ -44,16 +47,48 @@ class AbstractCourse(models.Model):
     cover = models.ImageField(max_length=500, upload_to='images/course', null=True, blank=True)
     is_active = models.BooleanField(default=True, help_text=_("Available for public or not"))
 
+    # Nearest upcoming session, maintained by CourseDate signals
+    # and the roll forward task so the catalog doesn't join CourseDate
+    next_course_date = models.ForeignKey('training.CourseDate', on_delete=models.SET_NULL,
+                                         null=True, blank=True, editable=False, related_name='+')
+    next_start_date = models.DateTimeField(null=True, blank=True, editable=False)
+
+    # Cover size and resized variants, written by the rendition task
+    # so nothing has to open the file to learn dimensions
+    cover_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    cover_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    cover_renditions = models.JSONField(default=dict, blank=True, editable=False,
+                                        help_text=_("Width to WebP and JPEG file"))
+
+    # Columns maintained outside the model form
+    MAINTAINED_FIELDS = ('next_course_date', 'next_start_date',
+                         'cover_width', 'cover_height', 'cover_renditions')
+
     class Meta:
         abstract = True
         app_label = 'training'
         ordering = ['-create_date']
         verbose_name = _("Course")
         verbose_name_plural = _("Courses")
+        indexes = [
+            models.Index(fields=['is_active', 'next_start_date'],
+                         name='%(app_label)s_%(class)s_next_idx'),
+        ]
 
     def __str__(self):
         return self.label
 
+    def save(self, *args, **kwargs):
+        # Next session and cover rendition columns owned by signals and tasks,
+        # don't overwrite them with value loaded before
+        if not self._state.adding and not kwargs.get('update_fields'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.MAINTAINED_FIELDS
+            ]
+
+        super().save(*args, **kwargs)
+
 
 class AbstractCourseDate(models.Model):
     uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
@@ -62,7 +97,7 @@ class AbstractCourseDate(models.Model):
 
     course = models.ForeignKey('training.Course', on_delete=models.CASCADE,
                                related_name='course_date')
-    start_date = models.DateTimeField(auto_now=False)
+    start_date = models.DateTimeField(auto_now=False, db_index=True)
     end_date = models.DateTimeField(auto_now=False)
 
     class Meta:
@@ -98,6 +133,20 @@ class AbstractChapter(models.Model):
         return self.label
 
 
+class MaterialQuerySet(models.query.QuerySet):
+    def with_text(self):
+        return self.defer(None)
+
+
+class MaterialManager(models.Manager.from_queryset(MaterialQuerySet)):
+    """
+    Text left out by default, loaded only with `with_text()`
+    or when accessed on single object
+    """
+    def get_queryset(self):
+        return super().get_queryset().defer('text')
+
+
 class AbstractMaterial(models.Model):
     MEDIA = 'media'
     TEXT = 'text'
@@ -117,8 +166,11 @@ class AbstractMaterial(models.Model):
 
     type = models.CharField(choices=MATERIAL_TYPES, default=MEDIA, max_length=10)
     media = models.FileField(max_length=500, upload_to='material/file', null=True, blank=True,
+                             storage=ProtectedStorage(),
                              help_text=_("Place video, audio, pdf or image here"))
-    text = models.TextField(null=True, blank=True)
+    text = CompressedTextField(null=True, blank=True)
+
+    objects = MaterialManager()
 
     class Meta:
         abstract = True
@@ -179,6 +231,50 @@ class AbstractCertificate(models.Model):
         ordering = ['-create_date']
         verbose_name = _("Certificate")
         verbose_name_plural = _("Certificates")
+        constraints = [
+            models.UniqueConstraint(
+                fields=['learner', 'course'],
+                name='unique_certificate'
+            )
+        ]
 
     def __str__(self):
         return self.learner.username
+
+
+class AbstractCourseFacet(models.Model):
+    """
+    Precomputed catalog facet count
+    Category facet count upcoming course, month facet count upcoming session
+    """
+    CATEGORY = 'category'
+    MONTH = 'month'
+    FACET_CHOICES = (
+        (CATEGORY, _("Category")),
+        (MONTH, _("Month")),
+    )
+
+    uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+    create_date = models.DateTimeField(auto_now_add=True, null=True)
+    update_date = models.DateTimeField(auto_now=True, null=True)
+
+    facet = models.CharField(choices=FACET_CHOICES, max_length=15)
+    key = models.CharField(max_length=64, help_text=_("Category uuid or YYYY-MM"))
+    label = models.CharField(max_length=255)
+    total = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+        app_label = 'training'
+        ordering = ['facet', 'key']
+        verbose_name = _("Course Facet")
+        verbose_name_plural = _("Course Facets")
+        constraints = [
+            models.UniqueConstraint(
+                fields=['facet', 'key'],
+                name='unique_course_facet'
+            )
+        ]
+
+    def __str__(self):
+        return self.label
@@ -1,7 +1,8 @@
 import uuid
 
-from django.db import models
+from django.db import models, connections, transaction
 from django.conf import settings
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from ..utils.constants import AFTER, BEFORE
@@ -19,6 +20,9 @@ class AbstractEnroll(models.Model):
     course_date = models.ForeignKey('training.CourseDate', on_delete=models.CASCADE,
                                     related_name='enroll')
 
+    # Simulation attempts made, next repeat_number taken from it
+    simulation_count = models.PositiveIntegerField(default=0, editable=False)
+
     class Meta:
         abstract = True
         app_label = 'training'
@@ -49,29 +53,64 @@ class AbstractSimulation(models.Model):
     repeat_number = models.IntegerField(default=1)
     is_done = models.BooleanField(default=False)
 
+    # Progress maintained from chapters and quizzes done, see utils.progress
+    chapters_done = models.IntegerField(default=0, editable=False)
+    chapters_total = models.IntegerField(default=0, editable=False)
+    quizzes_done = models.IntegerField(default=0, editable=False)
+    quizzes_total = models.IntegerField(default=0, editable=False)
+
     class Meta:
         abstract = True
         app_label = 'training'
         ordering = ['-create_date']
         verbose_name = _("Simulation")
         verbose_name_plural = _("Simulations")
+        constraints = [
+            models.UniqueConstraint(
+                fields=['enroll', 'repeat_number'],
+                name='unique_simulation_repeat'
+            )
+        ]
 
     def __str__(self):
         return self.course.label
 
+    @property
+    def percent(self):
+        total = self.chapters_total + self.quizzes_total
+        done = self.chapters_done + self.quizzes_done
+        return min(100, round(done * 100 / total, 2)) if total else 0
+
     def save(self, *args, **kwargs):
-        old_objs = self.__class__.objects.filter(learner=self.learner, enroll=self.enroll,
-                                                 course=self.course)
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
 
-        # Mark old simulation as Done if new simulation created
-        old_objs_not_done = old_objs.filter(is_done=False)
-        if not self.is_done and old_objs_not_done.exists():
-            old_objs_not_done.update(is_done=True)
+        from ..utils.progress import course_totals
+        self.chapters_total, self.quizzes_total = course_totals([self.course_id])[self.course_id]
 
-        if not self.pk:
-            self.repeat_number = old_objs.count() + 1
+        Enroll = self._meta.get_field('enroll').related_model
+        with transaction.atomic():
+            # Enroll row locked, concurrent retry wait and get the next number
+            enroll = Enroll.objects.select_for_update() \
+                .only('id', 'simulation_count') \
+                .get(id=self.enroll_id)
 
-        super().save(*args, **kwargs)
+            count = enroll.simulation_count
+            increment = models.F('simulation_count') + 1
+            if not count:
+                # Counter not maintained yet for enroll made before
+                count = self.__class__.objects.filter(enroll_id=enroll.id) \
+                    .aggregate(last=models.Max('repeat_number'))['last'] or 0
+                increment = count + 1
+
+            Enroll.objects.filter(id=enroll.id).update(simulation_count=increment)
+            self.repeat_number = count + 1
+
+            # Mark old simulation as Done if new simulation created
+            if not self.is_done:
+                self.__class__.objects.filter(enroll_id=enroll.id, is_done=False).update(is_done=True)
+
+            super().save(*args, **kwargs)
 
 
 class AbstractSimulationChapter(models.Model):
@@ -115,12 +154,27 @@ class AbstractSimulationQuiz(models.Model):
 
     is_done = models.BooleanField(default=False)
 
+    # Quiz session, see utils.timer. Deadline empty when unlimited
+    start_date = models.DateTimeField(null=True, editable=False)
+    deadline = models.DateTimeField(null=True, editable=False)
+
+    # Questions drawn for this simulation, see utils.draw
+    question_count = models.PositiveIntegerField(default=0, editable=False)
+
+    # Maintained from answers, see utils.score
+    score_correct = models.IntegerField(default=0, editable=False)
+    score_total = models.IntegerField(default=0, editable=False)
+    score_percentage = models.DecimalField(max_digits=5, decimal_places=2, default=0, editable=False)
+
     class Meta:
         abstract = True
         app_label = 'training'
         ordering = ['-create_date']
         verbose_name = _("Simulation Quiz")
         verbose_name_plural = _("Simulation Quizs")
+        indexes = [
+            models.Index(fields=['is_done', 'deadline'], name='%(app_label)s_%(class)s_dl_idx'),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['simulation', 'course', 'course_quiz', 'quiz'], 
@@ -140,6 +194,126 @@ class AbstractSimulationQuiz(models.Model):
         return self.course_quiz.position == AFTER
 
 
+class AbstractSimulationQuestion(models.Model):
+    """
+    Question drawn from quiz for a simulation, fixed once at
+    simulation quiz creation so learner always get the same draw
+    """
+    uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+    create_date = models.DateTimeField(auto_now_add=True, null=True)
+    update_date = models.DateTimeField(auto_now=True, null=True)
+
+    simulation_quiz = models.ForeignKey('training.SimulationQuiz', on_delete=models.CASCADE,
+                                        related_name='simulation_question')
+    quiz_question = models.ForeignKey('training.QuizQuestion', on_delete=models.CASCADE,
+                                      related_name='simulation_question')
+    question = models.ForeignKey('training.Question', on_delete=models.CASCADE,
+                                 related_name='simulation_question')
+
+    position = models.PositiveIntegerField(editable=False)
+    # Choice uuid in display order, empty keep default order
+    choice_order = models.JSONField(default=list, editable=False)
+
+    class Meta:
+        abstract = True
+        app_label = 'training'
+        ordering = ['position']
+        verbose_name = _("Simulation Question")
+        verbose_name_plural = _("Simulation Questions")
+        constraints = [
+            models.UniqueConstraint(
+                fields=['simulation_quiz', 'position'],
+                name='unique_simulation_question'
+            )
+        ]
+
+    def __str__(self):
+        return self.question.label
+
+
+class AnswerQuerySet(models.query.QuerySet):
+    # One answer per question of quiz in simulation
+    conflict_fields = ('simulation', 'question', 'course_quiz')
+    upsert_fields = ('learner', 'course', 'quiz', 'choice', 'position', 'is_true', 'update_date')
+    upsert_batch_size = 500
+
+    def upsert(self, objs):
+        """
+        Insert answers, or replace choice of existing answer for the same
+        question in one statement. Objects must be graded before.
+        """
+        objs = list(objs)
+        now = timezone.now()
+        for obj in objs:
+            obj.create_date = obj.create_date or now
+            obj.update_date = now
+
+        connection = connections[self.db]
+        suffix = self._upsert_suffix(connection)
+        if suffix is None:
+            for obj in objs:
+                self._upsert_fallback(obj)
+            return len(objs)
+
+        fields = [field for field in self.model._meta.concrete_fields if not field.primary_key]
+        columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+        row = '(%s)' % ', '.join(['%s'] * len(fields))
+
+        for index in range(0, len(objs), self.upsert_batch_size):
+            batch = objs[index:index + self.upsert_batch_size]
+            params = [
+                field.get_db_prep_save(getattr(obj, field.attname), connection)
+                for obj in batch for field in fields
+            ]
+            sql = 'INSERT INTO %s (%s) VALUES %s %s' % (
+                connection.ops.quote_name(self.model._meta.db_table), columns,
+                ', '.join([row] * len(batch)), suffix
+            )
+
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+
+        return len(objs)
+
+    def for_upserted(self, objs):
+        """
+        Stored answers for upserted objects, existing row keep its uuid
+        """
+        keys = set((obj.simulation_id, obj.question_id, obj.course_quiz_id) for obj in objs)
+        queryset = self.filter(simulation_id__in=set(key[0] for key in keys),
+                               question_id__in=set(key[1] for key in keys),
+                               course_quiz_id__in=set(key[2] for key in keys))
+        return [obj for obj in queryset
+                if (obj.simulation_id, obj.question_id, obj.course_quiz_id) in keys]
+
+    def _upsert_suffix(self, connection):
+        opts = self.model._meta
+        quote_name = connection.ops.quote_name
+        conflict = ', '.join(quote_name(opts.get_field(name).column) for name in self.conflict_fields)
+        update = [quote_name(opts.get_field(name).column) for name in self.upsert_fields]
+
+        if connection.vendor == 'postgresql' or (connection.vendor == 'sqlite'
+                                                 and connection.Database.sqlite_version_info >= (3, 24)):
+            return 'ON CONFLICT (%s) DO UPDATE SET %s' % (
+                conflict, ', '.join('%s = EXCLUDED.%s' % (column, column) for column in update))
+
+        if connection.vendor == 'mysql':
+            return 'ON DUPLICATE KEY UPDATE %s' % ', '.join(
+                '%s = VALUES(%s)' % (column, column) for column in update)
+
+        return None
+
+    def _upsert_fallback(self, obj):
+        opts = self.model._meta
+        lookup = {opts.get_field(name).attname: getattr(obj, opts.get_field(name).attname)
+                  for name in self.conflict_fields}
+        values = {opts.get_field(name).attname: getattr(obj, opts.get_field(name).attname)
+                  for name in self.upsert_fields}
+
+        if not self.filter(**lookup).update(**values):
+            self.bulk_create([obj])
+
+
 class AbstractAnswer(models.Model):
     uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     create_date = models.DateTimeField(auto_now_add=True, null=True)
@@ -163,18 +337,37 @@ class AbstractAnswer(models.Model):
     position = models.CharField(max_length=15, editable=False)
     is_true = models.BooleanField(default=False, editable=False)
 
+    objects = AnswerQuerySet.as_manager()
+
     class Meta:
         abstract = True
         app_label = 'training'
         ordering = ['-create_date']
         verbose_name = _("Answer")
         verbose_name_plural = _("Answers")
+        # Also serve lookup by simulation and question
+        constraints = [
+            models.UniqueConstraint(
+                fields=['simulation', 'question', 'course_quiz'],
+                name='unique_answer'
+            )
+        ]
 
     def __str__(self):
         return self.question.label
 
-    def save(self, *args, **kwargs):
+    def grade(self, answer_key=None):
+        """
+        Graded with quiz answer key, no Choice read
+        """
+        from ..utils.quiz import get_answer_key
+
+        if answer_key is None:
+            answer_key = get_answer_key(self.quiz_id)
+
         self.position = self.course_quiz.position
-        self.is_true = self.choice.is_true
+        self.is_true = answer_key.get(self.question_id, None) == self.choice_id
 
+    def save(self, *args, **kwargs):
+        self.grade()
         super().save(*args, **kwargs)
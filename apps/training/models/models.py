@@ -149,3 +149,21 @@ if not is_model_registered('training', 'Certificate'):
             db_table = 'training_certificate'
 
     __all__.append('Certificate')
+
+
+# 17
+if not is_model_registered('training', 'CourseFacet'):
+    class CourseFacet(AbstractCourseFacet):
+        class Meta(AbstractCourseFacet.Meta):
+            db_table = 'training_course_facet'
+
+    __all__.append('CourseFacet')
+
+
+# 18
+if not is_model_registered('training', 'SimulationQuestion'):
+    class SimulationQuestion(AbstractSimulationQuestion):
+        class Meta(AbstractSimulationQuestion.Meta):
+            db_table = 'training_simulation_question'
+
+    __all__.append('SimulationQuestion')
@@ -66,6 +66,8 @@ class AbstractQuiz(models.Model):
                                 null=True, blank=True, related_name='quiz')
 
     label = models.CharField(max_length=255, help_text=_("Ex: Quiz before training [name training]"))
+    draw_count = models.PositiveIntegerField(default=0, help_text=_("Questions drawn per simulation, set 0 for all"))
+    shuffle_choices = models.BooleanField(default=False, help_text=_("Shuffle choices per simulation?"))
 
     class Meta:
         abstract = True
@@ -3,12 +3,43 @@ from django.contrib.contenttypes.models import ContentType
 
 from utils.generals import get_model
 
+from .utils.cache import invalidate_course_detail, invalidate_course_detail_by_id
+from .utils.course import refresh_next_course_date, touch_courses, upcoming_threshold
+from .utils.search import get_backend, reindex_courses, remove_courses
+from .utils.facet import refresh_category_facets, refresh_month_facets
+from .utils.quiz import (
+    invalidate_quiz_bundle,
+    invalidate_quiz_bundle_by_question,
+    invalidate_answer_keys,
+    invalidate_answer_keys_by_question,
+    get_answer_key
+)
+from .utils.score import compute_scores, apply_score, refresh_scores
+from .utils.timer import invalidate_sessions
+from .utils.draw import draw_questions
+from .utils.progress import bump_progress, refresh_course_totals
+from .tasks import generate_cover_renditions
+
 Quiz = get_model('training', 'Quiz')
+QuizQuestion = get_model('training', 'QuizQuestion')
+Question = get_model('training', 'Question')
+Course = get_model('training', 'Course')
+Category = get_model('training', 'Category')
+CourseDate = get_model('training', 'CourseDate')
+CourseFacet = get_model('training', 'CourseFacet')
 CourseQuiz = get_model('training', 'CourseQuiz')
 Simulation = get_model('training', 'Simulation')
 SimulationQuiz = get_model('training', 'SimulationQuiz')
 SimulationChapter = get_model('training', 'SimulationChapter')
 
+# Value remembered before save, by model name
+PREVIOUS_FIELDS = {
+    'course': ['category_id', 'is_active', 'cover'],
+    'coursedate': ['start_date'],
+    'simulationchapter': ['is_done'],
+    'simulationquiz': ['is_done'],
+}
+
 
 @transaction.atomic
 def enroll_save_handler(sender, instance, created, **kwargs):
@@ -27,3 +58,207 @@ def enroll_save_handler(sender, instance, created, **kwargs):
         course_quiz = CourseQuiz.objects.get(course__id=course.id, position='before')
         SimulationQuiz.objects.create(simulation=simulation, course=course, course_quiz=course_quiz,
                                       quiz=course_quiz.quiz)
+
+
+def course_date_save_handler(sender, instance, **kwargs):
+    """
+    Keep course next upcoming session current, course update_date
+    bumped by any session change even when next session kept
+    Run on CourseDate save and delete
+    """
+    if not refresh_next_course_date([instance.course_id]):
+        touch_courses([instance.course_id])
+
+
+def course_cache_invalidate_handler(sender, instance, **kwargs):
+    """
+    Drop cached course detail when course or its content changed,
+    course resolved now and cache dropped on commit
+    Run on Course, CourseDate, Chapter, Material and CourseQuiz save and delete
+    """
+    if isinstance(instance, Course):
+        invalidate_course_detail([instance.uuid])
+    else:
+        invalidate_course_detail_by_id([instance.course_id])
+
+
+def course_search_handler(sender, instance, **kwargs):
+    """
+    Keep course search index current
+    Run on Course, Category and Chapter save, Chapter delete
+    """
+    if isinstance(instance, Course):
+        course_ids = [instance.id]
+    elif isinstance(instance, Category):
+        course_ids = Course.objects.filter(category_id=instance.id).values_list('id', flat=True)
+    else:
+        course_ids = [instance.course_id]
+
+    reindex_courses(course_ids)
+
+
+def course_search_delete_handler(sender, instance, **kwargs):
+    remove_courses([instance.id])
+
+
+def course_search_setup_handler(sender, using=None, **kwargs):
+    """
+    Create search index table after migrate
+    """
+    get_backend(using=using).setup()
+
+
+def previous_pre_save_handler(sender, instance, **kwargs):
+    """
+    Remember value before save, facet refreshed for old and new value,
+    cover rendered again and progress moved only when changed
+    Run on Course, CourseDate, SimulationChapter and SimulationQuiz pre save
+    """
+    previous = None
+    if instance.pk:
+        fields = PREVIOUS_FIELDS[sender._meta.model_name]
+        queryset = sender.objects.filter(pk=instance.pk)
+
+        # Row locked until saved, e.g quiz finished while expired quiz swept
+        if transaction.get_connection().in_atomic_block:
+            queryset = queryset.select_for_update()
+        previous = queryset.values(*fields).first()
+    instance._previous = previous or dict()
+
+
+def course_facet_handler(sender, instance, **kwargs):
+    """
+    Run on Course save and delete
+    """
+    previous = getattr(instance, '_previous', dict())
+    refresh_category_facets([instance.category_id, previous.get('category_id')])
+
+    if previous.get('is_active', instance.is_active) != instance.is_active:
+        start_dates = CourseDate.objects \
+            .filter(course_id=instance.id, start_date__gte=upcoming_threshold()) \
+            .values_list('start_date', flat=True)
+        refresh_month_facets(start_dates)
+
+
+def course_date_facet_handler(sender, instance, **kwargs):
+    """
+    Run on CourseDate save and delete
+    """
+    previous = getattr(instance, '_previous', dict())
+    refresh_month_facets([instance.start_date, previous.get('start_date')])
+
+    # Next session may changed, so does upcoming course per category
+    category_ids = Course.objects.filter(id=instance.course_id).values_list('category_id', flat=True)
+    refresh_category_facets(category_ids)
+
+
+def cover_rendition_handler(sender, instance, created, **kwargs):
+    """
+    Render cover variants on worker once the new cover committed
+    Run on Course save
+    """
+    previous = getattr(instance, '_previous', dict())
+    if (previous.get('cover') or '') == (instance.cover.name or ''):
+        return
+
+    course_id = instance.id
+    transaction.on_commit(lambda: generate_cover_renditions.delay(course_id))
+
+
+def category_facet_handler(sender, instance, **kwargs):
+    """
+    Run on Category save, label used in facet
+    """
+    refresh_category_facets([instance.id])
+
+
+def category_facet_delete_handler(sender, instance, **kwargs):
+    CourseFacet.objects.filter(facet=CourseFacet.CATEGORY, key=str(instance.uuid)).delete()
+
+
+def quiz_bundle_invalidate_handler(sender, instance, **kwargs):
+    """
+    Drop cached quiz bundle on commit, rebuilt on next request
+    Run on Quiz, QuizQuestion, Question and Choice save and delete
+    """
+    if isinstance(instance, Quiz):
+        invalidate_quiz_bundle([instance.uuid])
+    elif isinstance(instance, QuizQuestion):
+        invalidate_quiz_bundle(Quiz.objects.filter(id=instance.quiz_id).values_list('uuid', flat=True))
+    elif isinstance(instance, Question):
+        invalidate_quiz_bundle_by_question([instance.id])
+    else:
+        invalidate_quiz_bundle_by_question([instance.question_id])
+
+
+def answer_key_invalidate_handler(sender, instance, **kwargs):
+    """
+    Reload answer key on next grading, quiz resolved now
+    and key dropped on commit
+    Run on QuizQuestion and Choice save and delete
+    """
+    if isinstance(instance, QuizQuestion):
+        invalidate_answer_keys([instance.quiz_id])
+    else:
+        invalidate_answer_keys_by_question([instance.question_id])
+
+
+def simulation_quiz_score_handler(sender, instance, **kwargs):
+    """
+    Score written with the quiz itself, e.g when marked done
+    Run on SimulationQuiz pre save
+    """
+    if instance.pk:
+        scores = compute_scores([(instance.simulation_id, instance.course_quiz_id)])
+        apply_score(instance, scores, get_answer_key(instance.quiz_id))
+
+
+def answer_score_handler(sender, instance, **kwargs):
+    """
+    Answer saved one by one, bulk write path refresh score itself
+    Run on Answer save and delete
+    """
+    refresh_scores([(instance.simulation_id, instance.course_quiz_id)])
+
+
+def simulation_quiz_session_handler(sender, instance, **kwargs):
+    """
+    Cached deadline read again from database once committed,
+    e.g quiz marked done
+    Run on SimulationQuiz save and delete
+    """
+    invalidate_sessions([(instance.simulation_id, instance.course_quiz_id)])
+
+
+def simulation_question_draw_handler(sender, instance, created, **kwargs):
+    """
+    Question draw fixed once when simulation quiz created
+    Run on SimulationQuiz post save
+    """
+    if created:
+        draw_questions([instance])
+
+
+def simulation_progress_handler(sender, instance, created=None, **kwargs):
+    """
+    Done counter of simulation moved when `is_done` flip
+    Run on SimulationChapter and SimulationQuiz save and delete
+    """
+    if created is None:
+        # Deleted
+        delta = -1 if instance.is_done else 0
+    else:
+        previous = getattr(instance, '_previous', dict()).get('is_done', False)
+        delta = int(instance.is_done) - int(previous)
+
+    if delta:
+        field = 'chapters_done' if isinstance(instance, SimulationChapter) else 'quizzes_done'
+        bump_progress(field, [instance.simulation_id], delta=delta)
+
+
+def course_progress_total_handler(sender, instance, created=None, **kwargs):
+    """
+    Run on Chapter and CourseQuiz create and delete
+    """
+    if created is not False:
+        refresh_course_totals([instance.course_id])
@@ -0,0 +1,69 @@
+import logging
+
+from django.utils.translation import gettext_lazy as _
+
+# Celery config
+from celery import shared_task
+
+
+@shared_task
+def roll_forward_next_course_date():
+    from .utils.course import roll_forward_next_course_date as roll_forward
+    from .utils.facet import rebuild_facets
+
+    logging.info(_("Roll forward course next session run"))
+    updated = roll_forward()
+    logging.info(_("Roll forward course next session updated %s course") % updated)
+
+    # Passed session no longer counted in facets
+    rebuild_facets()
+    return updated
+
+
+@shared_task
+def generate_cover_renditions(course_id):
+    from .utils.cover import build_cover_renditions
+
+    renditions = build_cover_renditions(course_id)
+    logging.info(_("Cover rendition for course %s: %s") % (course_id, list(renditions or [])))
+    return list(renditions or [])
+
+
+@shared_task(bind=True)
+def regrade_questions(self, question_ids):
+    from .utils.score import regrade_question
+
+    changed = 0
+    for index, question_id in enumerate(question_ids):
+        def progress(done, total):
+            self.update_state(state='PROGRESS', meta={
+                'question': index + 1, 'questions': len(question_ids),
+                'done': done, 'total': total,
+            })
+
+        changed += regrade_question(question_id, progress=progress)
+
+    logging.info(_("Regrade %s question changed %s answer") % (len(question_ids), changed))
+    return changed
+
+
+@shared_task
+def finalize_expired_quizzes():
+    from .utils.timer import finalize_expired_quizzes as finalize
+
+    finalized = finalize()
+    if finalized:
+        logging.info(_("Finalize %s expired quiz") % finalized)
+    return finalized
+
+
+@shared_task(bind=True)
+def generate_course_date_certificates(self, course_date_id):
+    from .utils.certificate import generate_certificates
+
+    def progress(done, total):
+        self.update_state(state='PROGRESS', meta={'done': done, 'total': total})
+
+    created = generate_certificates(course_date_id, progress=progress)
+    logging.info(_("Certificate for course date %s created %s") % (course_date_id, created))
+    return created
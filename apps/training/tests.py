@@ -1,3 +1,1235 @@
-from django.test import TestCase
+import datetime
+import os
+from decimal import Decimal
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from PIL import Image
+
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction, IntegrityError
+from django.db.models import F, ExpressionWrapper, TextField
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from rest_framework import serializers
+from rest_framework.test import APIClient
+
+from utils.generals import get_model
+from utils.mixin.api import ListSerializerUpdateMappingField
+from utils.pagination import KeysetPagination
+from apps.training.utils.cache import course_detail_stats
+from apps.training.utils.course import roll_forward_next_course_date
+from apps.training.utils.cover import build_cover_renditions
+from apps.training.utils.quiz import get_answer_keys
+from apps.training.utils.timer import closed_sessions, finalize_expired_quizzes
+from apps.training.utils.certificate import generate_certificates
+
+User = get_model('person', 'User')
+RoleCapability = get_model('person', 'RoleCapability')
+Category = get_model('training', 'Category')
+Course = get_model('training', 'Course')
+Chapter = get_model('training', 'Chapter')
+CourseDate = get_model('training', 'CourseDate')
+CourseFacet = get_model('training', 'CourseFacet')
+Material = get_model('training', 'Material')
+Quiz = get_model('training', 'Quiz')
+QuizQuestion = get_model('training', 'QuizQuestion')
+Question = get_model('training', 'Question')
+Choice = get_model('training', 'Choice')
+CourseQuiz = get_model('training', 'CourseQuiz')
+Enroll = get_model('training', 'Enroll')
+Simulation = get_model('training', 'Simulation')
+SimulationChapter = get_model('training', 'SimulationChapter')
+SimulationQuiz = get_model('training', 'SimulationQuiz')
+SimulationQuestion = get_model('training', 'SimulationQuestion')
+Answer = get_model('training', 'Answer')
+Certificate = get_model('training', 'Certificate')
+
 
 # Create your tests here.
+class CourseNextDateTestCase(TestCase):
+    def setUp(self):
+        self.now = timezone.datetime.now()
+        self.course = Course.objects.create(label='Working at height')
+
+    def create_course_date(self, days):
+        start_date = self.now + datetime.timedelta(days=days)
+        return CourseDate.objects.create(course=self.course, start_date=start_date,
+                                         end_date=start_date + datetime.timedelta(hours=8))
+
+    def test_next_course_date_maintained(self):
+        self.create_course_date(-10)
+        later = self.create_course_date(20)
+        sooner = self.create_course_date(5)
+
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.next_course_date, sooner)
+        self.assertEqual(self.course.next_start_date, sooner.start_date)
+
+        sooner.delete()
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.next_course_date, later)
+
+    def test_roll_forward(self):
+        passed = self.create_course_date(3)
+        upcoming = self.create_course_date(9)
+
+        # Simulate session already passed
+        CourseDate.objects.filter(id=passed.id).update(start_date=self.now - datetime.timedelta(days=3))
+        Course.objects.filter(id=self.course.id).update(next_start_date=self.now - datetime.timedelta(days=3))
+
+        self.assertEqual(roll_forward_next_course_date(), 1)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.next_course_date, upcoming)
+
+
+class KeysetPaginationTestCase(TestCase):
+    def setUp(self):
+        # Quiz session cached by id, reused between test
+        cache.clear()
+
+        self.user = User.objects.create_user('learner', 'learner@email.com', '123456')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        start_date = timezone.datetime.now() + datetime.timedelta(days=3)
+        for index in range(5):
+            course = Course.objects.create(label='Course %s' % index)
+            CourseDate.objects.create(course=course, start_date=start_date,
+                                      end_date=start_date + datetime.timedelta(hours=8))
+
+    def test_walk_cursor(self):
+        expected = [str(x) for x in Course.objects.order_by('-create_date', '-id').values_list('uuid', flat=True)]
+
+        response = self.client.get('/api/v1/training/learner/courses/?pagination=cursor&limit=2')
+        first_page = response.json()
+        self.assertNotIn('total', first_page)
+        self.assertIsNone(first_page['previous'])
+
+        uuids = [item['uuid'] for item in first_page['results']]
+        result = first_page
+        while result['next']:
+            result = self.client.get(result['next']).json()
+            uuids.extend(item['uuid'] for item in result['results'])
+        self.assertEqual(uuids, expected)
+
+        second_page = self.client.get(first_page['next']).json()
+        previous_page = self.client.get(second_page['previous']).json()
+        self.assertEqual(previous_page['results'], first_page['results'])
+
+    def test_other_ordering_kept(self):
+        self.assertTrue(KeysetPagination.accept_ordering(Course.objects.all()))
+        self.assertTrue(KeysetPagination.accept_ordering(Course.objects.order_by('-create_date', '-id')))
+        self.assertFalse(KeysetPagination.accept_ordering(Course.objects.order_by('label')))
+
+        # Search rank ordering served with limit offset
+        response = self.client.get('/api/v1/training/learner/courses/',
+                                   {'pagination': 'cursor', 'q': 'course', 'limit': 2})
+        self.assertEqual(response.json()['total'], 5)
+
+
+class CourseDetailCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+        self.user = User.objects.create_user('learner', 'learner@email.com', '123456')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        start_date = timezone.datetime.now() + datetime.timedelta(days=3)
+        self.course = Course.objects.create(label='Confined space')
+        CourseDate.objects.create(course=self.course, start_date=start_date,
+                                  end_date=start_date + datetime.timedelta(hours=8))
+        self.url = '/api/v1/training/learner/courses/%s/' % self.course.uuid
+
+    def test_cached_and_invalidated(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.json()['label'], 'Confined space')
+
+        self.course.label = 'Confined space entry'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.save()
+            # Old content kept until commit
+            self.assertEqual(self.client.get(self.url).json()['label'], 'Confined space')
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.json()['label'], 'Confined space entry')
+
+        # Each host cached apart, stat kept under own key
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+        other = self.client.get(self.url, HTTP_HOST='other.testserver')
+        self.assertEqual(other.json()['label'], 'Confined space entry')
+        self.assertEqual(course_detail_stats(), {'hit': 3, 'miss': 3, 'ratio': 0.5})
+
+
+class ConditionalGetTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('learner', 'learner@email.com', '123456')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        start_date = timezone.datetime.now() + datetime.timedelta(days=3)
+        self.course = Course.objects.create(label='First aid')
+        self.course_date = CourseDate.objects.create(course=self.course, start_date=start_date,
+                                                     end_date=start_date + datetime.timedelta(hours=8))
+
+    def test_not_modified(self):
+        url = '/api/v1/training/learner/courses/'
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.course.label = 'First aid level 2'
+        self.course.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        # Session changed, next session kept, validated on course row only
+        etag = response['ETag']
+        self.course_date.end_date += datetime.timedelta(hours=1)
+        self.course_date.save()
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in context.captured_queries
+                          if 'MAX(' in query['sql'] and '"training_coursedate"' in query['sql']])
+
+
+class CourseSearchTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('learner', 'learner@email.com', '123456')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        start_date = timezone.datetime.now() + datetime.timedelta(days=3)
+        category = Category.objects.create(label='Electrical')
+        self.lockout = Course.objects.create(label='Lockout tagout', category=category,
+                                             description='Isolate hazardous energy')
+        self.scaffold = Course.objects.create(label='Scaffold inspection',
+                                              description='Check scaffold before work')
+        Chapter.objects.create(course=self.scaffold, label='Energy of falling objects', number='1')
+
+        for course in [self.lockout, self.scaffold]:
+            CourseDate.objects.create(course=course, start_date=start_date,
+                                      end_date=start_date + datetime.timedelta(hours=8))
+
+    def search(self, q):
+        response = self.client.get('/api/v1/training/learner/courses/', {'q': q})
+        return [item['uuid'] for item in response.json()['results']]
+
+    def test_search_ranked(self):
+        self.assertEqual(self.search('lockout'), [str(self.lockout.uuid)])
+        self.assertEqual(self.search('electric'), [str(self.lockout.uuid)])
+        # Chapter label weighted above description
+        self.assertEqual(self.search('energy'), [str(self.scaffold.uuid), str(self.lockout.uuid)])
+
+    def test_index_follow_changes(self):
+        self.scaffold.label = 'Scaffold and ladder'
+        self.scaffold.save()
+        self.assertEqual(self.search('ladder'), [str(self.scaffold.uuid)])
+
+        self.scaffold.delete()
+        self.assertEqual(self.search('ladder'), [])
+
+
+class CourseFacetTestCase(TestCase):
+    def setUp(self):
+        self.start_date = timezone.datetime.now() + datetime.timedelta(days=3)
+        self.category = Category.objects.create(label='Chemical')
+        self.course = Course.objects.create(label='Hazmat handling', category=self.category)
+
+    def get_total(self, facet, key):
+        obj = CourseFacet.objects.filter(facet=facet, key=key).first()
+        return obj.total if obj else 0
+
+    def test_incremental_facets(self):
+        category_key = str(self.category.uuid)
+        month_key = self.start_date.strftime('%Y-%m')
+        self.assertEqual(self.get_total(CourseFacet.CATEGORY, category_key), 0)
+
+        course_date = CourseDate.objects.create(course=self.course, start_date=self.start_date,
+                                                end_date=self.start_date + datetime.timedelta(hours=8))
+        self.assertEqual(self.get_total(CourseFacet.CATEGORY, category_key), 1)
+        self.assertEqual(self.get_total(CourseFacet.MONTH, month_key), 1)
+
+        self.course.is_active = False
+        self.course.save()
+        self.assertEqual(self.get_total(CourseFacet.CATEGORY, category_key), 0)
+        self.assertEqual(self.get_total(CourseFacet.MONTH, month_key), 0)
+
+        self.course.is_active = True
+        self.course.save()
+        course_date.delete()
+        self.assertEqual(self.get_total(CourseFacet.CATEGORY, category_key), 0)
+        self.assertEqual(self.get_total(CourseFacet.MONTH, month_key), 0)
+
+
+class CourseTreeTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('learner', 'learner@email.com', '123456')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.course = Course.objects.create(label='Permit to work')
+        for number in range(3):
+            chapter = Chapter.objects.create(course=self.course, label='Chapter %s' % number,
+                                             number=str(number))
+            for _index in range(2):
+                Material.objects.create(course=self.course, chapter=chapter,
+                                        type=Material.TEXT, text='Permit issuer duties')
+
+        for position in ['before', 'after']:
+            quiz = Quiz.objects.create(label='Quiz %s' % position)
+            CourseQuiz.objects.create(course=self.course, quiz=quiz, position=position)
+
+    def test_tree_fixed_queries(self):
+        url = '/api/v1/training/learner/courses/%s/tree/' % self.course.uuid
+
+        # Course, chapters, materials and course quizzes
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+
+        data = response.json()
+        self.assertEqual(len(data['chapter']), 3)
+        self.assertEqual(len(data['chapter'][0]['material']), 2)
+        self.assertNotIn('text', data['chapter'][0]['material'][0])
+        self.assertEqual([item['position'] for item in data['course_quiz']], ['after', 'before'])
+
+        data = self.client.get(url, {'with_text': 1}).json()
+        self.assertEqual(data['chapter'][0]['material'][0]['text'], 'Permit issuer duties')
+
+
+class CourseCoverRenditionTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root,
+                                                   COURSE_COVER_RENDITION_WIDTHS=(320, 640, 2000))
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+        self.course = Course.objects.create(label='Fire safety')
+
+    def upload_cover(self):
+        content = BytesIO()
+        Image.new('RGBA', (1000, 500), (200, 30, 30, 255)).save(content, 'PNG')
+        self.course.cover = SimpleUploadedFile('cover.png', content.getvalue(), content_type='image/png')
+
+        return self.save_course()
+
+    def save_course(self):
+        # Rendition task queued on commit
+        with mock.patch('apps.training.singals.generate_cover_renditions') as task:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.course.save()
+        return task.delay.call_count
+
+    def test_renditions(self):
+        self.assertEqual(self.upload_cover(), 1)
+
+        # Unchanged cover not rendered again
+        self.assertEqual(self.save_course(), 0)
+
+        renditions = build_cover_renditions(self.course.id)
+        self.assertEqual(sorted(renditions.keys(), key=int), ['320', '640', '1000'])
+
+        self.course.refresh_from_db()
+        self.assertEqual((self.course.cover_width, self.course.cover_height), (1000, 500))
+
+        rendition = self.course.cover_renditions['320']
+        self.assertEqual(rendition['height'], 160)
+        with self.course.cover.storage.open(rendition['webp']) as f:
+            self.assertEqual(Image.open(f).format, 'WEBP')
+        with self.course.cover.storage.open(rendition['jpeg']) as f:
+            self.assertEqual(Image.open(f).size, (320, 160))
+
+        # Course edit keep rendition columns written by task
+        self.course.label = 'Fire safety basic'
+        self.course.save()
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.cover_width, 1000)
+
+        user = User.objects.create_user('learner', 'learner@email.com', '123456')
+        client = APIClient()
+        client.force_authenticate(user)
+        CourseDate.objects.create(course=self.course, start_date=timezone.datetime.now() + datetime.timedelta(days=2),
+                                  end_date=timezone.datetime.now() + datetime.timedelta(days=3))
+
+        data = client.get('/api/v1/training/learner/courses/%s/' % self.course.uuid).json()
+        self.assertTrue(data['cover_renditions']['640']['webp'].startswith('http://testserver/media/'))
+
+
+class MaterialTextTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('learner', 'learner@email.com', '123456')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.course = Course.objects.create(label='Hazardous substances')
+        chapter = Chapter.objects.create(course=self.course, label='Regulation', number='1')
+        self.text = 'Employer shall assess the risk of hazardous substance. ' * 200
+        self.material = Material.objects.create(course=self.course, chapter=chapter,
+                                                type=Material.TEXT, text=self.text)
+
+    def enroll(self):
+        start_date = timezone.datetime.now() + datetime.timedelta(days=1)
+        course_date = CourseDate.objects.create(course=self.course, start_date=start_date,
+                                                end_date=start_date + datetime.timedelta(hours=8))
+        quiz = Quiz.objects.create(label='Pre test')
+        CourseQuiz.objects.create(course=self.course, quiz=quiz, position='before')
+        Enroll.objects.create(learner=self.user, course=self.course, course_date=course_date)
+
+    def test_stored_compressed_and_deferred(self):
+        stored = Material.objects.filter(id=self.material.id) \
+            .annotate(stored_text=ExpressionWrapper(F('text'), output_field=TextField())) \
+            .values_list('stored_text', flat=True).get()
+        self.assertTrue(stored.startswith('zlib:'))
+        self.assertLess(len(stored), len(self.text) // 10)
+
+        material = Material.objects.get(id=self.material.id)
+        self.assertIn('text', material.get_deferred_fields())
+        self.assertEqual(material.text, self.text)
+        self.assertEqual(Material.objects.with_text().get(id=self.material.id).get_deferred_fields(), set())
+
+    def test_text_streamed_to_enrolled_learner(self):
+        url = '/api/v1/training/learner/materials/%s/text/' % self.material.uuid
+        self.assertEqual(self.client.get(url).status_code, 406)
+
+        self.enroll()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content).decode('utf-8'), self.text)
+
+    def test_media_range(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        protected_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, protected_root, ignore_errors=True)
+        self.settings_override = override_settings(PROTECTED_MEDIA_ROOT=protected_root)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+        with override_settings(MEDIA_ROOT=media_root, MEDIA_ACCEL_REDIRECT=None):
+            self.material.media = SimpleUploadedFile('induction.mp4', bytes(range(256)) * 4)
+            self.material.save()
+            self.enroll()
+
+            # Stored outside public media
+            self.assertTrue(self.material.media.path.startswith(protected_root))
+            self.assertFalse(os.listdir(media_root))
+
+            url = '/api/v1/training/learner/materials/%s/media/' % self.material.uuid
+            response = self.client.get(url, HTTP_RANGE='bytes=100-199')
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(response['Content-Range'], 'bytes 100-199/1024')
+            self.assertEqual(b''.join(response.streaming_content), bytes(range(100, 200)))
+
+            response = self.client.get(url, HTTP_RANGE='bytes=-24')
+            self.assertEqual(b''.join(response.streaming_content), bytes(range(232, 256)))
+            self.assertEqual(self.client.get(url, HTTP_RANGE='bytes=2000-').status_code, 416)
+
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Accept-Ranges'], 'bytes')
+            response.close()
+
+        with override_settings(MEDIA_ROOT=media_root, MEDIA_ACCEL_REDIRECT='nginx',
+                               MEDIA_ACCEL_LOCATION='/protected/media/'):
+            response = self.client.get(url)
+            self.assertEqual(response['X-Accel-Redirect'], '/protected/media/' + self.material.media.name)
+
+
+class QuizBundleTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('learner', 'learner@email.com', '123456')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.quiz = Quiz.objects.create(label='Pre test')
+        for number in range(3):
+            question = Question.objects.create(label='Question %s' % number)
+            QuizQuestion.objects.create(quiz=self.quiz, question=question)
+            for identifier in 'ABCD':
+                Choice.objects.create(question=question, identifier=identifier,
+                                      label='Choice %s' % identifier, is_true=identifier == 'A')
+
+        self.url = '/api/v1/training/learner/quizquestions/bundle/'
+
+    def test_bundle(self):
+        response = self.client.get(self.url, {'quiz_uuid': self.quiz.uuid})
+        data = response.json()
+        self.assertEqual(len(data['question']), 3)
+        self.assertEqual([item['identifier'] for item in data['question'][0]['question']['choice']],
+                         ['A', 'B', 'C', 'D'])
+        self.assertNotIn('is_true', data['question'][0]['question']['choice'][0])
+        self.assertEqual(response['ETag'], '"%s"' % data['version'])
+
+        # Served from cache
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {'quiz_uuid': self.quiz.uuid},
+                                       HTTP_IF_NONE_MATCH='"%s"' % data['version'])
+        self.assertEqual(response.status_code, 304)
+
+        choice = Choice.objects.filter(question__quiz_question__quiz=self.quiz).first()
+        choice.label = 'Changed'
+        with self.captureOnCommitCallbacks(execute=True):
+            choice.save()
+            # Old bundle kept until commit
+            unchanged = self.client.get(self.url, {'quiz_uuid': self.quiz.uuid}).json()
+            self.assertEqual(unchanged['version'], data['version'])
+
+        changed = self.client.get(self.url, {'quiz_uuid': self.quiz.uuid}).json()
+        self.assertNotEqual(changed['version'], data['version'])
+
+
+class SimulationFixtureMixin:
+    """
+    Enrolled learner with before and after quiz of 4 questions,
+    choice A true on every question
+    """
+    def setUp(self):
+        # Invalidation run on commit, never reached inside test case
+        cache.clear()
+
+        self.user = User.objects.create_user('learner', 'learner@email.com', '123456')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        start_date = timezone.datetime.now() + datetime.timedelta(days=2)
+        self.course = Course.objects.create(label='Confined space')
+        self.course_date = CourseDate.objects.create(course=self.course, start_date=start_date,
+                                                     end_date=start_date + datetime.timedelta(hours=8))
+
+        self.quiz = dict()
+        self.course_quiz = dict()
+        for position in ['before', 'after']:
+            self.quiz[position] = Quiz.objects.create(label='Quiz %s' % position)
+            self.course_quiz[position] = CourseQuiz.objects.create(course=self.course, position=position,
+                                                                   quiz=self.quiz[position])
+
+        self.questions = list()
+        for number in range(4):
+            question = Question.objects.create(label='Question %s' % number)
+            for identifier in 'ABCD':
+                Choice.objects.create(question=question, identifier=identifier,
+                                      label='Choice %s' % identifier, is_true=identifier == 'A')
+            for position in ['before', 'after']:
+                QuizQuestion.objects.create(quiz=self.quiz[position], question=question)
+            self.questions.append(question)
+
+        self.enroll = Enroll.objects.create(learner=self.user, course=self.course,
+                                            course_date=self.course_date)
+        self.simulation = self.enroll.simulation.get()
+
+    def create_answer(self, question, identifier, learner=None, simulation=None, position='before'):
+        return Answer.objects.create(learner=learner or self.user, simulation=simulation or self.simulation,
+                                     course=self.course, course_quiz=self.course_quiz[position],
+                                     quiz=self.quiz[position], question=question,
+                                     choice=question.choice.get(identifier=identifier))
+
+    def get_payload(self, identifiers):
+        return {'answers': [
+            {
+                'simulation': str(self.simulation.uuid),
+                'course': str(self.course.uuid),
+                'course_quiz': str(self.course_quiz['before'].uuid),
+                'quiz': str(self.quiz['before'].uuid),
+                'question': str(question.uuid),
+                'choice': str(question.choice.get(identifier=identifier).uuid),
+            }
+            for question, identifier in zip(self.questions, identifiers)
+        ]}
+
+
+class QuizQuestionAnswerTestCase(SimulationFixtureMixin, TestCase):
+    def test_answer_scoped_to_learner_and_simulation(self):
+        other = User.objects.create_user('other', 'other@email.com', '123456')
+        other_enroll = Enroll.objects.create(learner=other, course=self.course,
+                                             course_date=self.course_date)
+        self.create_answer(self.questions[0], 'B', learner=other, simulation=other_enroll.simulation.get())
+        answer = self.create_answer(self.questions[1], 'C')
+
+        url = '/api/v1/training/learner/quizquestions/'
+        params = {'quiz_uuid': self.quiz['before'].uuid, 'limit': 10}
+
+        for extra in [{}, {'simulation_uuid': self.simulation.uuid}]:
+            results = self.client.get(url, dict(params, **extra)).json()['results']
+            answers = {item['question']['uuid']: item['answer_uuid'] for item in results}
+            self.assertEqual(answers[str(self.questions[0].uuid)], None)
+            self.assertEqual(answers[str(self.questions[1].uuid)], str(answer.uuid))
+
+        # Other learner simulation refused
+        response = self.client.get(url, dict(params, simulation_uuid=other_enroll.simulation.get().uuid))
+        self.assertEqual(response.status_code, 406)
+
+
+class AnswerBatchTestCase(SimulationFixtureMixin, TestCase):
+    def test_batch_graded(self):
+        url = '/api/v1/training/learner/answers/batch/'
+        payload = self.get_payload('ABAC')
+
+        # Resolve six model and quiz questions, upsert, score and read back, whatever the batch size
+        get_answer_keys([self.quiz['before'].id])
+        closed_sessions([(self.simulation.id, self.course_quiz['before'].id)])
+        with self.assertNumQueries(14):
+            response = self.client.post(url, payload, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        answers = Answer.objects.filter(simulation=self.simulation)
+        self.assertEqual(answers.count(), 4)
+        self.assertEqual(answers.filter(is_true=True).count(), 2)
+        self.assertEqual(set(answers.values_list('position', flat=True)), {'before'})
+        self.assertEqual(set(answers.values_list('learner_id', flat=True)), {self.user.id})
+
+    def test_batch_rejected(self):
+        url = '/api/v1/training/learner/answers/batch/'
+        payload = self.get_payload('AB')
+        payload['answers'][1]['choice'] = payload['answers'][0]['choice']
+
+        response = self.client.post(url, payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Answer.objects.exists())
+
+
+class AnswerUpsertTestCase(SimulationFixtureMixin, TestCase):
+    def get_payload(self, question, identifier):
+        return {
+            'learner': str(self.user.uuid),
+            'simulation': str(self.simulation.uuid),
+            'course': str(self.course.uuid),
+            'course_quiz': str(self.course_quiz['before'].uuid),
+            'quiz': str(self.quiz['before'].uuid),
+            'question': str(question.uuid),
+            'choice': str(question.choice.get(identifier=identifier).uuid),
+        }
+
+    def test_choose_again_replace_answer(self):
+        url = '/api/v1/training/learner/answers/'
+        question = self.questions[0]
+
+        first = self.client.post(url, self.get_payload(question, 'B'), format='json').json()
+        second = self.client.post(url, self.get_payload(question, 'A'), format='json').json()
+
+        answer = Answer.objects.get(simulation=self.simulation, question=question)
+        self.assertEqual(first['uuid'], second['uuid'])
+        self.assertEqual(answer.choice.identifier, 'A')
+        self.assertTrue(answer.is_true)
+
+        # Same question in quiz after is other answer
+        self.create_answer(question, 'C', position='after')
+        self.assertEqual(Answer.objects.filter(simulation=self.simulation, question=question).count(), 2)
+
+    def test_answer_owner(self):
+        url = '/api/v1/training/learner/answers/'
+        other = User.objects.create_user('other', 'other@email.com', '123456')
+        other_enroll = Enroll.objects.create(learner=other, course=self.course,
+                                             course_date=self.course_date)
+
+        # Learner sent ignored, answer belong to request user
+        payload = dict(self.get_payload(self.questions[0], 'A'), learner=str(other.uuid))
+        response = self.client.post(url, payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Answer.objects.get(uuid=response.json()['uuid']).learner_id, self.user.id)
+
+        # Other learner simulation refused
+        payload = dict(self.get_payload(self.questions[1], 'A'),
+                       simulation=str(other_enroll.simulation.get().uuid))
+        response = self.client.post(url, payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Answer.objects.filter(learner=other).exists())
+
+    def test_answer_match(self):
+        url = '/api/v1/training/learner/answers/'
+        other_course = Course.objects.create(label='Hot work')
+        other_course_quiz = CourseQuiz.objects.create(course=other_course, position='before',
+                                                      quiz=self.quiz['before'])
+        question, other_question = self.questions[:2]
+
+        payloads = [
+            dict(self.get_payload(question, 'A'), course_quiz=str(other_course_quiz.uuid)),
+            dict(self.get_payload(question, 'A'), quiz=str(self.quiz['after'].uuid)),
+            dict(self.get_payload(question, 'A'), choice=str(other_question.choice.get(identifier='A').uuid)),
+        ]
+        for payload in payloads:
+            response = self.client.post(url, payload, format='json')
+            self.assertEqual(response.status_code, 400)
+            response = self.client.post(url + 'batch/', {'answers': [payload]}, format='json')
+            self.assertEqual(response.status_code, 400)
+
+        # Choice changed by PUT must belong to the stored question
+        answer = self.create_answer(question, 'B')
+        payload = [{'uuid': str(answer.uuid), 'choice': str(other_question.choice.get(identifier='A').uuid)}]
+        response = self.client.put(url, payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Answer.objects.filter(learner=self.user).count(), 1)
+
+    def test_upsert_fallback(self):
+        question = self.questions[1]
+        with mock.patch.object(Answer.objects._queryset_class, '_upsert_suffix', return_value=None):
+            for identifier in 'CA':
+                answer = Answer(learner=self.user, simulation=self.simulation, course=self.course,
+                                course_quiz=self.course_quiz['before'], quiz=self.quiz['before'],
+                                question=question, choice=question.choice.get(identifier=identifier))
+                answer.grade()
+                Answer.objects.upsert([answer])
+
+        answer = Answer.objects.get(simulation=self.simulation, question=question)
+        self.assertEqual((answer.choice.identifier, answer.is_true), ('A', True))
+
+
+class AnswerBulkUpdateTestCase(SimulationFixtureMixin, TestCase):
+    def test_put_bulk_update(self):
+        answers = [self.create_answer(question, 'B') for question in self.questions]
+        payload = [
+            {'uuid': str(answer.uuid), 'choice': str(answer.question.choice.get(identifier='A').uuid)}
+            for answer in answers[:3]
+        ]
+        payload.append({'uuid': str(answers[3].uuid), 'choice': str(answers[3].choice.uuid)})
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.put('/api/v1/training/learner/answers/', payload, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        # Three changed answer written with one statement, unchanged one skipped
+        updates = [query for query in context.captured_queries
+                   if query['sql'].startswith('UPDATE "training_answer"')]
+        self.assertEqual(len(updates), 1)
+
+        self.assertEqual(Answer.objects.filter(simulation=self.simulation, is_true=True).count(), 3)
+        self.assertEqual(Answer.objects.get(id=answers[3].id).choice.identifier, 'B')
+
+
+class RelationSetUpdateTestCase(TestCase):
+    class CapabilitySerializer(serializers.ModelSerializer):
+        uuid = serializers.UUIDField()
+        permission = serializers.SlugRelatedField(slug_field='codename', many=True,
+                                                  queryset=Permission.objects.all())
+
+        class Meta:
+            model = RoleCapability
+            fields = ['uuid', 'identifier', 'permission']
+            list_serializer_class = ListSerializerUpdateMappingField
+
+    def test_relation_set_saved_per_row(self):
+        capabilities = [RoleCapability.objects.create(identifier=identifier)
+                        for identifier in ['learner', 'instructor']]
+        codenames = list(Permission.objects.order_by('id').values_list('codename', flat=True)[:2])
+        payload = [
+            {'uuid': str(capabilities[0].uuid), 'permission': codenames},
+            {'uuid': str(capabilities[1].uuid), 'identifier': 'registered'},
+        ]
+
+        queryset = RoleCapability.objects.filter(id__in=[obj.id for obj in capabilities])
+        serializer = self.CapabilitySerializer(queryset, data=payload, many=True, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+
+        self.assertEqual(sorted(capabilities[0].permission.values_list('codename', flat=True)), sorted(codenames))
+        capabilities[1].refresh_from_db()
+        self.assertEqual(capabilities[1].identifier, 'registered')
+
+
+class AnswerKeyTestCase(SimulationFixtureMixin, TestCase):
+    def test_answer_key_cached_and_invalidated(self):
+        quiz_id = self.quiz['before'].id
+        question = self.questions[0]
+
+        answer_key = get_answer_keys([quiz_id])[quiz_id]
+        self.assertEqual(answer_key[question.id], question.choice.get(identifier='A').id)
+
+        with self.assertNumQueries(0):
+            get_answer_keys([quiz_id])
+
+        # Correct choice moved from A to B, old key kept until commit
+        question.choice.filter(identifier='A').update(is_true=False)
+        choice = question.choice.get(identifier='B')
+        choice.is_true = True
+        with self.captureOnCommitCallbacks(execute=True):
+            choice.save()
+            self.assertEqual(get_answer_keys([quiz_id])[quiz_id][question.id], answer_key[question.id])
+
+        self.assertEqual(get_answer_keys([quiz_id])[quiz_id][question.id], choice.id)
+        self.assertTrue(self.create_answer(question, 'B').is_true)
+
+
+class SimulationQuizScoreTestCase(SimulationFixtureMixin, TestCase):
+    def test_score_maintained(self):
+        simulation_quiz = self.simulation.simulation_quiz.get()
+        answers = [self.create_answer(question, identifier)
+                   for question, identifier in zip(self.questions[:3], 'ABA')]
+
+        simulation_quiz.refresh_from_db()
+        self.assertEqual((simulation_quiz.score_correct, simulation_quiz.score_total), (2, 4))
+        self.assertEqual(simulation_quiz.score_percentage, Decimal('50.00'))
+
+        # Bulk update path
+        payload = [{'uuid': str(answers[1].uuid),
+                    'choice': str(self.questions[1].choice.get(identifier='A').uuid)}]
+        self.client.put('/api/v1/training/learner/answers/', payload, format='json')
+        simulation_quiz.refresh_from_db()
+        self.assertEqual(simulation_quiz.score_correct, 3)
+
+        # Marked done keep score, even from stale object
+        Answer.objects.filter(id=answers[0].id).update(is_true=False)
+        simulation_quiz.is_done = True
+        simulation_quiz.save()
+        simulation_quiz.refresh_from_db()
+        self.assertEqual(simulation_quiz.score_correct, 2)
+
+        client = APIClient()
+        client.force_login(self.user)
+        data = client.get('/api/v1/training/learner/simulations/%s/' % self.simulation.uuid).json()
+        self.assertEqual(data['quiz']['before']['score'], {'correct': 2, 'total': 4, 'percentage': 50.0})
+
+
+class RegradeTestCase(SimulationFixtureMixin, TestCase):
+    def test_regrade_question(self):
+        question = self.questions[0]
+        for identifier in 'AB':
+            other = User.objects.create_user('learner_%s' % identifier, '%s@email.com' % identifier, '123456')
+            enroll = Enroll.objects.create(learner=other, course=self.course, course_date=self.course_date)
+            self.create_answer(question, identifier, learner=other, simulation=enroll.simulation.get())
+        self.create_answer(question, 'B')
+
+        # Answer key fixed without touching answers
+        Choice.objects.filter(question=question).update(is_true=False)
+        Choice.objects.filter(question=question, identifier='B').update(is_true=True)
+
+        output = StringIO()
+        call_command('regrade_question', str(question.uuid), '--batch-size', '2', stdout=output)
+        self.assertIn('3/3', output.getvalue())
+        self.assertIn('changed 3 answer', output.getvalue())
+
+        answers = Answer.objects.filter(question=question)
+        self.assertEqual(set(answers.filter(is_true=True).values_list('choice__identifier', flat=True)), {'B'})
+
+        simulation_quiz = self.simulation.simulation_quiz.get()
+        self.assertEqual(simulation_quiz.score_correct, 1)
+
+
+class QuizTimerTestCase(SimulationFixtureMixin, TestCase):
+    def test_deadline_enforced(self):
+        simulation_quiz = self.simulation.simulation_quiz.get(course_quiz__position='before')
+        client = APIClient()
+        client.force_login(self.user)
+
+        url = '/api/v1/training/learner/simulations/%s/quiz-start/' % self.simulation.uuid
+        data = client.post(url, {'simulation_quiz_uuid': str(simulation_quiz.uuid)}, format='json').json()
+        self.assertIsNotNone(data['deadline'])
+
+        # Start again keep the first deadline
+        again = client.post(url, {'simulation_quiz_uuid': str(simulation_quiz.uuid)}, format='json').json()
+        self.assertEqual(again['deadline'], data['deadline'])
+
+        payload = self.get_payload('AB')
+        batch_url = '/api/v1/training/learner/answers/batch/'
+        self.assertEqual(self.client.post(batch_url, payload, format='json').status_code, 201)
+
+        # Past deadline and grace, rejected from cached deadline
+        later = timezone.now() + datetime.timedelta(minutes=self.course_quiz['before'].duration, seconds=31)
+        with mock.patch('apps.training.utils.timer.timezone.now', return_value=later):
+            with self.assertNumQueries(0):
+                closed = closed_sessions([(self.simulation.id, self.course_quiz['before'].id)])
+            self.assertEqual(len(closed), 1)
+
+            response = self.client.post(batch_url, self.get_payload('AAAA'), format='json')
+            self.assertEqual(response.status_code, 400)
+
+            # Session dropped on commit
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                self.assertEqual(finalize_expired_quizzes(batch_size=1), 1)
+            self.assertTrue(callbacks)
+
+        simulation_quiz.refresh_from_db()
+        self.assertTrue(simulation_quiz.is_done)
+        self.assertEqual((simulation_quiz.score_correct, simulation_quiz.score_total), (1, 4))
+
+        # Done quiz read back from database once cache dropped
+        response = self.client.post(batch_url, payload, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_answer_without_start(self):
+        simulation_quiz = self.simulation.simulation_quiz.get(course_quiz__position='before')
+        batch_url = '/api/v1/training/learner/answers/batch/'
+        self.assertEqual(self.client.post(batch_url, self.get_payload('A'), format='json').status_code, 201)
+
+        # First answer start the timer
+        simulation_quiz.refresh_from_db()
+        self.assertIsNotNone(simulation_quiz.deadline)
+
+        later = simulation_quiz.deadline + datetime.timedelta(seconds=31)
+        with mock.patch('apps.training.utils.timer.timezone.now', return_value=later):
+            response = self.client.post(batch_url, self.get_payload('AB'), format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(finalize_expired_quizzes(), 1)
+
+            # Quiz done once, saved done again by learner not counted twice
+            simulation_quiz.refresh_from_db()
+            simulation_quiz.save()
+            self.assertEqual(finalize_expired_quizzes(), 0)
+        self.simulation.refresh_from_db()
+        self.assertEqual(self.simulation.quizzes_done, 1)
+
+    def test_unlimited_quiz(self):
+        CourseQuiz.objects.filter(id=self.course_quiz['before'].id).update(duration=0)
+        simulation_quiz = self.simulation.simulation_quiz.get(course_quiz__position='before')
+        client = APIClient()
+        client.force_login(self.user)
+
+        url = '/api/v1/training/learner/simulations/%s/quiz-start/' % self.simulation.uuid
+        data = client.post(url, {'simulation_quiz_uuid': str(simulation_quiz.uuid)}, format='json').json()
+        self.assertIsNone(data['deadline'])
+        self.assertEqual(finalize_expired_quizzes(), 0)
+
+
+class QuestionDrawTestCase(SimulationFixtureMixin, TestCase):
+    def test_draw_stored_per_simulation(self):
+        Quiz.objects.filter(id=self.quiz['before'].id).update(draw_count=2, shuffle_choices=True)
+
+        learners = list()
+        for number in range(6):
+            other = User.objects.create_user('drawn_%s' % number, 'drawn_%s@email.com' % number, '123456')
+            Enroll.objects.create(learner=other, course=self.course, course_date=self.course_date)
+            learners.append(other)
+
+        simulation_quizzes = SimulationQuiz.objects.filter(simulation__learner__in=learners)
+        draws = set()
+        for simulation_quiz in simulation_quizzes:
+            rows = list(simulation_quiz.simulation_question.all())
+            self.assertEqual([row.position for row in rows], [0, 1])
+            self.assertEqual(simulation_quiz.question_count, 2)
+            self.assertEqual(len(rows[0].choice_order), 4)
+            draws.add(tuple(row.question_id for row in rows))
+        self.assertGreater(len(draws), 1)
+
+        # Served from the stored draw, choice in stored order
+        learner = learners[0]
+        simulation = learner.simulation.get()
+        drawn = SimulationQuestion.objects.filter(simulation_quiz__simulation=simulation).order_by('position')
+
+        client = APIClient()
+        client.force_authenticate(learner)
+        params = {'quiz_uuid': self.quiz['before'].uuid, 'simulation_uuid': simulation.uuid, 'limit': 10}
+        data = client.get('/api/v1/training/learner/quizquestions/', params).json()
+        self.assertEqual(data['total'], 2)
+        self.assertEqual([item['question']['uuid'] for item in data['results']],
+                         [str(row.question.uuid) for row in drawn])
+        self.assertEqual([item['uuid'] for item in data['results'][0]['question']['choice']],
+                         drawn[0].choice_order)
+
+        data = client.get('/api/v1/training/learner/quizquestions/', dict(params, position=1)).json()
+        self.assertEqual(data['results'][0]['position'], 1)
+        self.assertEqual(data['results'][0]['question']['uuid'], str(drawn[1].question.uuid))
+
+        # Pool refused without draw, question not drawn not found
+        url = '/api/v1/training/learner/quizquestions/'
+        response = client.get(url, {'quiz_uuid': self.quiz['before'].uuid})
+        self.assertEqual(response.status_code, 406)
+        pool = QuizQuestion.objects.filter(quiz=self.quiz['before'])
+        undrawn_quiz_question = pool.exclude(question__in=[row.question for row in drawn]).first()
+        response = client.get('%s%s/' % (url, undrawn_quiz_question.uuid))
+        self.assertEqual(response.status_code, 406)
+        response = client.get('%s%s/' % (url, undrawn_quiz_question.uuid), {'simulation_uuid': simulation.uuid})
+        self.assertEqual(response.status_code, 404)
+        response = client.get('%s%s/' % (url, drawn[0].quiz_question.uuid), {'simulation_uuid': simulation.uuid})
+        self.assertEqual(response.json()['position'], 0)
+
+        # Bundle limited to the draw, whole pool refused
+        bundle_url = '/api/v1/training/learner/quizquestions/bundle/'
+        response = client.get(bundle_url, {'quiz_uuid': self.quiz['before'].uuid})
+        self.assertEqual(response.status_code, 406)
+        data = client.get(bundle_url, params).json()
+        self.assertEqual([item['question']['uuid'] for item in data['question']],
+                         [str(row.question.uuid) for row in drawn])
+        self.assertEqual([item['uuid'] for item in data['question'][0]['question']['choice']],
+                         drawn[0].choice_order)
+
+        # Question not drawn refused
+        undrawn = QuizQuestion.objects.filter(quiz=self.quiz['before']) \
+            .exclude(question__in=[row.question for row in drawn]).first().question
+        payload = {'answers': [{
+            'simulation': str(simulation.uuid),
+            'course': str(self.course.uuid),
+            'course_quiz': str(self.course_quiz['before'].uuid),
+            'quiz': str(self.quiz['before'].uuid),
+            'question': str(undrawn.uuid),
+            'choice': str(undrawn.choice.get(identifier='A').uuid),
+        }]}
+        response = client.post('/api/v1/training/learner/answers/batch/', payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = client.post('/api/v1/training/learner/answers/',
+                               dict(payload['answers'][0], learner=str(learner.uuid)), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Answer.objects.filter(simulation=simulation).exists())
+
+        # Score over the drawn questions only
+        self.create_answer(drawn[0].question, 'A', learner=learner, simulation=simulation)
+        simulation_quiz = SimulationQuiz.objects.get(simulation=simulation, course_quiz=self.course_quiz['before'])
+        self.assertEqual((simulation_quiz.score_correct, simulation_quiz.score_total), (1, 2))
+
+
+class EnrollCohortTestCase(SimulationFixtureMixin, TestCase):
+    def create_learners(self, prefix, total):
+        return [User.objects.create_user('%s_%s' % (prefix, number), '%s_%s@email.com' % (prefix, number), '123456')
+                for number in range(total)]
+
+    def test_cohort_enrolled(self):
+        admin = User.objects.create_superuser('admin', 'admin@email.com', '123456')
+        client = APIClient()
+        client.force_login(admin)
+        url = '/api/v1/training/learner/enrolls/cohort/'
+
+        # Queries not growing with cohort size
+        counts = list()
+        for prefix, total in [('small', 2), ('large', 6)]:
+            learners = self.create_learners(prefix, total)
+            payload = {'course_date': str(self.course_date.uuid),
+                       'learners': [str(learner.uuid) for learner in learners]}
+            with CaptureQueriesContext(connection) as context:
+                response = client.post(url, payload, format='json')
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(response.json()['created'], total)
+            counts.append(len(context.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+        simulation = Simulation.objects.get(learner=learners[0])
+        self.assertEqual((simulation.enroll.course_date_id, simulation.repeat_number), (self.course_date.id, 1))
+        simulation_quiz = simulation.simulation_quiz.get()
+        self.assertEqual(simulation_quiz.course_quiz_id, self.course_quiz['before'].id)
+        self.assertEqual(simulation_quiz.simulation_question.count(), 4)
+
+        # Enrolled learner skipped, unknown one reported
+        missing = '00000000-0000-0000-0000-000000000000'
+        payload = {'course_date': str(self.course_date.uuid), 'learners': [str(self.user.uuid), missing]}
+        data = client.post(url, payload, format='json').json()
+        self.assertEqual(data, {'created': 0, 'skipped': [str(self.user.uuid)], 'missing': [missing]})
+        self.assertEqual(Enroll.objects.filter(learner=self.user).count(), 1)
+
+        # Admin only
+        self.assertEqual(self.client.post(url, payload, format='json').status_code, 403)
+
+    def test_command(self):
+        learners = self.create_learners('crew', 3)
+        output = StringIO()
+        call_command('enroll_cohort', str(self.course_date.uuid), *[str(learner.uuid) for learner in learners],
+                     stdout=output)
+        self.assertIn('Enrolled 3 learner', output.getvalue())
+        self.assertEqual(SimulationQuiz.objects.filter(simulation__learner__in=learners).count(), 3)
+
+
+class SimulationAttemptTestCase(SimulationFixtureMixin, TestCase):
+    def retry(self):
+        return Simulation.objects.create(learner=self.user, course=self.course, enroll=self.enroll)
+
+    def test_attempt_numbered_from_counter(self):
+        second = self.retry()
+        with CaptureQueriesContext(connection) as first_context:
+            third = self.retry()
+        for number in range(3):
+            self.retry()
+        with CaptureQueriesContext(connection) as last_context:
+            last = self.retry()
+
+        # Constant whatever the attempts made
+        self.assertEqual(len(first_context.captured_queries), len(last_context.captured_queries))
+        self.assertEqual((second.repeat_number, third.repeat_number, last.repeat_number), (2, 3, 7))
+        self.assertEqual(Enroll.objects.get(id=self.enroll.id).simulation_count, 7)
+        self.assertEqual(list(self.enroll.simulation.filter(is_done=False)), [last])
+
+        # Plain update close nothing
+        self.simulation.is_done = False
+        self.simulation.save()
+        self.assertFalse(Simulation.objects.get(id=last.id).is_done)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Simulation.objects.filter(id=last.id).update(repeat_number=third.repeat_number)
+
+    def test_counter_picked_up_for_existing_enroll(self):
+        self.retry()
+        Enroll.objects.filter(id=self.enroll.id).update(simulation_count=0)
+        self.assertEqual(self.retry().repeat_number, 3)
+        self.assertEqual(Enroll.objects.get(id=self.enroll.id).simulation_count, 3)
+
+
+class EnrollQueryCountTestCase(SimulationFixtureMixin, TestCase):
+    def count_queries(self, client, url, params=None):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response.json()
+
+    def test_constant_queries(self):
+        client = APIClient()
+        client.force_login(self.user)
+        self.simulation.simulation_quiz.create(course=self.course, course_quiz=self.course_quiz['after'],
+                                               quiz=self.quiz['after'])
+
+        counts = list()
+        for total in [1, 4]:
+            for number in range(total):
+                start_date = timezone.now() + datetime.timedelta(days=10 + number)
+                course_date = CourseDate.objects.create(course=self.course, start_date=start_date,
+                                                        end_date=start_date + datetime.timedelta(hours=8))
+                Enroll.objects.create(learner=self.user, course=self.course, course_date=course_date)
+                Simulation.objects.create(learner=self.user, course=self.course, enroll=self.enroll)
+
+            enroll_count, enroll_data = self.count_queries(client, '/api/v1/training/learner/enrolls/')
+            simulation_count, simulation_data = self.count_queries(
+                client, '/api/v1/training/learner/simulations/', {'enroll_uuid': self.enroll.uuid, 'limit': 10})
+            counts.append((enroll_count, simulation_count))
+
+        self.assertEqual(counts[0], counts[1])
+
+        # Each enroll give its one active simulation
+        active = {item['uuid']: item['simulation']['uuid'] for item in enroll_data['results']}
+        self.assertEqual(active[str(self.enroll.uuid)], str(self.enroll.simulation.get(is_done=False).uuid))
+
+        first = next(item for item in simulation_data['results'] if item['uuid'] == str(self.simulation.uuid))
+        self.assertEqual(first['quiz']['before']['course_quiz_uuid'], str(self.course_quiz['before'].uuid))
+        self.assertEqual(first['quiz']['after']['quiz_uuid'], str(self.quiz['after'].uuid))
+
+
+class SimulationProgressTestCase(SimulationFixtureMixin, TestCase):
+    def test_progress_maintained(self):
+        chapters = [Chapter.objects.create(course=self.course, label='Chapter %s' % number) for number in range(3)]
+        self.simulation.refresh_from_db()
+        self.assertEqual((self.simulation.chapters_total, self.simulation.quizzes_total), (3, 2))
+
+        simulation_chapters = [
+            SimulationChapter.objects.create(simulation=self.simulation, course=self.course, chapter=chapter)
+            for chapter in chapters
+        ]
+        for simulation_chapter in simulation_chapters[:2]:
+            simulation_chapter.is_done = True
+            simulation_chapter.save()
+
+        # Saved again without flip, not counted twice
+        simulation_chapters[0].save()
+        simulation_quiz = self.simulation.simulation_quiz.get()
+        simulation_quiz.is_done = True
+        simulation_quiz.save()
+        simulation_chapters[1].delete()
+
+        self.simulation.refresh_from_db()
+        self.assertEqual((self.simulation.chapters_done, self.simulation.quizzes_done), (1, 1))
+        self.assertEqual(self.simulation.percent, 40.0)
+
+        client = APIClient()
+        client.force_login(self.user)
+        data = client.get('/api/v1/training/learner/enrolls/%s/' % self.enroll.uuid).json()
+        self.assertEqual(data['simulation']['progress']['chapters_total'], 3)
+        self.assertEqual(data['simulation']['progress']['percent'], 40.0)
+
+        # Counter drifted by bulk write repaired
+        Simulation.objects.filter(id=self.simulation.id).update(chapters_done=0, quizzes_done=5)
+        output = StringIO()
+        call_command('refresh_simulation_progress', '--batch-size', '1', stdout=output)
+        self.assertIn('repaired 1', output.getvalue())
+
+        data = client.get('/api/v1/training/learner/simulations/%s/' % self.simulation.uuid).json()
+        self.assertEqual(data['progress'], {'chapters_done': 1, 'chapters_total': 3, 'quizzes_done': 1,
+                                            'quizzes_total': 2, 'percent': 40.0})
+
+
+class CertificateTestCase(SimulationFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def finish(self, learner, identifiers='AAAA'):
+        simulation = Simulation.objects.get(learner=learner, is_done=False)
+        simulation_quiz = SimulationQuiz.objects.create(simulation=simulation, course=self.course,
+                                                        course_quiz=self.course_quiz['after'],
+                                                        quiz=self.quiz['after'])
+        for question, identifier in zip(self.questions, identifiers):
+            self.create_answer(question, identifier, learner=learner, simulation=simulation, position='after')
+
+        simulation_quiz.refresh_from_db()
+        simulation_quiz.is_done = True
+        simulation_quiz.save()
+
+    def test_generate_for_course_date(self):
+        learners = [self.user]
+        for number in range(3):
+            learner = User.objects.create_user('attendee_%s' % number, 'attendee_%s@email.com' % number,
+                                               '123456', first_name='Attendee', last_name=str(number))
+            Enroll.objects.create(learner=learner, course=self.course, course_date=self.course_date)
+            learners.append(learner)
+
+        # Learner not done with after quiz or failed get nothing
+        for learner in learners[:3]:
+            self.finish(learner)
+        failed = User.objects.create_user('failed', 'failed@email.com', '123456')
+        Enroll.objects.create(learner=failed, course=self.course, course_date=self.course_date)
+        self.finish(failed, identifiers='ABBB')
+
+        output = StringIO()
+        call_command('generate_certificates', str(self.course_date.uuid), '--processes', '2',
+                     '--batch-size', '2', stdout=output)
+        self.assertIn('2/3', output.getvalue())
+        self.assertIn('Created 3 certificate', output.getvalue())
+
+        certificate = Certificate.objects.get(learner=learners[1], course=self.course)
+        with certificate.media.open('rb') as f:
+            self.assertEqual(f.read(5), b'%PDF-')
+
+        # Run again only make the missing one
+        self.finish(learners[3])
+        self.assertEqual(generate_certificates(self.course_date.id, processes=1), 1)
+        self.assertEqual(generate_certificates(self.course_date.id, processes=1), 0)
+        self.assertEqual(Certificate.objects.filter(course=self.course).count(), 4)
+        self.assertFalse(Certificate.objects.filter(learner=failed).exists())
+
+    def test_files_removed_on_failure(self):
+        self.finish(self.user)
+        with mock.patch.object(Certificate.objects, 'bulk_create', side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                generate_certificates(self.course_date.id, processes=1)
+
+        storage = Certificate._meta.get_field('media').storage
+        self.assertEqual(storage.listdir('certificate')[1], [])
+
+
+class MaterialMediaMoveTestCase(TestCase):
+    def test_moved_to_protected(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        protected_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, protected_root, ignore_errors=True)
+
+        course = Course.objects.create(label='Working at height')
+        chapter = Chapter.objects.create(course=course, label='Harness', number='1')
+        name = 'material/file/harness.pdf'
+        Material.objects.create(course=course, chapter=chapter, media=name)
+
+        with override_settings(MEDIA_ROOT=media_root, PROTECTED_MEDIA_ROOT=protected_root):
+            os.makedirs(os.path.join(media_root, 'material/file'))
+            with open(os.path.join(media_root, name), 'wb') as f:
+                f.write(b'%PDF-')
+
+            output = StringIO()
+            call_command('move_material_media', stdout=output)
+            self.assertIn('Moved 1', output.getvalue())
+            self.assertTrue(os.path.exists(os.path.join(protected_root, name)))
+            self.assertFalse(os.path.exists(os.path.join(media_root, name)))
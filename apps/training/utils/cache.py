@@ -0,0 +1,80 @@
+import hashlib
+import uuid as uuid_lib
+
+from django.core.cache import cache
+from django.db import transaction
+
+from utils.generals import get_model
+
+Course = get_model('training', 'Course')
+
+# Detail stored per course version and host, version dropped on change
+COURSE_DETAIL_VERSION_KEY = 'training_course_detail_version_%s'
+COURSE_DETAIL_KEY = 'training_course_detail_%s_%s_%s'
+COURSE_DETAIL_STAT_KEY = 'training_course_detail_stat_%s'
+COURSE_DETAIL_TIMEOUT = 60 * 60 * 24
+
+
+def _incr_stat(stat):
+    key = COURSE_DETAIL_STAT_KEY % stat
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def get_course_detail(uuid, request, build):
+    """
+    Rendered course representation keyed by course uuid.
+    Hyperlinked fields depend on host, so each host stored under own key
+    next to the course version, new version on invalidation leave every
+    host variant unreachable until expired.
+    """
+    try:
+        # Same key as used by invalidation
+        version_key = COURSE_DETAIL_VERSION_KEY % uuid_lib.UUID(str(uuid))
+    except ValueError:
+        return build()
+
+    version = cache.get(version_key)
+    if version is None:
+        # Concurrent first read agree on the version added first
+        cache.add(version_key, uuid_lib.uuid4().hex, timeout=None)
+        version = cache.get(version_key)
+
+    host = hashlib.md5(request.build_absolute_uri('/').encode('utf-8')).hexdigest()
+    key = COURSE_DETAIL_KEY % (uuid_lib.UUID(str(uuid)).hex, version, host)
+
+    data = cache.get(key)
+    if data is not None:
+        _incr_stat('hit')
+        return data
+
+    _incr_stat('miss')
+    data = dict(build())
+    cache.set(key, data, timeout=COURSE_DETAIL_TIMEOUT)
+    return data
+
+
+def invalidate_course_detail(uuids):
+    # Dropped once committed, rebuild before commit would cache old content
+    keys = [COURSE_DETAIL_VERSION_KEY % uuid for uuid in uuids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_course_detail_by_id(course_ids):
+    uuids = Course.objects.filter(id__in=course_ids).values_list('uuid', flat=True)
+    invalidate_course_detail(uuids)
+
+
+def course_detail_stats():
+    hit = cache.get(COURSE_DETAIL_STAT_KEY % 'hit', 0)
+    miss = cache.get(COURSE_DETAIL_STAT_KEY % 'miss', 0)
+    total = hit + miss
+
+    return {
+        'hit': hit,
+        'miss': miss,
+        'ratio': round(hit / total, 4) if total else None,
+    }
@@ -0,0 +1,161 @@
+from io import BytesIO
+
+from billiard import Pool
+from PIL import Image, ImageDraw, ImageFont
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+
+from utils.generals import get_model
+
+from .constants import AFTER
+
+Certificate = get_model('training', 'Certificate')
+SimulationQuiz = get_model('training', 'SimulationQuiz')
+
+# Certificates rendered and stored per transaction
+CERTIFICATE_BATCH_SIZE = 50
+
+# A4 landscape at 150 dpi
+PAGE_SIZE = (1754, 1240)
+PAGE_RESOLUTION = 150.0
+
+
+def certificate_processes():
+    # 0 or 1 render in the calling process
+    return getattr(settings, 'CERTIFICATE_PROCESSES', 2)
+
+
+def certificate_passing_score():
+    return getattr(settings, 'CERTIFICATE_PASSING_SCORE', 70)
+
+
+def load_font(path, size):
+    try:
+        return ImageFont.truetype(path or 'DejaVuSans.ttf', size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def render_certificate(payload):
+    """
+    PDF bytes of one certificate, run in pool worker so
+    take and return plain value only
+    """
+    image = Image.new('RGB', PAGE_SIZE, 'white')
+    draw = ImageDraw.Draw(image)
+    width, height = PAGE_SIZE
+
+    draw.rectangle([40, 40, width - 40, height - 40], outline='black', width=6)
+    lines = [
+        (payload['title'], 96, 300),
+        (payload['learner'], 80, 520),
+        (payload['course'], 56, 700),
+        (payload['date'], 40, 880),
+        (payload['reference'], 24, height - 120),
+    ]
+    for text, size, top in lines:
+        font = load_font(payload.get('font'), size)
+        left, _top, right, _bottom = draw.textbbox((0, 0), text, font=font)
+        draw.text(((width - (right - left)) / 2, top), text, fill='black', font=font)
+
+    content = BytesIO()
+    image.save(content, 'PDF', resolution=PAGE_RESOLUTION)
+    return content.getvalue()
+
+
+def pending_certificates(course_date_id):
+    """
+    (learner_id, course_id, name, course label) of learner done with
+    the after quiz in course date with passing score, certificate not made yet
+    """
+    rows = SimulationQuiz.objects \
+        .filter(simulation__enroll__course_date_id=course_date_id, course_quiz__position=AFTER,
+                is_done=True, score_total__gt=0, score_percentage__gte=certificate_passing_score()) \
+        .order_by('simulation__learner_id') \
+        .values_list('simulation__learner_id', 'course_id', 'simulation__learner__first_name',
+                     'simulation__learner__last_name', 'simulation__learner__username', 'course__label') \
+        .distinct()
+
+    rows = list(rows)
+    existing = set(Certificate.objects
+                   .filter(course_id__in=set(row[1] for row in rows),
+                           learner_id__in=set(row[0] for row in rows))
+                   .values_list('learner_id', 'course_id'))
+
+    pending = dict()
+    for learner_id, course_id, first_name, last_name, username, label in rows:
+        if (learner_id, course_id) not in existing:
+            name = ' '.join(part for part in [first_name, last_name] if part) or username
+            pending[(learner_id, course_id)] = (name, label)
+    return [(learner_id, course_id, name, label) for (learner_id, course_id), (name, label) in pending.items()]
+
+
+def store_certificates(rows, contents):
+    """
+    Write files through storage then insert rows in one transaction.
+    Certificate made meanwhile by other job kept and the file written
+    here removed, every file written removed when insert failed.
+    """
+    objs = list()
+    try:
+        for (learner_id, course_id, name, label), content in zip(rows, contents):
+            obj = Certificate(learner_id=learner_id, course_id=course_id)
+            obj.media.save('%s.pdf' % obj.uuid, ContentFile(content), save=False)
+            objs.append(obj)
+
+        with transaction.atomic():
+            Certificate.objects.bulk_create(objs, ignore_conflicts=True)
+            stored = set(Certificate.objects.filter(uuid__in=[obj.uuid for obj in objs])
+                         .values_list('uuid', flat=True))
+    except Exception:
+        for obj in objs:
+            obj.media.storage.delete(obj.media.name)
+        raise
+
+    for obj in objs:
+        if obj.uuid not in stored:
+            obj.media.storage.delete(obj.media.name)
+    return len(stored)
+
+
+def generate_certificates(course_date_id, processes=None, batch_size=CERTIFICATE_BATCH_SIZE, progress=None):
+    """
+    Certificate of every learner done with course date not having one yet,
+    rendered on process pool batch by batch. Run again only make the missing one.
+    `progress(done, total)` called after each batch.
+    Return number of certificate created.
+    """
+    processes = certificate_processes() if processes is None else processes
+    rows = pending_certificates(course_date_id)
+    total = len(rows)
+    date = timezone.now().date().strftime('%d %B %Y')
+    title = str(getattr(settings, 'CERTIFICATE_TITLE', 'Certificate of Completion'))
+    font = getattr(settings, 'CERTIFICATE_FONT', None)
+
+    pool = Pool(processes) if processes > 1 and total > 1 else None
+    created = 0
+    try:
+        for index in range(0, total, batch_size):
+            batch = rows[index:index + batch_size]
+            payloads = [
+                {'title': title, 'learner': name, 'course': label or '', 'date': date,
+                 'reference': '%s-%s-%s' % (course_date_id, course_id, learner_id), 'font': font}
+                for learner_id, course_id, name, label in batch
+            ]
+
+            contents = pool.map(render_certificate, payloads) if pool is not None \
+                else [render_certificate(payload) for payload in payloads]
+            created += store_certificates(batch, contents)
+
+            if progress is not None:
+                progress(min(index + batch_size, total), total)
+    finally:
+        # Every result already collected by map, no need to wait idle worker
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    return created
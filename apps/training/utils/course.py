@@ -0,0 +1,84 @@
+import datetime
+
+from django.utils import timezone
+
+from utils.generals import get_model
+
+from .cache import invalidate_course_detail
+
+Course = get_model('training', 'Course')
+CourseDate = get_model('training', 'CourseDate')
+
+# Number of courses refreshed per roll forward batch
+ROLL_FORWARD_BATCH_SIZE = 500
+
+
+def upcoming_threshold():
+    """
+    Session start today or later counted as upcoming
+    Same as catalog filter used before
+    """
+    return datetime.datetime.combine(timezone.datetime.today(), datetime.time.min)
+
+
+def touch_courses(course_ids):
+    """
+    Bump update_date, sessions are part of the course representation
+    so list validators follow them without joining course dates
+    """
+    Course.objects.filter(id__in=course_ids).update(update_date=timezone.now())
+
+
+def refresh_next_course_date(course_ids):
+    """
+    Recompute `next_course_date` and `next_start_date` for given courses.
+    Only courses with changed values are written.
+    """
+    course_ids = set(course_ids)
+    if not course_ids:
+        return 0
+
+    nearest = dict()
+    course_dates = CourseDate.objects \
+        .filter(course_id__in=course_ids, start_date__gte=upcoming_threshold()) \
+        .order_by('course_id', 'start_date', 'id') \
+        .values_list('course_id', 'id', 'start_date')
+
+    for course_id, course_date_id, start_date in course_dates:
+        nearest.setdefault(course_id, (course_date_id, start_date))
+
+    current = Course.objects.filter(id__in=course_ids) \
+        .values_list('id', 'uuid', 'next_course_date_id', 'next_start_date')
+
+    updated = list()
+    for course_id, course_uuid, course_date_id, start_date in current:
+        value = nearest.get(course_id, (None, None))
+        if value == (course_date_id, start_date):
+            continue
+
+        # Bump update_date, next session is part of the course representation
+        Course.objects.filter(id=course_id).update(next_course_date_id=value[0],
+                                                   next_start_date=value[1],
+                                                   update_date=timezone.now())
+        updated.append(course_uuid)
+
+    invalidate_course_detail(updated)
+    return len(updated)
+
+
+def roll_forward_next_course_date(rebuild=False):
+    """
+    Move courses whose next session already passed to the following one.
+    With `rebuild` every course refreshed, used for backfill.
+    """
+    queryset = Course.objects.all()
+    if not rebuild:
+        queryset = queryset.filter(next_start_date__lt=upcoming_threshold())
+
+    course_ids = list(queryset.order_by('id').values_list('id', flat=True))
+
+    updated = 0
+    for index in range(0, len(course_ids), ROLL_FORWARD_BATCH_SIZE):
+        updated += refresh_next_course_date(course_ids[index:index + ROLL_FORWARD_BATCH_SIZE])
+
+    return updated
@@ -0,0 +1,115 @@
+import os
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.utils import timezone
+
+from utils.generals import get_model
+
+from .cache import invalidate_course_detail
+
+Course = get_model('training', 'Course')
+
+RENDITION_PATH = 'images/course/renditions'
+
+# Extension, Pillow format and save options
+RENDITION_FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpeg', 'JPEG', {'quality': 80, 'optimize': True, 'progressive': True}),
+)
+
+
+def rendition_widths():
+    return sorted(set(getattr(settings, 'COURSE_COVER_RENDITION_WIDTHS', (320, 640, 960))))
+
+
+def render_image(image, width, fmt, options):
+    height = max(1, round(image.height * width / image.width))
+    resized = image.resize((width, height), Image.LANCZOS) if width != image.width else image
+
+    content = BytesIO()
+    resized.save(content, fmt, **options)
+    return height, content.getvalue()
+
+
+def remove_renditions(storage, renditions, keep=()):
+    for rendition in (renditions or dict()).values():
+        for ext, fmt, options in RENDITION_FORMATS:
+            name = rendition.get(ext, None)
+            if name and name not in keep:
+                storage.delete(name)
+
+
+def build_cover_renditions(course_id):
+    """
+    Fixed width WebP and JPEG variant of course cover.
+    Width larger than the original not upscaled, original width used once instead.
+    """
+    course = Course.objects.filter(id=course_id) \
+        .only('id', 'uuid', 'cover', 'cover_renditions') \
+        .first()
+    if course is None:
+        return None
+
+    storage = course.cover.storage
+    previous = course.cover_renditions
+    width = height = None
+    renditions = dict()
+
+    if course.cover:
+        with course.cover.open('rb') as f:
+            image = Image.open(f)
+            image = ImageOps.exif_transpose(image)
+            image.load()
+
+        # JPEG has no alpha, WebP keep the same pixel for both format
+        image = image.convert('RGB')
+        width, height = image.size
+        basename = os.path.splitext(os.path.basename(course.cover.name))[0]
+
+        for target in rendition_widths():
+            target = min(target, width)
+            if str(target) in renditions:
+                continue
+
+            rendition = {'width': target}
+            for ext, fmt, options in RENDITION_FORMATS:
+                rendition['height'], content = render_image(image, target, fmt, options)
+                name = '%s/%s-%s-%s.%s' % (RENDITION_PATH, course.uuid, basename, target, ext)
+                rendition[ext] = storage.save(name, ContentFile(content))
+
+            renditions[str(target)] = rendition
+
+    # Only rendition columns, cover may changed again meanwhile
+    Course.objects.filter(id=course.id).update(cover_width=width, cover_height=height,
+                                               cover_renditions=renditions,
+                                               update_date=timezone.now())
+    invalidate_course_detail([course.uuid])
+
+    keep = [rendition[ext] for rendition in renditions.values() for ext, fmt, options in RENDITION_FORMATS]
+    remove_renditions(storage, previous, keep=keep)
+    return renditions
+
+
+def cover_rendition_urls(course, request=None):
+    """
+    Rendition map for representation, {width: {width, height, webp, jpeg}}
+    """
+    result = dict()
+    if not course.cover:
+        return result
+
+    storage = course.cover.storage
+    for key, rendition in (course.cover_renditions or dict()).items():
+        item = {'width': rendition.get('width'), 'height': rendition.get('height')}
+        for ext, fmt, options in RENDITION_FORMATS:
+            url = storage.url(rendition[ext]) if rendition.get(ext) else None
+            if url and request is not None:
+                url = request.build_absolute_uri(url)
+            item[ext] = url
+        result[key] = item
+
+    return result
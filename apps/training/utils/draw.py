@@ -0,0 +1,115 @@
+import random
+
+from django.db import transaction
+
+from utils.generals import get_model
+
+Quiz = get_model('training', 'Quiz')
+QuizQuestion = get_model('training', 'QuizQuestion')
+Choice = get_model('training', 'Choice')
+SimulationQuiz = get_model('training', 'SimulationQuiz')
+SimulationQuestion = get_model('training', 'SimulationQuestion')
+
+
+def draw_seed(simulation_quiz):
+    # Same simulation quiz always give the same draw
+    return simulation_quiz.uuid.int
+
+
+def draw(pool, draw_count, rng):
+    """
+    Pool of quiz question in default order, all kept in that order
+    when draw_count is 0 or larger than the pool
+    """
+    if not draw_count or draw_count >= len(pool):
+        return list(pool)
+    return rng.sample(pool, draw_count)
+
+
+@transaction.atomic
+def draw_questions(simulation_quizzes):
+    """
+    Materialize question draw and choice order of each simulation quiz,
+    sampled in Python with seeded random. Simulation quiz drawn before skipped.
+    Return number of simulation quiz drawn.
+    """
+    simulation_quizzes = list(simulation_quizzes)
+    drawn = set(SimulationQuestion.objects
+                .filter(simulation_quiz_id__in=[obj.id for obj in simulation_quizzes])
+                .values_list('simulation_quiz_id', flat=True)
+                .distinct())
+    simulation_quizzes = [obj for obj in simulation_quizzes if obj.id not in drawn]
+    if not simulation_quizzes:
+        return 0
+
+    quiz_ids = set(obj.quiz_id for obj in simulation_quizzes)
+    quizzes = Quiz.objects.in_bulk(quiz_ids)
+
+    # Pool in the order question served without draw
+    pools = dict()
+    quiz_questions = QuizQuestion.objects.filter(quiz_id__in=quiz_ids) \
+        .order_by('-create_date', '-id') \
+        .values_list('id', 'quiz_id', 'question_id')
+    for quiz_question_id, quiz_id, question_id in quiz_questions:
+        pools.setdefault(quiz_id, []).append((quiz_question_id, question_id))
+
+    choices = dict()
+    shuffled = [quiz_id for quiz_id, quiz in quizzes.items() if quiz.shuffle_choices]
+    if shuffled:
+        choice_objs = Choice.objects \
+            .filter(question__quiz_question__quiz_id__in=shuffled) \
+            .order_by('identifier', 'id') \
+            .values_list('question_id', 'uuid') \
+            .distinct()
+        for question_id, choice_uuid in choice_objs:
+            choices.setdefault(question_id, []).append(str(choice_uuid))
+
+    objs = list()
+    counts = dict()
+    for simulation_quiz in simulation_quizzes:
+        quiz = quizzes[simulation_quiz.quiz_id]
+        rng = random.Random(draw_seed(simulation_quiz))
+        questions = draw(pools.get(quiz.id, []), quiz.draw_count, rng)
+
+        for position, (quiz_question_id, question_id) in enumerate(questions):
+            choice_order = list()
+            if quiz.shuffle_choices:
+                choice_order = list(choices.get(question_id, []))
+                rng.shuffle(choice_order)
+
+            objs.append(SimulationQuestion(simulation_quiz_id=simulation_quiz.id,
+                                           quiz_question_id=quiz_question_id,
+                                           question_id=question_id,
+                                           position=position,
+                                           choice_order=choice_order))
+
+        # Score total follow the draw
+        simulation_quiz.question_count = len(questions)
+        counts.setdefault(len(questions), []).append(simulation_quiz.id)
+
+    SimulationQuestion.objects.bulk_create(objs, batch_size=500)
+    for count, ids in counts.items():
+        SimulationQuiz.objects.filter(id__in=ids).update(question_count=count)
+    return len(simulation_quizzes)
+
+
+def drawn_questions(keys):
+    """
+    Question ids drawn per (simulation_id, course_quiz_id), simulation
+    quiz without draw left out. One query whatever the number of keys.
+    """
+    keys = set(keys)
+    if not keys:
+        return dict()
+
+    rows = SimulationQuestion.objects \
+        .filter(simulation_quiz__simulation_id__in=set(key[0] for key in keys),
+                simulation_quiz__course_quiz_id__in=set(key[1] for key in keys)) \
+        .order_by() \
+        .values_list('simulation_quiz__simulation_id', 'simulation_quiz__course_quiz_id', 'question_id')
+
+    drawn = dict()
+    for simulation_id, course_quiz_id, question_id in rows:
+        if (simulation_id, course_quiz_id) in keys:
+            drawn.setdefault((simulation_id, course_quiz_id), set()).add(question_id)
+    return drawn
@@ -0,0 +1,84 @@
+from django.db import transaction
+
+from utils.generals import get_model
+
+from .constants import BEFORE
+from .draw import draw_questions
+from .progress import course_totals
+
+User = get_model('person', 'User')
+CourseQuiz = get_model('training', 'CourseQuiz')
+Enroll = get_model('training', 'Enroll')
+Simulation = get_model('training', 'Simulation')
+SimulationQuiz = get_model('training', 'SimulationQuiz')
+
+# Rows per INSERT statement
+COHORT_BATCH_SIZE = 1000
+
+
+def bulk_create_ids(model, objs, batch_size=COHORT_BATCH_SIZE):
+    """
+    Insert and give back {uuid: id}, primary key of bulk created
+    row only returned by PostgreSQL so read again by uuid
+    """
+    model.objects.bulk_create(objs, batch_size=batch_size)
+
+    ids = dict()
+    uuids = [obj.uuid for obj in objs]
+    for index in range(0, len(uuids), batch_size):
+        rows = model.objects.filter(uuid__in=uuids[index:index + batch_size]).values_list('uuid', 'id')
+        ids.update(rows)
+    return ids
+
+
+@transaction.atomic
+def enroll_cohort(course_date, learner_uuids, batch_size=COHORT_BATCH_SIZE):
+    """
+    Enroll many learners to course date at once, same rows as one by one
+    enroll (Enroll, first Simulation and before SimulationQuiz) with one
+    bulk insert per model, signals not sent. Learner already enrolled
+    to the course date skipped.
+    Return (created learner uuids, skipped learner uuids, missing uuids).
+    """
+    course_id = course_date.course_id
+    learner_uuids = list(dict.fromkeys(str(uuid) for uuid in learner_uuids))
+
+    learners = dict()
+    for index in range(0, len(learner_uuids), batch_size):
+        rows = User.objects.filter(uuid__in=learner_uuids[index:index + batch_size]).values_list('uuid', 'id')
+        learners.update((str(uuid), _id) for uuid, _id in rows)
+    missing = [uuid for uuid in learner_uuids if uuid not in learners]
+
+    enrolled = set(Enroll.objects.filter(course_date_id=course_date.id, course_id=course_id)
+                   .values_list('learner_id', flat=True))
+    skipped = [uuid for uuid in learner_uuids if learners.get(uuid) in enrolled]
+    created = [uuid for uuid in learner_uuids if uuid in learners and learners[uuid] not in enrolled]
+    if not created:
+        return created, skipped, missing
+
+    # Resolved once for the whole cohort
+    course_quiz = CourseQuiz.objects.only('id', 'quiz_id').get(course_id=course_id, position=BEFORE)
+
+    enrolls = [Enroll(learner_id=learners[uuid], course_id=course_id, course_date_id=course_date.id,
+                      simulation_count=1)
+               for uuid in created]
+    enroll_ids = bulk_create_ids(Enroll, enrolls, batch_size=batch_size)
+
+    # First attempt, nothing to close
+    chapters_total, quizzes_total = course_totals([course_id])[course_id]
+    simulations = [Simulation(learner_id=obj.learner_id, enroll_id=enroll_ids[obj.uuid],
+                              course_id=course_id, repeat_number=1,
+                              chapters_total=chapters_total, quizzes_total=quizzes_total)
+                   for obj in enrolls]
+    simulation_ids = bulk_create_ids(Simulation, simulations, batch_size=batch_size)
+
+    simulation_quizzes = [SimulationQuiz(simulation_id=simulation_ids[obj.uuid], course_id=course_id,
+                                         course_quiz_id=course_quiz.id, quiz_id=course_quiz.quiz_id)
+                          for obj in simulations]
+    simulation_quiz_ids = bulk_create_ids(SimulationQuiz, simulation_quizzes, batch_size=batch_size)
+
+    for obj in simulation_quizzes:
+        obj.id = simulation_quiz_ids[obj.uuid]
+    draw_questions(simulation_quizzes)
+
+    return created, skipped, missing
@@ -0,0 +1,141 @@
+import datetime
+
+from django.db.models import Count, Max
+from django.db.models.functions import TruncMonth
+from django.utils import dateformat, timezone
+
+from utils.generals import get_model
+
+from .course import upcoming_threshold
+
+Category = get_model('training', 'Category')
+Course = get_model('training', 'Course')
+CourseDate = get_model('training', 'CourseDate')
+CourseFacet = get_model('training', 'CourseFacet')
+
+
+def upcoming_courses():
+    return Course.objects.filter(is_active=True, next_start_date__gte=upcoming_threshold())
+
+
+def upcoming_course_dates():
+    return CourseDate.objects.filter(course__is_active=True, start_date__gte=upcoming_threshold())
+
+
+def month_key(value):
+    return value.strftime('%Y-%m')
+
+
+def month_range(key):
+    start = datetime.datetime.strptime(key, '%Y-%m')
+    end = (start + datetime.timedelta(days=32)).replace(day=1)
+    return start, end
+
+
+def save_facets(facet, rows, keys):
+    """
+    Write computed `rows` ({key: (label, total)}) for given keys,
+    key without total removed.
+    """
+    keys = set(keys)
+    existing = {obj.key: obj for obj in CourseFacet.objects.filter(facet=facet, key__in=keys)}
+
+    create_objs = list()
+    delete_keys = list()
+    for key in keys:
+        label, total = rows.get(key, (None, 0))
+        obj = existing.get(key, None)
+
+        if not total:
+            if obj is not None:
+                delete_keys.append(key)
+        elif obj is None:
+            create_objs.append(CourseFacet(facet=facet, key=key, label=label, total=total))
+        elif (obj.label, obj.total) != (label, total):
+            CourseFacet.objects.filter(id=obj.id).update(label=label, total=total,
+                                                         update_date=timezone.now())
+
+    if delete_keys:
+        CourseFacet.objects.filter(facet=facet, key__in=delete_keys).delete()
+
+    if create_objs:
+        CourseFacet.objects.bulk_create(create_objs)
+
+
+def refresh_category_facets(category_ids):
+    """
+    Recount upcoming course for given categories only
+    """
+    category_ids = set(category_id for category_id in category_ids if category_id)
+    if not category_ids:
+        return
+
+    counts = dict(
+        upcoming_courses().filter(category_id__in=category_ids)
+        .order_by().values_list('category_id').annotate(total=Count('id'))
+    )
+
+    categories = Category.objects.filter(id__in=category_ids).values_list('id', 'uuid', 'label')
+    rows = {str(uuid): (label, counts.get(category_id, 0)) for category_id, uuid, label in categories}
+    save_facets(CourseFacet.CATEGORY, rows, rows.keys())
+
+
+def refresh_month_facets(dates):
+    """
+    Recount upcoming session for months of given dates only
+    """
+    rows = dict()
+    keys = set(month_key(date) for date in dates if date)
+
+    for key in keys:
+        start, end = month_range(key)
+        total = upcoming_course_dates().filter(start_date__gte=start, start_date__lt=end).count()
+        rows[key] = (dateformat.format(start, 'F Y'), total)
+
+    save_facets(CourseFacet.MONTH, rows, keys)
+
+
+def rebuild_facets():
+    """
+    Recompute every facet with one grouped query per facet,
+    run daily after session roll forward.
+    """
+    counts = dict(
+        upcoming_courses().filter(category__isnull=False)
+        .order_by().values_list('category_id').annotate(total=Count('id'))
+    )
+    categories = Category.objects.filter(id__in=counts.keys()).values_list('id', 'uuid', 'label')
+    rows = {str(uuid): (label, counts[category_id]) for category_id, uuid, label in categories}
+    stale = CourseFacet.objects.filter(facet=CourseFacet.CATEGORY).values_list('key', flat=True)
+    save_facets(CourseFacet.CATEGORY, rows, set(rows.keys()) | set(stale))
+
+    months = upcoming_course_dates() \
+        .annotate(month=TruncMonth('start_date')) \
+        .order_by().values_list('month').annotate(total=Count('id'))
+    rows = {month_key(month): (dateformat.format(month, 'F Y'), total) for month, total in months}
+    stale = CourseFacet.objects.filter(facet=CourseFacet.MONTH).values_list('key', flat=True)
+    save_facets(CourseFacet.MONTH, rows, set(rows.keys()) | set(stale))
+
+
+def get_facets():
+    """
+    Facet block for catalog, one query on rollup table
+    """
+    current_month = month_key(upcoming_threshold())
+    facets = {CourseFacet.CATEGORY: list(), CourseFacet.MONTH: list()}
+
+    for facet, key, label, total in CourseFacet.objects.values_list('facet', 'key', 'label', 'total'):
+        if facet == CourseFacet.CATEGORY:
+            facets[facet].append({'uuid': key, 'label': label, 'total': total})
+        elif key >= current_month:
+            facets[facet].append({'month': key, 'label': label, 'total': total})
+
+    return facets
+
+
+def get_facets_version():
+    """
+    Part of catalog validator, facets change with other course too
+    """
+    result = CourseFacet.objects.aggregate(last=Max('update_date'), total=Count('id'))
+    return [result['last'], result['total']]
@@ -0,0 +1,93 @@
+from collections import Counter
+
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from utils.generals import get_model
+
+Chapter = get_model('training', 'Chapter')
+CourseQuiz = get_model('training', 'CourseQuiz')
+Simulation = get_model('training', 'Simulation')
+SimulationChapter = get_model('training', 'SimulationChapter')
+SimulationQuiz = get_model('training', 'SimulationQuiz')
+
+PROGRESS_FIELDS = ['chapters_done', 'chapters_total', 'quizzes_done', 'quizzes_total']
+
+# Simulations recomputed per repair batch
+PROGRESS_BATCH_SIZE = 1000
+
+
+def course_totals(course_ids):
+    """
+    Chapter and quiz count per course, {course_id: (chapters, quizzes)}
+    """
+    course_ids = set(course_ids)
+    chapters = dict(Chapter.objects.filter(course_id__in=course_ids).order_by()
+                    .values_list('course_id').annotate(total=Count('id')))
+    quizzes = dict(CourseQuiz.objects.filter(course_id__in=course_ids).order_by()
+                   .values_list('course_id').annotate(total=Count('id')))
+    return {course_id: (chapters.get(course_id, 0), quizzes.get(course_id, 0)) for course_id in course_ids}
+
+
+def bump_progress(field, simulation_ids, delta=1):
+    """
+    Add delta to done counter of each simulation, simulation given
+    twice moved twice. One UPDATE per distinct step.
+    """
+    steps = dict()
+    for simulation_id, count in Counter(simulation_ids).items():
+        steps.setdefault(count * delta, []).append(simulation_id)
+
+    now = timezone.now()
+    for step, ids in steps.items():
+        if step:
+            Simulation.objects.filter(id__in=ids).update(**{field: F(field) + step, 'update_date': now})
+
+
+def refresh_course_totals(course_ids):
+    """
+    Totals of running simulation follow chapters and quizzes of course,
+    finished attempt keep what it had
+    """
+    now = timezone.now()
+    for course_id, (chapters, quizzes) in course_totals(course_ids).items():
+        Simulation.objects \
+            .filter(course_id=course_id, is_done=False) \
+            .exclude(chapters_total=chapters, quizzes_total=quizzes) \
+            .update(chapters_total=chapters, quizzes_total=quizzes, update_date=now)
+
+
+def refresh_progress(simulation_ids):
+    """
+    Recompute every counter from rows, four grouped queries
+    and one bulk update whatever the number of simulation
+    """
+    simulations = list(Simulation.objects.filter(id__in=simulation_ids)
+                       .only('id', 'course_id', *PROGRESS_FIELDS))
+    if not simulations:
+        return 0
+
+    ids = [obj.id for obj in simulations]
+    chapters = dict(SimulationChapter.objects.filter(simulation_id__in=ids).order_by()
+                    .values_list('simulation_id').annotate(done=Count('id', filter=Q(is_done=True))))
+    quizzes = dict(SimulationQuiz.objects.filter(simulation_id__in=ids).order_by()
+                   .values_list('simulation_id').annotate(done=Count('id', filter=Q(is_done=True))))
+    totals = course_totals(obj.course_id for obj in simulations)
+
+    changed = list()
+    now = timezone.now()
+    for obj in simulations:
+        value = (chapters.get(obj.id, 0), totals[obj.course_id][0],
+                 quizzes.get(obj.id, 0), totals[obj.course_id][1])
+        if value != tuple(getattr(obj, field) for field in PROGRESS_FIELDS):
+            obj.chapters_done, obj.chapters_total, obj.quizzes_done, obj.quizzes_total = value
+            obj.update_date = now
+            changed.append(obj)
+
+    if changed:
+        Simulation.objects.bulk_update(changed, PROGRESS_FIELDS + ['update_date'])
+    return len(changed)
+
+
+def progress_state(simulation):
+    return {field: getattr(simulation, field) for field in PROGRESS_FIELDS + ['percent']}
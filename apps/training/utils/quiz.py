@@ -0,0 +1,178 @@
+import hashlib
+import json
+import uuid as uuid_lib
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from utils.generals import get_model
+
+Quiz = get_model('training', 'Quiz')
+QuizQuestion = get_model('training', 'QuizQuestion')
+Choice = get_model('training', 'Choice')
+
+QUIZ_BUNDLE_KEY = 'training_quiz_bundle_%s'
+ANSWER_KEY_VERSION_KEY = 'training_answer_key_version_%s'
+
+# Answer key held in process memory, {quiz_id: (version, {question_id: choice_id})}
+_ANSWER_KEYS = dict()
+
+
+def build_quiz_bundle(quiz):
+    """
+    Every question and choice of quiz in one document, without `is_true`.
+    Three queries whatever the number of questions.
+    """
+    quiz_questions = QuizQuestion.objects.filter(quiz_id=quiz.id) \
+        .order_by('-create_date', '-id') \
+        .values_list('uuid', 'question_id', 'question__uuid', 'question__label',
+                     'question__description')
+
+    question_ids = [item[1] for item in quiz_questions]
+    choices = dict()
+    choice_objs = Choice.objects.filter(question_id__in=question_ids) \
+        .order_by('identifier', 'id') \
+        .values_list('question_id', 'uuid', 'identifier', 'label', 'description')
+
+    for question_id, choice_uuid, identifier, label, description in choice_objs:
+        choices.setdefault(question_id, []).append({
+            'uuid': str(choice_uuid),
+            'identifier': identifier,
+            'label': label,
+            'description': description,
+        })
+
+    questions = [
+        {
+            'uuid': str(quiz_question_uuid),
+            'question': {
+                'uuid': str(question_uuid),
+                'label': label,
+                'description': description,
+                'choice': choices.get(question_id, []),
+            },
+        }
+        for quiz_question_uuid, question_id, question_uuid, label, description in quiz_questions
+    ]
+
+    bundle = {'uuid': str(quiz.uuid), 'label': quiz.label, 'draw_count': quiz.draw_count,
+              'question': questions}
+    content = json.dumps(bundle, cls=DjangoJSONEncoder, sort_keys=True)
+    bundle['version'] = hashlib.md5(content.encode('utf-8')).hexdigest()
+    return bundle
+
+
+def get_quiz_bundle(quiz_uuid):
+    """
+    Cached bundle, built on first request after any change
+    """
+    key = QUIZ_BUNDLE_KEY % uuid_lib.UUID(str(quiz_uuid))
+    bundle = cache.get(key)
+    # Bundle cached before `draw_count` was part of it built again
+    if bundle is None or 'draw_count' not in bundle:
+        quiz = Quiz.objects.only('id', 'uuid', 'label', 'draw_count').get(uuid=quiz_uuid)
+        bundle = build_quiz_bundle(quiz)
+        cache.set(key, bundle, timeout=None)
+    return bundle
+
+
+def draw_quiz_bundle(bundle, draw):
+    """
+    Bundle limited to question drawn for a simulation, in drawn order with
+    choice order applied. `draw` is [(quiz_question_uuid, choice_order)].
+    """
+    questions = {item['uuid']: item for item in bundle['question']}
+    drawn = list()
+    for quiz_question_uuid, choice_order in draw:
+        item = questions.get(str(quiz_question_uuid), None)
+        if item is None:
+            continue
+
+        if choice_order:
+            order = {choice_uuid: index for index, choice_uuid in enumerate(choice_order)}
+            choices = sorted(item['question']['choice'], key=lambda choice: order.get(choice['uuid'], len(order)))
+            item = dict(item, question=dict(item['question'], choice=choices))
+        drawn.append(item)
+
+    # Draw never change, version follow quiz content
+    content = json.dumps([bundle['version'], [[str(uuid), order] for uuid, order in draw]])
+    version = hashlib.md5(content.encode('utf-8')).hexdigest()
+    return dict(bundle, question=drawn, version=version)
+
+
+def invalidate_quiz_bundle(quiz_uuids):
+    # Dropped once committed, rebuild before commit would cache old content
+    keys = [QUIZ_BUNDLE_KEY % quiz_uuid for quiz_uuid in quiz_uuids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_quiz_bundle_by_question(question_ids):
+    quiz_uuids = QuizQuestion.objects.filter(question_id__in=question_ids) \
+        .values_list('quiz__uuid', flat=True) \
+        .distinct()
+    invalidate_quiz_bundle(quiz_uuids)
+
+
+def load_answer_keys(quiz_ids):
+    answer_keys = {quiz_id: dict() for quiz_id in quiz_ids}
+    rows = QuizQuestion.objects \
+        .filter(quiz_id__in=quiz_ids, question__choice__is_true=True) \
+        .order_by() \
+        .values_list('quiz_id', 'question_id', 'question__choice__id')
+
+    for quiz_id, question_id, choice_id in rows:
+        answer_keys[quiz_id][question_id] = choice_id
+    return answer_keys
+
+
+def get_answer_keys(quiz_ids):
+    """
+    True choice per question for each quiz, {quiz_id: {question_id: choice_id}}.
+    Kept in process memory, version checked with one cache round trip,
+    database read only when quiz questions or choices changed.
+    """
+    version_keys = {ANSWER_KEY_VERSION_KEY % quiz_id: quiz_id for quiz_id in set(quiz_ids)}
+    versions = cache.get_many(list(version_keys.keys()))
+
+    result = dict()
+    stale = dict()
+    for key, quiz_id in version_keys.items():
+        version = versions.get(key, None)
+        if version is None:
+            version = uuid_lib.uuid4().hex
+            cache.add(key, version, timeout=None)
+
+        local = _ANSWER_KEYS.get(quiz_id, None)
+        if local is not None and local[0] == version:
+            result[quiz_id] = local[1]
+        else:
+            stale[quiz_id] = version
+
+    if stale:
+        loaded = load_answer_keys(list(stale.keys()))
+        for quiz_id, version in stale.items():
+            _ANSWER_KEYS[quiz_id] = (version, loaded[quiz_id])
+            result[quiz_id] = loaded[quiz_id]
+
+    return result
+
+
+def get_answer_key(quiz_id):
+    return get_answer_keys([quiz_id])[quiz_id]
+
+
+def invalidate_answer_keys(quiz_ids):
+    """
+    Next read get new version, every process reload. Dropped once
+    committed, reload before commit would keep the old key.
+    """
+    keys = [ANSWER_KEY_VERSION_KEY % quiz_id for quiz_id in quiz_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_answer_keys_by_question(question_ids):
+    quiz_ids = QuizQuestion.objects.filter(question_id__in=question_ids) \
+        .values_list('quiz_id', flat=True) \
+        .distinct()
+    invalidate_answer_keys(quiz_ids)
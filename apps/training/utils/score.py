@@ -0,0 +1,139 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import BooleanField, Case, Count, Q, Value, When
+from django.utils import timezone
+
+from utils.generals import get_model
+
+from .quiz import get_answer_keys
+
+Answer = get_model('training', 'Answer')
+Choice = get_model('training', 'Choice')
+SimulationQuiz = get_model('training', 'SimulationQuiz')
+
+SCORE_FIELDS = ['score_correct', 'score_total', 'score_percentage']
+
+# Answers checked per regrade transaction
+REGRADE_BATCH_SIZE = 2000
+
+
+def compute_scores(keys):
+    """
+    Correct and answered count per (simulation_id, course_quiz_id),
+    one grouped aggregate over Answer
+    """
+    keys = set(keys)
+    if not keys:
+        return dict()
+
+    rows = Answer.objects \
+        .filter(simulation_id__in=set(key[0] for key in keys),
+                course_quiz_id__in=set(key[1] for key in keys)) \
+        .order_by() \
+        .values_list('simulation_id', 'course_quiz_id') \
+        .annotate(correct=Count('id', filter=Q(is_true=True)), answered=Count('id'))
+
+    return {
+        (simulation_id, course_quiz_id): (correct, answered)
+        for simulation_id, course_quiz_id, correct, answered in rows
+        if (simulation_id, course_quiz_id) in keys
+    }
+
+
+def apply_score(simulation_quiz, scores, answer_key):
+    """
+    Set score on object, question not answered count as wrong.
+    Return True when changed.
+    """
+    correct, _answered = scores.get((simulation_quiz.simulation_id, simulation_quiz.course_quiz_id), (0, 0))
+    # Drawn question count when quiz draw from a pool,
+    # answer only accepted for drawn question
+    total = simulation_quiz.question_count or len(answer_key)
+    percentage = (Decimal(correct * 100) / total).quantize(Decimal('0.01')) if total else Decimal('0')
+
+    value = (correct, total, percentage)
+    if value == tuple(getattr(simulation_quiz, field) for field in SCORE_FIELDS):
+        return False
+
+    simulation_quiz.score_correct, simulation_quiz.score_total, simulation_quiz.score_percentage = value
+    return True
+
+
+def refresh_scores(keys):
+    """
+    Recompute stored score of SimulationQuiz for given
+    (simulation_id, course_quiz_id), changed one written together
+    """
+    keys = set(keys)
+    if not keys:
+        return 0
+
+    scores = compute_scores(keys)
+    simulation_quizzes = [
+        obj for obj in SimulationQuiz.objects.filter(simulation_id__in=set(key[0] for key in keys),
+                                                     course_quiz_id__in=set(key[1] for key in keys))
+        if (obj.simulation_id, obj.course_quiz_id) in keys
+    ]
+    answer_keys = get_answer_keys(set(obj.quiz_id for obj in simulation_quizzes))
+
+    changed = list()
+    now = timezone.now()
+    for obj in simulation_quizzes:
+        if apply_score(obj, scores, answer_keys[obj.quiz_id]):
+            # Score is part of simulation representation
+            obj.update_date = now
+            changed.append(obj)
+
+    if changed:
+        SimulationQuiz.objects.bulk_update(changed, SCORE_FIELDS + ['update_date'])
+    return len(changed)
+
+
+def refresh_scores_for_answers(answers):
+    return refresh_scores((answer.simulation_id, answer.course_quiz_id) for answer in answers)
+
+
+def regrade_question(question_id, batch_size=REGRADE_BATCH_SIZE, progress=None):
+    """
+    Grade stored answers of question again with current true choice.
+    Walk answers by id in batches, each batch one short transaction
+    with set based UPDATE on changed rows only, then refresh affected scores.
+    `progress(done, total)` called after each batch.
+    """
+    true_ids = list(Choice.objects.filter(question_id=question_id, is_true=True)
+                    .values_list('id', flat=True))
+    answers = Answer.objects.filter(question_id=question_id).order_by('id')
+    total = answers.count()
+
+    done = 0
+    changed = 0
+    last_id = 0
+    while True:
+        batch = list(answers.filter(id__gt=last_id).values_list('id', flat=True)[:batch_size])
+        if not batch:
+            break
+
+        with transaction.atomic():
+            wrong = Answer.objects \
+                .filter(id__in=batch) \
+                .filter(Q(choice_id__in=true_ids, is_true=False)
+                        | (~Q(choice_id__in=true_ids) & Q(is_true=True))) \
+                .values_list('id', 'simulation_id', 'course_quiz_id')
+            wrong = list(wrong)
+
+            if wrong:
+                Answer.objects.filter(id__in=[item[0] for item in wrong]).update(
+                    is_true=Case(When(choice_id__in=true_ids, then=Value(True)),
+                                 default=Value(False), output_field=BooleanField()),
+                    update_date=timezone.now()
+                )
+                refresh_scores((simulation_id, course_quiz_id) for _id, simulation_id, course_quiz_id in wrong)
+
+        changed += len(wrong)
+        done += len(batch)
+        last_id = batch[-1]
+        if progress is not None:
+            progress(done, total)
+
+    return changed
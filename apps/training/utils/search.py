@@ -0,0 +1,279 @@
+import re
+
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import Q, Value, FloatField
+from django.db.models.expressions import RawSQL
+
+from utils.generals import get_model
+
+Course = get_model('training', 'Course')
+Chapter = get_model('training', 'Chapter')
+
+SEARCH_TABLE = 'training_course_search'
+SEARCH_BATCH_SIZE = 500
+
+
+class BaseSearchBackend:
+    """
+    Course search index kept in own table, one row per course.
+    Table managed outside migrations because column type and index
+    depend on database vendor.
+    """
+    vendor = None
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    @property
+    def course_table(self):
+        return self.connection.ops.quote_name(Course._meta.db_table)
+
+    def setup(self):
+        with self.connection.cursor() as cursor:
+            for sql in self.setup_sql():
+                cursor.execute(sql)
+
+    def setup_sql(self):
+        return []
+
+    def index(self, documents):
+        raise NotImplementedError
+
+    def remove(self, course_ids):
+        if not course_ids:
+            return
+
+        placeholders = ', '.join(['%s'] * len(course_ids))
+        with self.connection.cursor() as cursor:
+            cursor.execute('DELETE FROM %s WHERE %s IN (%s)' % (SEARCH_TABLE, self.key_column, placeholders),
+                           list(course_ids))
+
+    def search(self, queryset, q):
+        raise NotImplementedError
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    tsvector column with GIN index, weighted label > category > chapter > description
+    """
+    vendor = 'postgresql'
+    key_column = 'course_id'
+
+    @property
+    def config(self):
+        return getattr(settings, 'COURSE_SEARCH_CONFIG', 'simple')
+
+    def setup_sql(self):
+        return [
+            'CREATE TABLE IF NOT EXISTS %s ('
+            'course_id integer PRIMARY KEY, '
+            'document tsvector NOT NULL)' % SEARCH_TABLE,
+            'CREATE INDEX IF NOT EXISTS %s_gin ON %s USING gin(document)' % (SEARCH_TABLE, SEARCH_TABLE),
+        ]
+
+    def index(self, documents):
+        sql = (
+            'INSERT INTO %s (course_id, document) VALUES (%%s, '
+            "setweight(to_tsvector(%%s::regconfig, %%s), 'A') || "
+            "setweight(to_tsvector(%%s::regconfig, %%s), 'B') || "
+            "setweight(to_tsvector(%%s::regconfig, %%s), 'C') || "
+            "setweight(to_tsvector(%%s::regconfig, %%s), 'D')) "
+            'ON CONFLICT (course_id) DO UPDATE SET document = EXCLUDED.document' % SEARCH_TABLE
+        )
+
+        config = self.config
+        params = [
+            [doc['id'], config, doc['label'], config, doc['category'],
+             config, doc['chapters'], config, doc['description']]
+            for doc in documents
+        ]
+
+        with self.connection.cursor() as cursor:
+            cursor.executemany(sql, params)
+
+    def search(self, queryset, q):
+        match = "document @@ plainto_tsquery(%s::regconfig, %s)"
+        params = [self.config, q]
+
+        return queryset \
+            .filter(id__in=RawSQL('SELECT course_id FROM %s WHERE %s' % (SEARCH_TABLE, match), params)) \
+            .annotate(search_rank=RawSQL(
+                'SELECT ts_rank(document, plainto_tsquery(%%s::regconfig, %%s)) FROM %s '
+                'WHERE course_id = %s.id' % (SEARCH_TABLE, self.course_table),
+                params, output_field=FloatField()
+            ))
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    """
+    FTS5 virtual table, rowid is course id, ranked by bm25
+    """
+    vendor = 'sqlite'
+    key_column = 'rowid'
+
+    # bm25 column weights for label, category, chapters, description
+    weights = (10.0, 5.0, 2.0, 1.0)
+
+    def setup_sql(self):
+        return [
+            'CREATE VIRTUAL TABLE IF NOT EXISTS %s USING fts5('
+            'label, category, chapters, description)' % SEARCH_TABLE,
+        ]
+
+    def index(self, documents):
+        self.remove([doc['id'] for doc in documents])
+
+        sql = 'INSERT INTO %s (rowid, label, category, chapters, description) ' \
+              'VALUES (%%s, %%s, %%s, %%s, %%s)' % SEARCH_TABLE
+        params = [
+            [doc['id'], doc['label'], doc['category'], doc['chapters'], doc['description']]
+            for doc in documents
+        ]
+
+        with self.connection.cursor() as cursor:
+            cursor.executemany(sql, params)
+
+    def build_query(self, q):
+        # Quote each term so user input never read as FTS5 syntax, prefix match
+        terms = re.findall(r'\w+', q, re.UNICODE)
+        return ' '.join('"%s"*' % term for term in terms)
+
+    def search(self, queryset, q):
+        query = self.build_query(q)
+        if not query:
+            return queryset.none()
+
+        weights = ', '.join(str(weight) for weight in self.weights)
+        return queryset \
+            .filter(id__in=RawSQL('SELECT rowid FROM %s WHERE %s MATCH %%s' % (SEARCH_TABLE, SEARCH_TABLE),
+                                  [query])) \
+            .annotate(search_rank=RawSQL(
+                'SELECT -bm25(%s, %s) FROM %s WHERE %s MATCH %%s AND rowid = %s.id'
+                % (SEARCH_TABLE, weights, SEARCH_TABLE, SEARCH_TABLE, self.course_table),
+                [query], output_field=FloatField()
+            ))
+
+
+class MySQLSearchBackend(BaseSearchBackend):
+    """
+    InnoDB FULLTEXT index, label repeated to weight it above other text
+    """
+    vendor = 'mysql'
+    key_column = 'course_id'
+
+    def setup_sql(self):
+        return [
+            'CREATE TABLE IF NOT EXISTS %s ('
+            'course_id integer PRIMARY KEY, '
+            'document longtext NOT NULL, '
+            'FULLTEXT KEY %s_ft (document)) ENGINE=InnoDB' % (SEARCH_TABLE, SEARCH_TABLE),
+        ]
+
+    def index(self, documents):
+        sql = 'INSERT INTO %s (course_id, document) VALUES (%%s, %%s) ' \
+              'ON DUPLICATE KEY UPDATE document = VALUES(document)' % SEARCH_TABLE
+        params = [
+            [doc['id'], ' '.join([doc['label'], doc['label'], doc['category'],
+                                  doc['chapters'], doc['description']])]
+            for doc in documents
+        ]
+
+        with self.connection.cursor() as cursor:
+            cursor.executemany(sql, params)
+
+    def search(self, queryset, q):
+        match = 'MATCH(document) AGAINST (%s IN NATURAL LANGUAGE MODE)'
+        return queryset \
+            .filter(id__in=RawSQL('SELECT course_id FROM %s WHERE %s' % (SEARCH_TABLE, match), [q])) \
+            .annotate(search_rank=RawSQL(
+                'SELECT %s FROM %s WHERE course_id = %s.id' % (match, SEARCH_TABLE, self.course_table),
+                [q], output_field=FloatField()
+            ))
+
+
+class DefaultSearchBackend(BaseSearchBackend):
+    """
+    No index for other vendor, plain icontains
+    """
+    def index(self, documents):
+        pass
+
+    def remove(self, course_ids):
+        pass
+
+    def search(self, queryset, q):
+        return queryset \
+            .filter(Q(label__icontains=q) | Q(description__icontains=q)
+                    | Q(category__label__icontains=q) | Q(chapter__label__icontains=q)) \
+            .distinct() \
+            .annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+_BACKENDS = {
+    backend.vendor: backend
+    for backend in [PostgresSearchBackend, SQLiteSearchBackend, MySQLSearchBackend]
+}
+
+
+def get_backend(using=None):
+    conn = connections[using] if using else connection
+    return _BACKENDS.get(conn.vendor, DefaultSearchBackend)(conn)
+
+
+def build_documents(course_ids):
+    """
+    Text of each course, two queries whatever the number of courses
+    """
+    chapters = dict()
+    chapter_objs = Chapter.objects.filter(course_id__in=course_ids) \
+        .order_by('course_id', 'number') \
+        .values_list('course_id', 'label')
+
+    for course_id, label in chapter_objs:
+        chapters.setdefault(course_id, []).append(label)
+
+    course_objs = Course.objects.filter(id__in=course_ids) \
+        .values_list('id', 'label', 'description', 'category__label')
+
+    return [
+        {
+            'id': course_id,
+            'label': label or '',
+            'description': description or '',
+            'category': category or '',
+            'chapters': ' '.join(chapters.get(course_id, [])),
+        }
+        for course_id, label, description, category in course_objs
+    ]
+
+
+def reindex_courses(course_ids):
+    course_ids = list(set(course_ids))
+    if not course_ids:
+        return
+
+    documents = build_documents(course_ids)
+    found = set(doc['id'] for doc in documents)
+
+    backend = get_backend()
+    backend.index(documents)
+    backend.remove([course_id for course_id in course_ids if course_id not in found])
+
+
+def remove_courses(course_ids):
+    get_backend().remove(list(course_ids))
+
+
+def rebuild_search_index():
+    course_ids = list(Course.objects.order_by('id').values_list('id', flat=True))
+    for index in range(0, len(course_ids), SEARCH_BATCH_SIZE):
+        reindex_courses(course_ids[index:index + SEARCH_BATCH_SIZE])
+    return len(course_ids)
+
+
+def search_courses(queryset, q):
+    """
+    Filter queryset to courses matching `q`, best match first
+    """
+    return get_backend().search(queryset, q).order_by('-search_rank', '-create_date')
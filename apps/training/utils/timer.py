@@ -0,0 +1,143 @@
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from utils.generals import get_model
+
+from .progress import bump_progress
+from .score import refresh_scores
+
+SimulationQuiz = get_model('training', 'SimulationQuiz')
+
+QUIZ_DEADLINE_KEY = 'training_quiz_deadline_%s_%s'
+QUIZ_DEADLINE_TIMEOUT = 60 * 60 * 24
+
+# Expired quiz finalized per sweep transaction
+SWEEP_BATCH_SIZE = 500
+
+
+def deadline_grace():
+    # Answer sent right before deadline still accepted despite network latency
+    return datetime.timedelta(seconds=getattr(settings, 'QUIZ_DEADLINE_GRACE', 30))
+
+
+def deadline_key(simulation_id, course_quiz_id):
+    return QUIZ_DEADLINE_KEY % (simulation_id, course_quiz_id)
+
+
+def session_value(simulation_quiz):
+    deadline = simulation_quiz.deadline
+    return {
+        'deadline': deadline.timestamp() if deadline else None,
+        'is_done': simulation_quiz.is_done,
+        # Timed quiz not started yet, started by first answer
+        'timed': bool(simulation_quiz.course_quiz.duration),
+    }
+
+
+def set_session(simulation_quiz):
+    cache.set(deadline_key(simulation_quiz.simulation_id, simulation_quiz.course_quiz_id),
+              session_value(simulation_quiz), timeout=QUIZ_DEADLINE_TIMEOUT)
+
+
+def invalidate_sessions(keys):
+    # Dropped once committed, read before commit would cache old session
+    cache_keys = [deadline_key(simulation_id, course_quiz_id) for simulation_id, course_quiz_id in keys]
+    transaction.on_commit(lambda: cache.delete_many(cache_keys))
+
+
+def start_quiz(simulation_quiz):
+    """
+    Record start and deadline once, start again return the same deadline.
+    Duration 0 mean unlimited, no deadline.
+    """
+    if simulation_quiz.start_date is None:
+        now = timezone.now()
+        duration = simulation_quiz.course_quiz.duration
+        deadline = now + datetime.timedelta(minutes=duration) if duration else None
+
+        # Guard against double start from concurrent request
+        SimulationQuiz.objects.filter(id=simulation_quiz.id, start_date__isnull=True) \
+            .update(start_date=now, deadline=deadline, update_date=now)
+        simulation_quiz.refresh_from_db(fields=['start_date', 'deadline', 'is_done', 'update_date'])
+
+    set_session(simulation_quiz)
+    return simulation_quiz
+
+
+def load_sessions(keys):
+    return [
+        obj for obj in SimulationQuiz.objects
+        .filter(simulation_id__in=set(key[0] for key in keys),
+                course_quiz_id__in=set(key[1] for key in keys))
+        .select_related('course_quiz')
+        .only('id', 'simulation_id', 'course_quiz_id', 'start_date', 'deadline', 'is_done',
+              'update_date', 'course_quiz__duration')
+        if (obj.simulation_id, obj.course_quiz_id) in keys
+    ]
+
+
+def closed_sessions(keys):
+    """
+    Given (simulation_id, course_quiz_id) whose quiz is done or past deadline.
+    Read from cache, database only for session not cached yet.
+    Timed quiz answered without start started now, so timer
+    can not be skipped by never calling start.
+    """
+    keys = set(keys)
+    cache_keys = {deadline_key(*key): key for key in keys}
+    sessions = {cache_keys[cache_key]: value for cache_key, value in cache.get_many(list(cache_keys.keys())).items()}
+
+    missing = keys - set(sessions.keys())
+    if missing:
+        for obj in load_sessions(missing):
+            sessions[(obj.simulation_id, obj.course_quiz_id)] = session_value(obj)
+            set_session(obj)
+
+    unstarted = set(key for key, value in sessions.items()
+                    if value.get('timed') and value['deadline'] is None and not value['is_done'])
+    if unstarted:
+        for obj in load_sessions(unstarted):
+            sessions[(obj.simulation_id, obj.course_quiz_id)] = session_value(start_quiz(obj))
+
+    limit = (timezone.now() - deadline_grace()).timestamp()
+    return set(
+        key for key, value in sessions.items()
+        if value['is_done'] or (value['deadline'] is not None and value['deadline'] < limit)
+    )
+
+
+def finalize_expired_quizzes(batch_size=SWEEP_BATCH_SIZE):
+    """
+    Mark quiz past deadline as done with its final score, in batches.
+    Batch rows locked, quiz being finished by learner meanwhile
+    skipped so progress never counted twice.
+    """
+    queryset = SimulationQuiz.objects \
+        .filter(is_done=False, deadline__lt=timezone.now() - deadline_grace()) \
+        .order_by('id')
+
+    finalized = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            batch = list(queryset.filter(id__gt=last_id)
+                         .select_for_update(skip_locked=True)
+                         .values_list('id', 'simulation_id', 'course_quiz_id')[:batch_size])
+            if not batch:
+                break
+
+            refresh_scores((simulation_id, course_quiz_id) for _id, simulation_id, course_quiz_id in batch)
+            SimulationQuiz.objects.filter(id__in=[item[0] for item in batch]) \
+                .update(is_done=True, update_date=timezone.now())
+            bump_progress('quizzes_done', [simulation_id for _id, simulation_id, course_quiz_id in batch])
+
+        invalidate_sessions((simulation_id, course_quiz_id) for _id, simulation_id, course_quiz_id in batch)
+        finalized += len(batch)
+        # Skipped row not picked again in this sweep
+        last_id = batch[-1][0]
+
+    return finalized
@@ -1,6 +1,7 @@
 from __future__ import absolute_import, unicode_literals
 import os
 from celery import Celery
+from celery.schedules import crontab
 from django.conf import settings
 
 # set the default Django settings module for the 'celery' program.
@@ -20,6 +21,18 @@ app.config_from_object('setup.settings.celeryconfig', namespace='CELERY')
 # Auto-find task.py in each apps
 app.autodiscover_tasks(lambda: settings.INSTALLED_APPS)
 
+# Periodic tasks, run with `celery -A setup beat`
+app.conf.beat_schedule = {
+    'roll-forward-next-course-date': {
+        'task': 'apps.training.tasks.roll_forward_next_course_date',
+        'schedule': crontab(minute=5, hour=0),
+    },
+    'finalize-expired-quiz': {
+        'task': 'apps.training.tasks.finalize_expired_quizzes',
+        'schedule': crontab(minute='*'),
+    },
+}
+
 
 @app.task(bind=True)
 def debug_task(self):
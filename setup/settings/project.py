@@ -97,6 +97,36 @@ SESSION_ENGINE = 'django.contrib.sessions.backends.db'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(PROJECT_PATH, 'media/')
 
+# Material media stored under PROTECTED_MEDIA_ROOT, outside MEDIA_ROOT,
+# so never public under MEDIA_URL. Delivery after enroll check:
+# None streamed by Django with Range support,
+# 'nginx' use X-Accel-Redirect to internal MEDIA_ACCEL_LOCATION,
+# 'sendfile' use X-Sendfile (Apache mod_xsendfile)
+#
+# nginx location for 'nginx', not reachable by client directly:
+#
+#     location /protected/media/ {
+#         internal;
+#         alias /path/to/project/protected/;
+#     }
+PROTECTED_MEDIA_ROOT = os.path.join(PROJECT_PATH, 'protected/')
+MEDIA_ACCEL_REDIRECT = None
+MEDIA_ACCEL_LOCATION = '/protected/media/'
+
+# Course cover resized to these width, WebP and JPEG
+COURSE_COVER_RENDITION_WIDTHS = (320, 640, 960)
+
+# Seconds answer still accepted after quiz deadline
+QUIZ_DEADLINE_GRACE = 30
+
+# Certificate rendered on this many worker process, 0 or 1 render in place.
+# CERTIFICATE_FONT path to TrueType font, DejaVuSans used when found
+CERTIFICATE_PROCESSES = 2
+CERTIFICATE_FONT = None
+CERTIFICATE_TITLE = 'Certificate of Completion'
+# Lowest after quiz percentage given a certificate
+CERTIFICATE_PASSING_SCORE = 70
+
 
 # Django Simple JWT
 # ------------------------------------------------------------------------------
@@ -12,6 +12,7 @@ urlpatterns = [
     path('admin/', admin.site.urls),
 ]
 
+# Material media kept in PROTECTED_MEDIA_ROOT, not served here
 urlpatterns += static(settings.MEDIA_URL,
                       document_root=settings.MEDIA_ROOT)
 urlpatterns += static(settings.STATIC_URL,
@@ -0,0 +1,72 @@
+import base64
+import zlib
+
+from django.db import models
+
+COMPRESSED_PREFIX = 'zlib:'
+
+# Shorter text stored as is, compression not worth it
+COMPRESS_MIN_LENGTH = 256
+
+# Decompressed size yielded per chunk
+DECOMPRESS_CHUNK_SIZE = 64 * 1024
+
+
+def compress_text(value):
+    # Short text starting with prefix compressed anyway, never read back wrong
+    if not value or (len(value) < COMPRESS_MIN_LENGTH and not value.startswith(COMPRESSED_PREFIX)):
+        return value
+
+    data = zlib.compress(value.encode('utf-8'), 9)
+    return COMPRESSED_PREFIX + base64.b64encode(data).decode('ascii')
+
+
+def decompress_text(value):
+    if not value or not value.startswith(COMPRESSED_PREFIX):
+        return value
+
+    data = base64.b64decode(value[len(COMPRESSED_PREFIX):])
+    return zlib.decompress(data).decode('utf-8')
+
+
+def iter_decompress_text(value, chunk_size=DECOMPRESS_CHUNK_SIZE):
+    """
+    Yield stored value as utf-8 bytes, decompressed chunk by chunk
+    so long text never held whole in memory
+    """
+    if not value:
+        return
+
+    if not value.startswith(COMPRESSED_PREFIX):
+        yield value.encode('utf-8')
+        return
+
+    data = base64.b64decode(value[len(COMPRESSED_PREFIX):])
+    decompressor = zlib.decompressobj()
+    while data:
+        chunk = decompressor.decompress(data, chunk_size)
+        data = decompressor.unconsumed_tail
+        if chunk:
+            yield chunk
+
+    chunk = decompressor.flush()
+    if chunk:
+        yield chunk
+
+
+class CompressedTextField(models.TextField):
+    """
+    Text stored zlib compressed in the same text column.
+    Row saved before still readable, value without prefix returned as is.
+    Lookups other than exact on whole value not supported.
+    """
+    def from_db_value(self, value, expression, connection):
+        return decompress_text(value)
+
+    def to_python(self, value):
+        value = super().to_python(value)
+        return decompress_text(value) if isinstance(value, str) else value
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        return compress_text(value) if isinstance(value, str) else value
@@ -1,12 +1,20 @@
 import os
+import re
 import calendar
+import mimetypes
 import time
+from urllib.parse import quote
 
+from django.conf import settings
 from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
 from django.template.defaultfilters import slugify
 
 ALLOWED_EXTENSIONS = ['.jpeg', '.jpg', '.png', '.pdf', '.docx']
 
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+RANGE_CHUNK_SIZE = 64 * 1024
+
 
 class FileSystemStorageExtend(FileSystemStorage):
     def generate_filename(self, filename, *args, **kwargs):
@@ -27,6 +35,26 @@ class FileSystemStorageExtend(FileSystemStorage):
                 dirname, self.get_valid_name(slugify(filename)+file_ext)))
 
 
+class ProtectedStorage(FileSystemStorage):
+    """
+    File kept outside MEDIA_ROOT, never reachable under MEDIA_URL,
+    only delivered by `serve_file` after access checked.
+    Location read from settings on use so override applies.
+    """
+    @property
+    def base_location(self):
+        return self._value_or_setting(self._location, settings.PROTECTED_MEDIA_ROOT)
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+    @property
+    def base_url(self):
+        # Internal location, reachable only through X-Accel-Redirect
+        return self._value_or_setting(self._base_url, settings.MEDIA_ACCEL_LOCATION)
+
+
 def handle_upload_attachment(instance, file):
     if instance and file:
         name, ext = os.path.splitext(file.name)
@@ -37,3 +65,93 @@ def handle_upload_attachment(instance, file):
         instance.file.save('%s-%s%s' % (model_name, filename_slug, ext), file, save=False)
         instance.label = instance.file.name
         instance.save(update_fields=['label', 'file', 'type'])
+
+
+def parse_range(header, size):
+    """
+    Single byte range from Range header as (start, end) inclusive,
+    None when absent or not understood, False when unsatisfiable
+    """
+    match = RANGE_RE.match((header or '').strip())
+    if not match:
+        return None
+
+    start, end = match.groups()
+    if not start and not end:
+        return None
+
+    if not start:
+        # Suffix range, last n bytes
+        length = int(end)
+        if not length:
+            return False
+        return max(size - length, 0), size - 1
+
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def iter_file_range(f, start, length, chunk_size=RANGE_CHUNK_SIZE):
+    try:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+def serve_file(request, field_file):
+    """
+    Deliver stored file.
+    With MEDIA_ACCEL_REDIRECT 'nginx' or 'sendfile' front server send the file,
+    otherwise streamed here with byte range support for seeking.
+    """
+    name = field_file.name
+    storage = field_file.storage
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    accel = getattr(settings, 'MEDIA_ACCEL_REDIRECT', None)
+
+    try:
+        path = storage.path(name)
+    except NotImplementedError:
+        # Remote storage, file served by its own host
+        return HttpResponseRedirect(storage.url(name))
+
+    if accel == 'nginx':
+        location = getattr(settings, 'MEDIA_ACCEL_LOCATION', '/protected/media/')
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = quote(location + name)
+        return response
+
+    if accel == 'sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+        return response
+
+    size = storage.size(name)
+    byte_range = parse_range(request.META.get('HTTP_RANGE', None), size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = 'bytes */%s' % size
+        return response
+
+    if byte_range is None:
+        response = FileResponse(storage.open(name, 'rb'), content_type=content_type)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(iter_file_range(storage.open(name, 'rb'), start, length),
+                                         status=206, content_type=content_type)
+        response['Content-Length'] = str(length)
+        response['Content-Range'] = 'bytes %s-%s/%s' % (start, end, size)
+
+    response['Accept-Ranges'] = 'bytes'
+    return response
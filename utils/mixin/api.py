@@ -1,6 +1,10 @@
+import hashlib
 import itertools
 
 from django.db import transaction
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import never_cache
 
@@ -62,12 +66,93 @@ class WritetableFieldPutMethod(serializers.ModelSerializer):
 
 
 class ListSerializerUpdateMappingField(serializers.ListSerializer):
+    """
+    Create, update and delete objects in one request mapped by uuid.
+    Changes collected and written with `bulk_update`, one per changed field set,
+    and one delete. Row setting a relation set (many to many) saved alone
+    by the child serializer. Set `save_per_row = True` when each object
+    must go through `save()` and its signals.
+    """
+    save_per_row = False
+
     @transaction.atomic
     def update(self, instance, validated_data):
         # Maps for uuid->instance and uuid->data item.
         obj_mapping = {obj.uuid: obj for obj in instance}
         data_mapping = {item.get('uuid', index): item for index, item in enumerate(validated_data)}
 
+        if self.save_per_row:
+            return self.update_per_row(obj_mapping, data_mapping)
+
+        model = self.child.Meta.model
+        ret = []
+        changes = {}
+        for obj_uuid, data in data_mapping.items():
+            obj = obj_mapping.get(obj_uuid, None)
+
+            if obj is None:
+                ret.append(self.child.create(data))
+                continue
+
+            # Relation set not written by bulk_update
+            if self.has_relation_set(obj, data):
+                ret.append(self.child.update(obj, data))
+                continue
+
+            fields = self.update_fields(obj, data)
+            if fields:
+                changes.setdefault(tuple(sorted(fields)), []).append(obj)
+            ret.append(obj)
+
+        for fields, objs in changes.items():
+            model.objects.bulk_update(objs, fields)
+
+        # Perform deletions.
+        delete_ids = [obj.pk for obj_uuid, obj in obj_mapping.items() if obj_uuid not in data_mapping]
+        if delete_ids:
+            model.objects.filter(pk__in=delete_ids).delete()
+
+        return ret
+
+    def has_relation_set(self, obj, data):
+        for attr in data.keys():
+            field = obj._meta.get_field(attr)
+            if field.many_to_many or field.one_to_many:
+                return True
+        return False
+
+    def update_fields(self, obj, data):
+        """
+        Assign changed value to object, return changed field names
+        """
+        fields = []
+        for attr, value in data.items():
+            field = obj._meta.get_field(attr)
+            if field.is_relation:
+                changed = getattr(obj, field.attname) != getattr(value, 'pk', value)
+            else:
+                changed = getattr(obj, attr) != value
+
+            if changed:
+                setattr(obj, attr, value)
+                fields.append(attr)
+
+        fields = self.prepare_update(obj, fields)
+        if fields:
+            # bulk_update skip pre_save, set auto_now ourself
+            for field in obj._meta.concrete_fields:
+                if getattr(field, 'auto_now', False) and field.name not in fields:
+                    setattr(obj, field.attname, field.pre_save(obj, False))
+                    fields.append(field.name)
+        return fields
+
+    def prepare_update(self, obj, fields):
+        """
+        Hook for value computed in `save()`, return fields to write
+        """
+        return fields
+
+    def update_per_row(self, obj_mapping, data_mapping):
         # Perform creations and updates.
         ret = []
         for obj_uuid, data in data_mapping.items():
@@ -84,3 +169,48 @@ class ListSerializerUpdateMappingField(serializers.ListSerializer):
                 obj.delete()
 
         return ret
+
+
+class ConditionalGetMixin:
+    """
+    ETag and Last-Modified derived from `update_date` columns.
+    Answer 304 before serialization run when client validator match.
+    """
+    validator_fields = ('update_date',)
+
+    def get_validators(self, request, queryset, fields=None, user=None, extra=None):
+        fields = fields or self.validator_fields
+        aggregates = {'validator_total': Count('pk', distinct=True)}
+        for index, field in enumerate(fields):
+            aggregates['validator_%s' % index] = Max(field)
+
+        result = queryset.order_by().aggregate(**aggregates)
+        dates = [result['validator_%s' % index] for index in range(len(fields))]
+        dates = [date for date in dates if date is not None]
+        last_modified = max(dates) if dates else None
+
+        # Each page and each user has own validator
+        parts = [request.get_full_path(), result['validator_total']]
+        parts.extend(date.isoformat() for date in dates)
+        parts.append(getattr(user, 'pk', None))
+        parts.extend(extra or [])
+
+        etag = self.make_etag(parts)
+        return etag, last_modified
+
+    def make_etag(self, parts):
+        value = '|'.join(str(part) for part in parts)
+        return '"%s"' % hashlib.md5(value.encode('utf-8')).hexdigest()
+
+    def get_not_modified(self, request, etag, last_modified=None):
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is not None:
+            self.set_validators(response, etag, last_modified)
+        return response
+
+    def set_validators(self, response, etag, last_modified=None):
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        return response
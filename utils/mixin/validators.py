@@ -1,10 +1,16 @@
+from django.db import models
+
 from rest_framework import serializers
 
 
 class CleanValidateMixin(serializers.ModelSerializer):
     def validate(self, attrs):
         instance = self.instance
-        if not self.instance:
+        if instance is not None and not isinstance(instance, models.Model):
+            # Child of list serializer hold the whole queryset, pick the row
+            instance = next((obj for obj in instance if obj.uuid == attrs.get('uuid')), None)
+
+        if not instance:
             instance = self.Meta.model(**attrs)
 
         instance.clean()
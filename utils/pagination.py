@@ -1,4 +1,16 @@
+import json
+import base64
+import binascii
+
+from dateutil import parser
+
 from django.conf import settings
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class Pagination:
@@ -19,7 +31,131 @@ class Pagination:
         self.show_full_result_count = True
 
 
+class KeysetPagination(BasePagination):
+    """
+    Keyset pagination on (create_date, id) newest first,
+    same as models `-create_date` ordering.
+    No OFFSET scan and no COUNT, cursor is opaque for client.
+    Only for queryset in that ordering, see `accept_ordering`.
+    """
+    cursor_query_param = 'cursor'
+    limit_query_param = 'limit'
+    offset_query_param = 'offset'
+    default_limit = settings.PAGINATION_PER_PAGE
+    max_limit = 100
+
+    # Ordering the cursor walk, left part of it also accepted
+    ordering = ('-create_date', '-id')
+
+    @classmethod
+    def accept_ordering(cls, queryset):
+        """
+        Queryset unordered or already in keyset ordering,
+        other ordering (search rank, drawn position) must be kept
+        """
+        ordering = tuple(queryset.query.order_by)
+        if not ordering and queryset.query.default_ordering:
+            ordering = tuple(queryset.model._meta.ordering)
+        return ordering == cls.ordering[:len(ordering)]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.has_next = False
+        self.has_previous = False
+        self.page = list()
+
+        reverse, position = self.decode_cursor(request)
+        if position is not None:
+            create_date, pk = position
+            if reverse:
+                queryset = queryset.filter(Q(create_date__gt=create_date)
+                                           | Q(create_date=create_date, id__gt=pk))
+            else:
+                queryset = queryset.filter(Q(create_date__lt=create_date)
+                                           | Q(create_date=create_date, id__lt=pk))
+
+        ordering = tuple(field.lstrip('-') for field in self.ordering) if reverse else self.ordering
+        results = list(queryset.order_by(*ordering)[:self.limit + 1])
+
+        has_more = len(results) > self.limit
+        results = results[:self.limit]
+
+        if reverse:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+
+        self.page = results
+        return results
+
+    def get_limit(self, request):
+        try:
+            return _positive_int(request.query_params[self.limit_query_param],
+                                 strict=True, cutoff=self.max_limit)
+        except (KeyError, ValueError):
+            return self.default_limit
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param, None)
+        if not encoded:
+            return False, None
+
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii'))
+            position = (parser.parse(data['d']), int(data['i']))
+            reverse = bool(data.get('r', False))
+        except (binascii.Error, UnicodeError, ValueError, TypeError, KeyError, OverflowError):
+            raise NotFound(detail=_("Invalid cursor"))
+
+        return reverse, position
+
+    def encode_cursor(self, obj, reverse=False):
+        data = {'d': obj.create_date.isoformat(), 'i': obj.id}
+        if reverse:
+            data['r'] = 1
+
+        encoded = base64.urlsafe_b64encode(json.dumps(data).encode('ascii')).decode('ascii')
+        url = remove_query_param(self.request.build_absolute_uri(), self.offset_query_param)
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+
+def get_paginator(request, paginator, queryset=None):
+    """
+    Client select keyset mode with `?pagination=cursor`
+    or by sending back a cursor returned before.
+    Otherwise, or when queryset ordered other way than keyset,
+    use given limit offset paginator.
+    """
+    params = request.query_params
+    if params.get('pagination', None) == 'cursor' or KeysetPagination.cursor_query_param in params:
+        if queryset is None or KeysetPagination.accept_ordering(queryset):
+            return KeysetPagination()
+    return paginator
+
+
 def build_result_pagination(self, _PAGINATOR, serializer):
+    if isinstance(_PAGINATOR, KeysetPagination):
+        return {
+            'limit': _PAGINATOR.limit,
+            'previous': _PAGINATOR.get_previous_link(),
+            'next': _PAGINATOR.get_next_link(),
+            'results': serializer.data,
+        }
+
     result = {
         'offset': _PAGINATOR.offset,
         'limit': _PAGINATOR.limit,